@@ -1,4 +1,5 @@
 import time
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,17 +9,41 @@ from app.config import Config
 from app.schemas.dto import (
     IngestRequest, IngestResponse,
     ChatRequest, ChatResponse,
-    Citation
+    Citation, JobStatusResponse
 )
-from app.rag.indexer import process_document_ingestion
-from app.rag.retriever import search
+from app.rag.clients import init_clients, close_clients
+from app.utils.concurrency import get_executor, shutdown_executor
+from app.jobs.worker import get_job_queue, start_job_queue, stop_job_queue
+from app.jobs.compactor import start_compactor, stop_compactor
+from app.rag.chunk_cache import get_chunk_cache
+from app.rag.embedding_cache import get_embedding_cache
+from app.rag.retriever import get_retrieval_stats, search
 from app.rag.generator import generate_answer_with_retry
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize shared clients and worker pools once per process and release them on shutdown."""
+    try:
+        Config.validate_datapoint_ids()
+        init_clients()
+        get_executor()
+        await start_job_queue()
+        await start_compactor()
+    except Exception as e:
+        raise RuntimeError(f"Failed to initialize services: {str(e)}")
+    yield
+    await stop_compactor()
+    await stop_job_queue()
+    shutdown_executor()
+    close_clients()
+
+
 app = FastAPI(
     title="Private Lodging RAG API",
     description="Retrieval-Augmented Generation API for private lodging documents",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -30,15 +55,6 @@ app.add_middleware(
 )
 
 
-# @app.on_event("startup")
-# async def startup_event():
-#     """Initialize configuration and services on startup."""
-#     try:
-#         Config.initialize_aiplatform()
-#     except Exception as e:
-#         raise RuntimeError(f"Failed to initialize services: {str(e)}")
-
-
 @app.get("/healthz", status_code=200)
 async def health_check():
     """Health check endpoint."""
@@ -51,16 +67,31 @@ async def health():
     return {"status": "ok", "service": "private-lodging-ai"}
 
 
+@app.get("/stats", status_code=200)
+async def stats():
+    """Cache and retrieval counters for this process."""
+    embedding_cache = get_embedding_cache()
+    chunk_cache = get_chunk_cache()
+    return {
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "chunk_cache": chunk_cache.stats() if chunk_cache else None,
+        "retrieval": get_retrieval_stats().stats()
+    }
+
+
 @app.get("/", status_code=200)
 async def root():
     """Root endpoint."""
     return {"message": "Private Lodging RAG API", "version": "1.0.0"}
 
 
-@app.post("/ingest", response_model=IngestResponse)
+@app.post("/ingest", response_model=IngestResponse, status_code=status.HTTP_202_ACCEPTED)
 async def ingest_document(request: IngestRequest):
     """
-    Ingest a PDF document from GCS.
+    Enqueue ingestion of a PDF document from GCS.
+    
+    The job is persisted and processed by the background worker pool;
+    poll GET /jobs/{job_id} for progress.
     
     Process flow:
     1. Extract text from PDF
@@ -74,32 +105,44 @@ async def ingest_document(request: IngestRequest):
             detail="tenant_id cannot be empty"
         )
     
+    if request.gcs_uri.startswith("file://") and not Config.ALLOW_LOCAL_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="file:// URIs are not allowed on this deployment"
+        )
+    
     try:
-        result = await process_document_ingestion(
+        job = get_job_queue().enqueue(
             tenant_id=request.tenant_id,
             gcs_uri=request.gcs_uri,
             doc_id=request.doc_id,
-            index_id=Config.INDEX_ID
+            params={"mode": request.mode}
         )
         
-        if result["chunks"] == 0:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="No chunks were created from the document"
-            )
-        
-        return IngestResponse(**result)
-        
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+        return IngestResponse(
+            job_id=job["job_id"],
+            doc_id=job["doc_id"],
+            status=job["status"]
         )
+        
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Document ingestion failed: {str(e)}"
+            detail=f"Failed to enqueue ingestion job: {str(e)}"
+        )
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Report the status and per-stage progress of an ingestion job."""
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job not found: {job_id}"
         )
+    
+    return JobStatusResponse(**job)
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -131,8 +174,9 @@ async def chat(request: ChatRequest):
             tenant_id=request.tenant_id,
             query=request.query,
             index_endpoint_id=Config.INDEX_ENDPOINT_ID,
-            top_k_vector=30,
-            top_k_final=request.top_k
+            top_k_final=request.top_k,
+            doc_ids=request.doc_ids,
+            exclude_doc_ids=request.exclude_doc_ids
         )
         
         if not hits:
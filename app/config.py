@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Dict, Optional
 from google.cloud import aiplatform
 from dotenv import load_dotenv
 
@@ -14,6 +14,132 @@ class Config:
     INDEX_ID: Optional[str] = os.getenv("INDEX_ID")
     INDEX_ENDPOINT_ID: Optional[str] = os.getenv("INDEX_ENDPOINT_ID")
     DEPLOYED_INDEX_ID: str = os.getenv("DEPLOYED_INDEX_ID", "private_lodging_stream_v1")
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-005")
+    GENERATION_MODEL: str = os.getenv("GENERATION_MODEL", "gemini-2.5-flash")
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+    # Async execution model: thread pool for network calls, process pool for parallel PDF extraction
+    IO_WORKERS: int = int(os.getenv("IO_WORKERS", "32"))
+    CPU_WORKERS: int = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+    EMBED_CONCURRENCY: int = int(os.getenv("EMBED_CONCURRENCY", "16"))
+    VECTOR_SEARCH_CONCURRENCY: int = int(os.getenv("VECTOR_SEARCH_CONCURRENCY", "16"))
+    GENERATE_CONCURRENCY: int = int(os.getenv("GENERATE_CONCURRENCY", "16"))
+    UPSERT_CONCURRENCY: int = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+    PDF_CONCURRENCY: int = int(os.getenv("PDF_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+
+    # Embedding request batching (text-embedding-005: 250 inputs / 20k tokens per request)
+    EMBED_MAX_BATCH_SIZE: int = int(os.getenv("EMBED_MAX_BATCH_SIZE", "250"))
+    EMBED_MAX_BATCH_TOKENS: int = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "16000"))
+    EMBED_PARALLELISM: int = int(os.getenv("EMBED_PARALLELISM", "4"))
+    EMBED_MAX_RETRIES: int = int(os.getenv("EMBED_MAX_RETRIES", "4"))
+    REMOVE_BATCH_SIZE: int = int(os.getenv("REMOVE_BATCH_SIZE", "1000"))
+
+    # Streaming ingest pipeline
+    PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "256"))
+    UPSERT_BATCH_SIZE: int = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+    CHUNK_UPLOAD_CHUNK_SIZE: int = int(os.getenv("CHUNK_UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+    # Binary chunk store: gcs (ranged reads from BUCKET_NAME) | local (mmap under CHUNK_STORE_DIR)
+    CHUNK_STORE_BACKEND: str = os.getenv("CHUNK_STORE_BACKEND", "gcs")
+    CHUNK_STORE_TAIL_BYTES: int = int(os.getenv("CHUNK_STORE_TAIL_BYTES", str(16 * 1024)))
+    CHUNK_STORE_COALESCE_BYTES: int = int(os.getenv("CHUNK_STORE_COALESCE_BYTES", str(64 * 1024)))
+    CHUNK_STORE_SEGMENT_CACHE_ITEMS: int = int(os.getenv("CHUNK_STORE_SEGMENT_CACHE_ITEMS", "256"))
+    # Parallel chunk-text fetches at query time; slower fetches are left out of the answer
+    CHUNK_FETCH_CONCURRENCY: int = int(os.getenv("CHUNK_FETCH_CONCURRENCY", "16"))
+    CHUNK_FETCH_TIMEOUT: float = float(os.getenv("CHUNK_FETCH_TIMEOUT", "5.0"))
+    # In-process cache of hydrated chunk records; manifests are re-read after CHUNK_MANIFEST_TTL seconds
+    CHUNK_CACHE_ENABLED: bool = os.getenv("CHUNK_CACHE_ENABLED", "true").lower() == "true"
+    CHUNK_CACHE_MAX_BYTES: int = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CHUNK_MANIFEST_TTL: float = float(os.getenv("CHUNK_MANIFEST_TTL", "5.0"))
+    # Keep chunk metadata and text in a local SQLite sidecar so hydration is one local lookup
+    INLINE_PAYLOADS: bool = os.getenv("INLINE_PAYLOADS", "false").lower() == "true"
+    # Vector search: vertex (Vertex AI Vector Search) | local (in-process exact search) |
+    # both (upsert to both, query Vertex; builds the local index before switching)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "vertex")
+    # Local index engine: exact (full scan) | ivfpq (IVF-PQ once a tenant has VECTOR_ANN_MIN_ROWS vectors)
+    LOCAL_VECTOR_ENGINE: str = os.getenv("LOCAL_VECTOR_ENGINE", "exact")
+    VECTOR_ANN_MIN_ROWS: int = int(os.getenv("VECTOR_ANN_MIN_ROWS", "100000"))
+    # Clusters (0 = about 4 * sqrt(rows)) and PQ subspaces (must divide the embedding dimensions)
+    VECTOR_ANN_NLIST: int = int(os.getenv("VECTOR_ANN_NLIST", "0"))
+    VECTOR_ANN_PQ_M: int = int(os.getenv("VECTOR_ANN_PQ_M", "48"))
+    # Search-time defaults: clusters visited per query, PQ candidates rescored exactly
+    VECTOR_ANN_NPROBE: int = int(os.getenv("VECTOR_ANN_NPROBE", "16"))
+    VECTOR_ANN_RERANK: int = int(os.getenv("VECTOR_ANN_RERANK", "256"))
+    # Retrain once a tenant has grown to this multiple of the rows the index was trained on
+    VECTOR_ANN_RETRAIN_GROWTH: float = float(os.getenv("VECTOR_ANN_RETRAIN_GROWTH", "4.0"))
+    # Send tenant/doc namespace filters with find_neighbors; without them (or on the local index
+    # with doc filters) queries over-fetch up to VECTOR_OVERFETCH_MAX neighbors
+    VECTOR_FILTER_PUSHDOWN: bool = os.getenv("VECTOR_FILTER_PUSHDOWN", "true").lower() == "true"
+    VECTOR_OVERFETCH_MAX: int = int(os.getenv("VECTOR_OVERFETCH_MAX", "1000"))
+    # distanceMeasureType of the deployed Vertex index: COSINE_DISTANCE | DOT_PRODUCT_DISTANCE |
+    # SQUARED_L2_DISTANCE (others disable the adaptive pool); the local backend is always cosine
+    VECTOR_DISTANCE_MEASURE: str = os.getenv("VECTOR_DISTANCE_MEASURE", "COSINE_DISTANCE")
+    # Adaptive candidate pool for /chat: fetch top_k first, double while the tail is still within
+    # RETRIEVAL_SCORE_WINDOW (cosine similarity) of the best hit, up to RETRIEVAL_POOL_MAX; cut at the
+    # first neighbor past the window or RETRIEVAL_SCORE_GAP behind the previous one (keeping RETRIEVAL_POOL_MIN)
+    RETRIEVAL_ADAPTIVE: bool = os.getenv("RETRIEVAL_ADAPTIVE", "true").lower() == "true"
+    RETRIEVAL_POOL_MIN: int = int(os.getenv("RETRIEVAL_POOL_MIN", "5"))
+    RETRIEVAL_POOL_MAX: int = int(os.getenv("RETRIEVAL_POOL_MAX", "60"))
+    RETRIEVAL_SCORE_WINDOW: float = float(os.getenv("RETRIEVAL_SCORE_WINDOW", "0.12"))
+    RETRIEVAL_SCORE_GAP: float = float(os.getenv("RETRIEVAL_SCORE_GAP", "0.04"))
+    # BM25 index over character 2/3-grams of the chunks (app/rag/lexical_index.py), fused with the
+    # vector results by reciprocal rank fusion (LEXICAL_RRF_K); short queries whose n-grams all occur
+    # in a chunk are answered from it alone, without the embedding call (LEXICAL_FAST_PATH)
+    LEXICAL_INDEX: bool = os.getenv("LEXICAL_INDEX", "false").lower() == "true"
+    LEXICAL_TOP_K: int = int(os.getenv("LEXICAL_TOP_K", "30"))
+    LEXICAL_RRF_K: int = int(os.getenv("LEXICAL_RRF_K", "60"))
+    LEXICAL_FAST_PATH: bool = os.getenv("LEXICAL_FAST_PATH", "true").lower() == "true"
+    LEXICAL_FAST_PATH_MAX_CHARS: int = int(os.getenv("LEXICAL_FAST_PATH_MAX_CHARS", "16"))
+    LEXICAL_FAST_PATH_COVERAGE: float = float(os.getenv("LEXICAL_FAST_PATH_COVERAGE", "1.0"))
+    # Vector Search datapoint ids: string ({tenant}_{doc}_{chunk}) | int (dense ids, see app/rag/id_table.py).
+    # The int id table lives in this instance's DATA_DIR, so int requires VECTOR_BACKEND=local:
+    # instances sharing a Vertex index would hand out the same ids for different chunks
+    DATAPOINT_IDS: str = os.getenv("DATAPOINT_IDS", "string")
+
+    # Background compaction of per-tenant chunk segments
+    CHUNK_COMPACT_MIN_SEGMENTS: int = int(os.getenv("CHUNK_COMPACT_MIN_SEGMENTS", "4"))
+    CHUNK_COMPACT_TARGET_BYTES: int = int(os.getenv("CHUNK_COMPACT_TARGET_BYTES", str(64 * 1024 * 1024)))
+    CHUNK_COMPACT_GRACE_SECONDS: float = float(os.getenv("CHUNK_COMPACT_GRACE_SECONDS", "300"))
+    CHUNK_COMPACT_INTERVAL: float = float(os.getenv("CHUNK_COMPACT_INTERVAL", "60"))
+
+    # Chunking: fixed (1400-char windows per page) | sentence (token-budget packing across pages)
+    CHUNKER: str = os.getenv("CHUNKER", "fixed")
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "1400"))
+    CHUNK_OVERLAP_SENTENCES: int = int(os.getenv("CHUNK_OVERLAP_SENTENCES", "1"))
+
+    # Header/footer stripping: lines within the first/last EDGE_LINES lines of a page
+    # that repeat on >= MIN_PAGE_RATIO of the first SAMPLE_PAGES pages
+    STRIP_BOILERPLATE: bool = os.getenv("STRIP_BOILERPLATE", "true").lower() == "true"
+    BOILERPLATE_SAMPLE_PAGES: int = int(os.getenv("BOILERPLATE_SAMPLE_PAGES", "50"))
+    BOILERPLATE_MIN_PAGES: int = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+    BOILERPLATE_MIN_PAGE_RATIO: float = float(os.getenv("BOILERPLATE_MIN_PAGE_RATIO", "0.6"))
+    BOILERPLATE_EDGE_LINES: int = int(os.getenv("BOILERPLATE_EDGE_LINES", "3"))
+
+    # PDF loading
+    PDF_ENGINE: str = os.getenv("PDF_ENGINE", "pypdf")  # pypdf | pdfminer | pypdfium2
+    PDF_BUFFER_KEEP_BYTES: int = int(os.getenv("PDF_BUFFER_KEEP_BYTES", str(64 * 1024 * 1024)))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    ALLOW_LOCAL_FILES: bool = os.getenv("ALLOW_LOCAL_FILES", "false").lower() == "true"
+
+    # Local persistent state (job queue, caches, local indexes)
+    DATA_DIR: str = os.getenv("DATA_DIR", ".data")
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+    # Claims before an interrupted job is marked failed instead of requeued
+    INGEST_MAX_ATTEMPTS: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+    # Job progress is written on each stage's first report, then at most every N seconds
+    JOB_PROGRESS_INTERVAL: float = float(os.getenv("JOB_PROGRESS_INTERVAL", "1.0"))
+    CHUNK_STORE_DIR: str = os.getenv("CHUNK_STORE_DIR", os.path.join(DATA_DIR, "chunk_store"))
+    PAYLOAD_DB_PATH: str = os.getenv("PAYLOAD_DB_PATH", os.path.join(DATA_DIR, "payloads.sqlite3"))
+    DATAPOINT_ID_DIR: str = os.getenv("DATAPOINT_ID_DIR", os.path.join(DATA_DIR, "datapoint_ids"))
+    LOCAL_VECTOR_DIR: str = os.getenv("LOCAL_VECTOR_DIR", os.path.join(DATA_DIR, "vectors"))
+    LEXICAL_INDEX_DIR: str = os.getenv("LEXICAL_INDEX_DIR", os.path.join(DATA_DIR, "lexical"))
+
+    # Content-addressed embedding cache (memory LRU + memory-mapped disk tier)
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(DATA_DIR, "embedding_cache"))
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
 
     @classmethod
     def validate(cls) -> None:
@@ -28,7 +154,29 @@ class Config:
         missing_vars = [name for name, value in required_vars.items() if not value]
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+        cls.validate_datapoint_ids()
+
+    @classmethod
+    def validate_datapoint_ids(cls) -> None:
+        """Reject integer datapoint ids with a vector index other instances also write to."""
+        if cls.DATAPOINT_IDS == "int" and cls.VECTOR_BACKEND != "local":
+            raise ValueError(
+                "DATAPOINT_IDS=int requires VECTOR_BACKEND=local: the id table is local to "
+                f"this instance and cannot be shared through VECTOR_BACKEND={cls.VECTOR_BACKEND}"
+            )
     
+    @classmethod
+    def stage_limits(cls) -> Dict[str, int]:
+        """Concurrency limit per pipeline stage."""
+        return {
+            "embed": cls.EMBED_CONCURRENCY,
+            "vector_search": cls.VECTOR_SEARCH_CONCURRENCY,
+            "generate": cls.GENERATE_CONCURRENCY,
+            "upsert": cls.UPSERT_CONCURRENCY,
+            "storage": cls.IO_WORKERS,
+            "pdf": cls.PDF_CONCURRENCY,
+        }
+
     @classmethod
     def initialize_aiplatform(cls) -> None:
         """Initialize Vertex AI platform."""
@@ -0,0 +1,93 @@
+"""Background compaction of the per-tenant chunk segment store."""
+import asyncio
+import threading
+import traceback
+from typing import Optional, Set
+
+from app.config import Config
+from app.rag.chunk_store import compact_tenant
+from app.utils.concurrency import run_io
+
+
+class ChunkCompactor:
+    """
+    Compact the chunk segments of tenants that have recently ingested documents.
+
+    Ingests schedule their tenant; every `interval` seconds the compactor
+    merges each pending tenant's small segments on the I/O pool, so a burst
+    of ingests is compacted together. A tenant stays pending while it has
+    retired segments, so they are deleted once their grace period passes.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval if interval is not None else Config.CHUNK_COMPACT_INTERVAL
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, tenant_id: str) -> None:
+        """Mark a tenant for compaction (safe to call from any thread)."""
+        with self._lock:
+            self._pending.add(tenant_id)
+
+    async def start(self) -> None:
+        """Start the periodic compaction task."""
+        self._task = asyncio.create_task(self._run(), name="chunk-compactor")
+
+    async def stop(self) -> None:
+        """Cancel the compaction task; pending tenants are compacted after their next ingest."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            with self._lock:
+                tenants = sorted(self._pending)
+            for tenant_id in tenants:
+                try:
+                    stats = await run_io("storage", compact_tenant, tenant_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    continue
+                if not stats["merged"] and not stats["retired"]:
+                    with self._lock:
+                        self._pending.discard(tenant_id)
+
+
+_compactor: Optional[ChunkCompactor] = None
+_compactor_lock = threading.Lock()
+
+
+def get_compactor() -> ChunkCompactor:
+    """
+    Return the process-wide chunk compactor, creating it on first use.
+
+    Returns:
+        Shared ChunkCompactor instance
+    """
+    global _compactor
+    if _compactor is None:
+        with _compactor_lock:
+            if _compactor is None:
+                _compactor = ChunkCompactor()
+    return _compactor
+
+
+async def start_compactor() -> ChunkCompactor:
+    """Start the process-wide chunk compactor."""
+    compactor = get_compactor()
+    await compactor.start()
+    return compactor
+
+
+async def stop_compactor() -> None:
+    """Stop the process-wide chunk compactor."""
+    global _compactor
+    if _compactor is not None:
+        await _compactor.stop()
+        _compactor = None
@@ -0,0 +1,187 @@
+"""SQLite-backed persistent store for ingestion jobs."""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+PROGRESS_STAGES = ("extracted_pages", "chunks", "embedded", "upserted")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    tenant_id   TEXT NOT NULL,
+    doc_id      TEXT NOT NULL,
+    gcs_uri     TEXT NOT NULL,
+    params      TEXT NOT NULL DEFAULT '{}',
+    status      TEXT NOT NULL,
+    progress    TEXT NOT NULL,
+    result      TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """
+    Persistent job table.
+
+    A single connection is shared behind a lock; every statement is short, so
+    callers on the event loop can use it directly.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def create(
+        self,
+        job_id: str,
+        tenant_id: str,
+        doc_id: str,
+        gcs_uri: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Insert a new queued job.
+
+        Args:
+            job_id: Job identifier
+            tenant_id: Tenant identifier
+            doc_id: Document identifier
+            gcs_uri: Source document URI
+            params: Extra ingestion parameters
+
+        Returns:
+            The stored job as a dictionary
+        """
+        now = time.time()
+        progress = {stage: 0 for stage in PROGRESS_STAGES}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, tenant_id, doc_id, gcs_uri, params, status, progress,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, tenant_id, doc_id, gcs_uri, json.dumps(params or {}),
+                 JOB_QUEUED, json.dumps(progress), now, now)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job by id, or None if it does not exist."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move the oldest queued job to running.
+
+        Returns:
+            The claimed job, or None if the queue is empty
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE job_id = (SELECT job_id FROM jobs WHERE status = ?"
+                " ORDER BY created_at LIMIT 1) RETURNING *",
+                (JOB_RUNNING, time.time(), JOB_QUEUED)
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def update_progress(self, job_id: str, progress: Dict[str, int]) -> None:
+        """Set the processed counts of one or more progress stages in one write."""
+        if not progress:
+            return
+        paths = ", ".join("?, ?" for _ in progress)
+        values = [value for stage, count in progress.items() for value in (f"$.{stage}", count)]
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET progress = json_set(progress, {paths}), updated_at = ? WHERE job_id = ?",
+                (*values, time.time(), job_id)
+            )
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Mark a job as succeeded and store its result."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                (JOB_SUCCEEDED, json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job as failed with an error message."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (JOB_FAILED, error, time.time(), job_id)
+            )
+
+    def requeue_running(self, max_attempts: int) -> Tuple[int, int]:
+        """
+        Return jobs left running by a previous process to the queue.
+
+        A job that was already claimed max_attempts times is marked failed
+        instead, so a document that keeps crashing the process is not
+        retried forever.
+
+        Args:
+            max_attempts: Claims after which an interrupted job is given up
+
+        Returns:
+            (number of requeued jobs, number of jobs marked failed)
+        """
+        now = time.time()
+        with self._lock:
+            failed = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE status = ? AND attempts >= ?",
+                (JOB_FAILED, f"Interrupted {max_attempts} times, giving up", now, JOB_RUNNING, max_attempts)
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (JOB_QUEUED, now, JOB_RUNNING)
+            ).rowcount
+        return requeued, failed
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def list_jobs(self, tenant_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return the most recent jobs for a tenant."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE tenant_id = ? ORDER BY created_at DESC LIMIT ?",
+                (tenant_id, limit)
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job["params"]) if job.get("params") else {}
+    job["progress"] = json.loads(job["progress"])
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+    return job
@@ -0,0 +1,195 @@
+"""Background worker pool that drains the persistent ingestion job queue."""
+import asyncio
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from app.config import Config
+from app.jobs.store import JobStore
+
+
+class ProgressReporter:
+    """
+    Coalesce progress callbacks into few job store writes.
+
+    The pipeline reports every page and chunk, from the event loop and from
+    its producer thread. Counts are kept in memory and written when a stage
+    reports for the first time or interval seconds after the last write;
+    flush() writes whatever is still pending.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, interval: Optional[float] = None):
+        self.store = store
+        self.job_id = job_id
+        self.interval = Config.JOB_PROGRESS_INTERVAL if interval is None else interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}
+        self._started: Set[str] = set()
+        self._written_at = 0.0
+
+    def __call__(self, stage: str, count: int) -> None:
+        with self._lock:
+            self._pending[stage] = count
+            if stage in self._started and time.monotonic() - self._written_at < self.interval:
+                return
+            self._started.add(stage)
+            self._write()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def _write(self) -> None:
+        self.store.update_progress(self.job_id, self._pending)
+        self._pending = {}
+        self._written_at = time.monotonic()
+
+
+class IngestionWorkerPool:
+    """
+    Run queued ingestion jobs on a fixed number of asyncio workers.
+
+    Jobs are persisted in a JobStore before they are acknowledged, so work
+    that was queued (or interrupted mid-run) survives a process restart.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        concurrency: Optional[int] = None,
+        poll_interval: float = 1.0
+    ):
+        self.store = store
+        self.concurrency = concurrency or Config.INGEST_WORKERS
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Requeue interrupted jobs and start the workers."""
+        requeued, failed = self.store.requeue_running(Config.INGEST_MAX_ATTEMPTS)
+        if requeued:
+            print(f"Requeued {requeued} interrupted ingestion job(s)")
+        if failed:
+            print(f"Warning: Failed {failed} ingestion job(s) interrupted {Config.INGEST_MAX_ATTEMPTS} times")
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"ingest-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the workers; running jobs are requeued on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(
+        self,
+        tenant_id: str,
+        gcs_uri: str,
+        doc_id: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Persist a new ingestion job and wake an idle worker.
+
+        Args:
+            tenant_id: Tenant identifier
+            gcs_uri: Source document URI
+            doc_id: Document identifier
+            params: Extra keyword arguments for process_document_ingestion
+
+        Returns:
+            The stored job as a dictionary
+        """
+        job = self.store.create(
+            job_id=str(uuid.uuid4()),
+            tenant_id=tenant_id,
+            doc_id=doc_id,
+            gcs_uri=gcs_uri,
+            params=params
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def _worker(self, worker_num: int) -> None:
+        while True:
+            job = self.store.claim_next()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        from app.rag.indexer import process_document_ingestion
+
+        job_id = job["job_id"]
+        print(f"Ingestion job {job_id} started (doc {job['doc_id']}, attempt {job['attempts']})")
+
+        report_progress = ProgressReporter(self.store, job_id)
+        try:
+            result = await process_document_ingestion(
+                tenant_id=job["tenant_id"],
+                gcs_uri=job["gcs_uri"],
+                doc_id=job["doc_id"],
+                index_id=Config.INDEX_ID,
+                job_id=job_id,
+                progress=report_progress,
+                **job["params"]
+            )
+            report_progress.flush()
+            if result["chunks"] == 0:
+                self.store.fail(job_id, "No chunks were created from the document")
+                return
+            self.store.complete(job_id, result)
+            print(f"Ingestion job {job_id} succeeded: {result['chunks']} chunks")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            report_progress.flush()
+            self.store.fail(job_id, f"Document ingestion failed: {str(e)}")
+
+
+_pool: Optional[IngestionWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_job_queue() -> IngestionWorkerPool:
+    """
+    Return the process-wide ingestion worker pool, creating it on first use.
+
+    Returns:
+        Shared IngestionWorkerPool instance
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = IngestionWorkerPool(JobStore(Config.JOB_DB_PATH))
+    return _pool
+
+
+async def start_job_queue() -> IngestionWorkerPool:
+    """Start the process-wide ingestion worker pool."""
+    pool = get_job_queue()
+    await pool.start()
+    return pool
+
+
+async def stop_job_queue() -> None:
+    """Stop the process-wide ingestion worker pool and close its store."""
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool.store.close()
+        _pool = None
@@ -0,0 +1,281 @@
+"""IVF-PQ approximate nearest-neighbour search on top of a tenant's vector matrix.
+
+Exact search (app.rag.vector_store) scans every row of a tenant. Past a few
+hundred thousand chunks that scan dominates a query, so once a tenant has
+VECTOR_ANN_MIN_ROWS vectors an inverted-file index with product
+quantization is trained for it:
+
+* k-means splits the (normalized) vectors into nlist clusters; a query
+  only visits the rows of its nprobe closest clusters.
+* Every vector is also compressed to pq_m one-byte codes, one per
+  subspace of dims / pq_m dimensions. Candidates are scored from a
+  pq_m x 256 table of query/codeword dot products (no vector reads), and
+  only the best `rerank` are rescored exactly against the memory-mapped
+  full vectors.
+
+nprobe and rerank trade recall for speed per query. Inserts are encoded
+and assigned to their cluster as they arrive; deletes only clear the row's
+live flag in the matrix. The index is retrained from scratch once the
+tenant has grown to VECTOR_ANN_RETRAIN_GROWTH times the rows it was
+trained on. Training runs in a background thread; queries keep using the
+previous generation (or exact search) until it is done.
+
+Per tenant directory, for the current generation g:
+
+    ivfpq-{g}.npz          centroids, codebooks, rows trained on
+    ivfpq-{g}.lists.i32    per row: cluster + 1 (0 = not encoded yet)
+    ivfpq-{g}.codes.u8     per row: pq_m codes
+
+A retrained generation is encoded next to the one in use and only becomes
+visible (its .npz is written) when all rows are encoded.
+"""
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.config import Config
+
+TRAIN_SAMPLE = 65536
+# 64 points per codeword are plenty for the 256-entry PQ codebooks
+_PQ_TRAIN_SAMPLE = 16384
+_KMEANS_ITERATIONS = 12
+
+
+def kmeans(data: np.ndarray, k: int, rng: np.random.Generator, iterations: int = _KMEANS_ITERATIONS) -> np.ndarray:
+    """
+    Lloyd's k-means with squared-L2 assignment.
+
+    Args:
+        data: (n, d) float32 training vectors
+        k: Number of centroids
+        rng: Random generator for the initial centroids
+        iterations: Number of update rounds
+
+    Returns:
+        (k, d) float32 centroids
+    """
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        # argmin |x - c|^2 = argmin |c|^2 - 2 x.c, computed in blocks to bound memory
+        assign = np.empty(len(data), dtype=np.int64)
+        centroid_norms = (centroids * centroids).sum(1)
+        for start in range(0, len(data), 8192):
+            block = data[start:start + 8192]
+            assign[start:start + 8192] = (centroid_norms - 2 * block @ centroids.T).argmin(1)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        centroids[~empty] = np.add.reduceat(data[order], starts) / counts[~empty, None]
+        # Re-seed empty clusters from random points
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32)
+
+
+class IvfPqIndex:
+    """Inverted lists plus PQ codes for the rows of one tenant matrix."""
+
+    def __init__(
+        self,
+        directory: str,
+        generation: int,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        trained_rows: int
+    ):
+        self.directory = directory
+        self.generation = generation
+        self.centroids = centroids                  # (nlist, d)
+        self.codebooks = codebooks                  # (pq_m, 256, d / pq_m)
+        self.trained_rows = trained_rows
+        self.nlist = len(centroids)
+        self.pq_m, _, self.sub_dims = codebooks.shape
+        self._lists_map: Optional[np.memmap] = None
+        self._codes_map: Optional[np.memmap] = None
+        self._lists: Optional[list] = None          # cluster -> row array, rebuilt after changes
+
+    # Persistence
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"ivfpq-{self.generation}{suffix}")
+
+    @staticmethod
+    def _generations(directory: str) -> List[int]:
+        return sorted(
+            int(name[len("ivfpq-"):-len(".npz")]) for name in os.listdir(directory)
+            if name.startswith("ivfpq-") and name.endswith(".npz")
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IvfPqIndex"]:
+        """Open a tenant's latest saved index, or None if it has none."""
+        generations = cls._generations(directory)
+        if not generations:
+            return None
+        with np.load(os.path.join(directory, f"ivfpq-{generations[-1]}.npz")) as meta:
+            index = cls(directory, generations[-1], meta["centroids"], meta["codebooks"], int(meta["trained_rows"]))
+        index.delete_older()
+        return index
+
+    def save(self) -> None:
+        """Write centroids and codebooks; from now on load() opens this generation."""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix="ivfpq-", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, centroids=self.centroids, codebooks=self.codebooks, trained_rows=self.trained_rows)
+        os.replace(tmp, self._path(".npz"))
+
+    def delete_older(self) -> None:
+        """Remove the files of generations this one replaced (or left by an interrupted training)."""
+        for name in os.listdir(self.directory):
+            if name.startswith("ivfpq-") and not name.startswith(f"ivfpq-{self.generation}."):
+                os.remove(os.path.join(self.directory, name))
+
+    def _ensure_capacity(self, capacity: int) -> None:
+        if self._lists_map is not None and self._lists_map.shape[0] >= capacity:
+            return
+        for suffix, width in ((".lists.i32", 4), (".codes.u8", self.pq_m)):
+            with open(self._path(suffix), "ab") as f:
+                if f.tell() < capacity * width:
+                    f.truncate(capacity * width)
+        self._lists_map = np.memmap(self._path(".lists.i32"), dtype=np.int32, mode="r+", shape=(capacity,))
+        self._codes_map = np.memmap(self._path(".codes.u8"), dtype=np.uint8, mode="r+", shape=(capacity, self.pq_m))
+
+    # Training and encoding
+
+    @classmethod
+    def train(
+        cls,
+        directory: str,
+        sample: np.ndarray,
+        rows: int,
+        nlist: Optional[int] = None,
+        pq_m: Optional[int] = None,
+        seed: int = 0
+    ) -> "IvfPqIndex":
+        """
+        Train centroids and PQ codebooks for a new generation of a tenant's index.
+
+        Nothing is saved: the caller encodes the rows, then calls save().
+
+        Args:
+            directory: Tenant directory the index files go to
+            sample: (n, d) normalized float32 vectors sampled from live rows
+            rows: Number of live rows the sample was drawn from
+            nlist: Number of clusters (default: VECTOR_ANN_NLIST, or about 4 * sqrt(rows))
+            pq_m: Number of PQ subspaces; must divide d
+
+        Returns:
+            Trained index with no rows encoded yet
+        """
+        rng = np.random.default_rng(seed)
+        dims = sample.shape[1]
+        nlist = nlist or Config.VECTOR_ANN_NLIST or int(4 * np.sqrt(rows))
+        pq_m = pq_m or Config.VECTOR_ANN_PQ_M
+        if dims % pq_m:
+            raise ValueError(f"VECTOR_ANN_PQ_M={pq_m} does not divide the {dims} embedding dimensions")
+        centroids = kmeans(sample, nlist, rng)
+        sub_dims = dims // pq_m
+        pq_sample = sample[:_PQ_TRAIN_SAMPLE]
+        codebooks = np.stack([
+            kmeans(np.ascontiguousarray(pq_sample[:, j * sub_dims:(j + 1) * sub_dims]), 256, rng)
+            for j in range(pq_m)
+        ])
+        generations = cls._generations(directory)
+        return cls(directory, generations[-1] + 1 if generations else 1, centroids, codebooks, rows)
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        lists = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+        codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            sub = vectors[:, j * self.sub_dims:(j + 1) * self.sub_dims]
+            book = self.codebooks[j]
+            distances = (book * book).sum(1) - 2 * sub @ book.T
+            codes[:, j] = distances.argmin(1)
+        return lists, codes
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray, capacity: int) -> None:
+        """
+        Encode rows (new or overwritten) and assign them to their clusters.
+
+        Args:
+            rows: Row numbers in the tenant matrix
+            vectors: Their normalized vectors
+            capacity: Current row capacity of the tenant matrix
+        """
+        if not len(rows):
+            return
+        self._ensure_capacity(capacity)
+        lists, codes = self._encode(vectors)
+        self._codes_map[rows] = codes
+        # Codes before list ids: a row with a list id always has valid codes
+        self._codes_map.flush()
+        self._lists_map[rows] = lists + 1
+        self._lists_map.flush()
+        self._lists = None
+
+    def unencoded_rows(self, capacity: int, live: np.ndarray) -> np.ndarray:
+        """Live rows that have no list assignment yet (e.g. after a crash)."""
+        self._ensure_capacity(capacity)
+        return np.flatnonzero(live[:capacity] & (self._lists_map[:capacity] == 0))
+
+    def _inverted_lists(self) -> list:
+        if self._lists is None:
+            assign = np.asarray(self._lists_map) - 1
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.nlist)]
+        return self._lists
+
+    # Search
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        matrix: np.ndarray,
+        live: np.ndarray,
+        nprobe: Optional[int] = None,
+        rerank: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top_k rows for a normalized query.
+
+        Args:
+            query: (d,) normalized float32 query
+            top_k: Number of rows to return
+            matrix: Full-precision tenant matrix (for reranking)
+            live: Live flag per row
+            nprobe: Clusters to visit (default Config.VECTOR_ANN_NPROBE)
+            rerank: PQ candidates rescored exactly (default Config.VECTOR_ANN_RERANK)
+
+        Returns:
+            (rows, cosine similarities), best first
+        """
+        nprobe = min(nprobe or Config.VECTOR_ANN_NPROBE, self.nlist)
+        rerank = max(rerank or Config.VECTOR_ANN_RERANK, top_k)
+        lists = self._inverted_lists()
+
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([lists[c] for c in probe.tolist()])
+        candidates = candidates[live[candidates]]
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+
+        # Asymmetric distance: query . codeword tables, summed over subspaces
+        tables = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.pq_m, self.sub_dims))
+        codes = self._codes_map.view(np.ndarray)[candidates]
+        approx = tables[np.arange(self.pq_m), codes].sum(1)
+        if len(candidates) > rerank:
+            candidates = candidates[np.argpartition(-approx, rerank - 1)[:rerank]]
+
+        # Sorted rows read the memory map front to back
+        candidates = np.sort(candidates)
+        exact = matrix[candidates] @ query
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        return candidates[top], exact[top]
@@ -0,0 +1,137 @@
+"""Token-aware batching and concurrent dispatch for embedding requests."""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from app.config import Config
+from app.utils.tokens import estimate_tokens
+
+# Vertex AI embedding models truncate each input at this many tokens
+MAX_INPUT_TOKENS = 2048
+
+
+def pack_batches(
+    texts: Sequence[str],
+    max_batch_size: int,
+    max_batch_tokens: int
+) -> List[List[int]]:
+    """
+    Greedily pack texts, in order, into batches bounded by item and token counts.
+
+    Args:
+        texts: Texts to pack
+        max_batch_size: Maximum number of texts per batch
+        max_batch_tokens: Maximum estimated tokens per batch
+
+    Returns:
+        List of batches, each a list of indices into texts
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = min(estimate_tokens(text), MAX_INPUT_TOKENS)
+        if current and (
+            len(current) >= max_batch_size
+            or current_tokens + tokens > max_batch_tokens
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether an embedding request failed transiently (quota, overload, timeout)."""
+    from google.api_core.exceptions import (
+        DeadlineExceeded,
+        InternalServerError,
+        ResourceExhausted,
+        ServiceUnavailable,
+    )
+
+    return isinstance(error, (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError))
+
+
+class EmbeddingBatcher:
+    """
+    Split a list of texts into request-sized batches and embed them concurrently.
+
+    Only batches that fail with a transient API error are retried (with
+    exponential backoff and jitter); invalid requests, auth errors and bugs
+    raise at once. Results are returned in the same order as the input texts.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        max_batch_size: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        parallelism: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size or Config.EMBED_MAX_BATCH_SIZE
+        self.max_batch_tokens = max_batch_tokens or Config.EMBED_MAX_BATCH_TOKENS
+        self.parallelism = parallelism or Config.EMBED_PARALLELISM
+        self.max_retries = max_retries if max_retries is not None else Config.EMBED_MAX_RETRIES
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embed_batch(batch)
+                if len(vectors) != len(batch):
+                    raise ValueError(
+                        f"Embedding batch returned {len(vectors)} vectors for {len(batch)} texts"
+                    )
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                delay *= 0.5 + random.random() / 2
+                print(f"Embedding batch of {len(batch)} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embed texts, preserving input order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding vector per input text
+        """
+        if not texts:
+            return []
+
+        batches = pack_batches(texts, self.max_batch_size, self.max_batch_tokens)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        def run(indices: List[int]) -> None:
+            vectors = self._embed_with_retry([texts[i] for i in indices])
+            for i, vector in zip(indices, vectors):
+                results[i] = vector
+
+        if len(batches) == 1 or self.parallelism == 1:
+            for indices in batches:
+                run(indices)
+        else:
+            workers = min(self.parallelism, len(batches))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+                # list() re-raises the first batch that exhausted its retries
+                list(pool.map(run, batches))
+
+        return results
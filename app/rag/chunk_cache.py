@@ -0,0 +1,166 @@
+"""In-process LRU cache of hydrated chunk records with a memory budget.
+
+Popular manual chunks are hit by almost every /chat of a tenant, so their
+records (text, page, page_end, checksum, path) are kept after the first
+fetch. Each entry remembers the chunk object it was read from: a segment
+name, which is never reused, plays the role of the object generation. A
+lookup names the object the tenant manifest currently maps the document
+to, and an entry read from any other object is stale and dropped. Ingest
+and deletion also drop a document's entries outright, and compaction moves
+entries of merged segments to the segment that replaced them.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import Config
+
+# Rough per-entry overhead of the dict, tuple and key objects
+_ENTRY_OVERHEAD = 300
+
+
+def record_size(record: dict) -> int:
+    """Approximate memory held by one record, in bytes (a Japanese str takes 2 bytes per character)."""
+    return _ENTRY_OVERHEAD + sum(sys.getsizeof(value) for value in record.values())
+
+
+class ChunkRecordCache:
+    """LRU of chunk records keyed by datapoint id, bounded by total size."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CHUNK_CACHE_MAX_BYTES
+        # datapoint_id -> (source object, record, size)
+        self._entries: "OrderedDict[str, Tuple[str, dict, int]]" = OrderedDict()
+        # (tenant_id, doc_id) -> datapoint ids, for invalidation on ingest
+        self._by_doc: Dict[Tuple[str, str], set] = {}
+        self._doc_of: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def _drop(self, datapoint_id: str) -> None:
+        _, _, size = self._entries.pop(datapoint_id)
+        self.bytes -= size
+        key = self._doc_of.pop(datapoint_id)
+        ids = self._by_doc.get(key)
+        if ids is not None:
+            ids.discard(datapoint_id)
+            if not ids:
+                del self._by_doc[key]
+
+    def get_many(self, datapoint_ids: Iterable[str], source: str) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Look up records that were read from the given object.
+
+        Args:
+            datapoint_ids: Datapoint ids of one document
+            source: Object the manifest currently maps the document to
+
+        Returns:
+            (records found, datapoint ids still to fetch)
+        """
+        found: Dict[str, dict] = {}
+        missing: List[str] = []
+        with self._lock:
+            for datapoint_id in datapoint_ids:
+                entry = self._entries.get(datapoint_id)
+                if entry is not None and entry[0] != source:
+                    self._drop(datapoint_id)
+                    self.stale += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    missing.append(datapoint_id)
+                    continue
+                self._entries.move_to_end(datapoint_id)
+                self.hits += 1
+                found[datapoint_id] = entry[1]
+        return found, missing
+
+    def put_many(self, tenant_id: str, doc_id: str, source: str, records: Dict[str, dict]) -> None:
+        """
+        Store records of one document read from the given object.
+
+        Args:
+            tenant_id: Tenant identifier
+            doc_id: Document identifier
+            source: Object the records were read from
+            records: Mapping of datapoint_id to record
+        """
+        key = (tenant_id, doc_id)
+        with self._lock:
+            for datapoint_id, record in records.items():
+                if datapoint_id in self._entries:
+                    self._drop(datapoint_id)
+                size = record_size(record)
+                if size > self.max_bytes:
+                    continue
+                self._entries[datapoint_id] = (source, record, size)
+                self._by_doc.setdefault(key, set()).add(datapoint_id)
+                self._doc_of[datapoint_id] = key
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_document(self, tenant_id: str, doc_id: str) -> int:
+        """
+        Drop every cached record of a document.
+
+        Returns:
+            Number of records dropped
+        """
+        with self._lock:
+            ids = list(self._by_doc.get((tenant_id, doc_id), ()))
+            for datapoint_id in ids:
+                self._drop(datapoint_id)
+        return len(ids)
+
+    def move_source(self, old_sources: Iterable[str], new_source: str) -> None:
+        """Re-point entries read from merged segments at the segment replacing them."""
+        old_sources = set(old_sources)
+        with self._lock:
+            for datapoint_id, (source, record, size) in list(self._entries.items()):
+                if source in old_sources:
+                    self._entries[datapoint_id] = (new_source, record, size)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/stale/eviction counters and the memory held."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "items": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache: Optional[ChunkRecordCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_chunk_cache() -> Optional[ChunkRecordCache]:
+    """
+    Return the process-wide chunk record cache, or None when disabled.
+
+    Returns:
+        Shared ChunkRecordCache instance or None
+    """
+    global _cache
+    if not Config.CHUNK_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ChunkRecordCache()
+    return _cache
@@ -0,0 +1,988 @@
+"""Per-tenant, log-structured store for chunk texts.
+
+Every ingest appends one immutable segment object,
+chunks/{tenant_id}/segments/{sequence}.seg:
+
+    [record 0][record 1]...[record n-1][checksums][locator][trailer]
+
+Every record is a zlib-compressed JSON object (text, page, page_end,
+checksum, path). The locator is a zlib-compressed JSON object with the
+datapoint id prefix and, in record order, each chunk id, record length
+(offsets are the running sum) and document. The checksum section, only
+needed to diff a re-ingest, is kept out of the locator so the locator
+stays small. The fixed 28-byte trailer holds the section offsets and a
+magic number; the index sits at the end so a segment can be written in
+one streaming pass.
+
+The tenant manifest, chunks/{tenant_id}/manifest.json, lists the segments
+and maps each live document to the segment holding its current chunks.
+Re-ingesting a document points it at the new segment, which leaves the
+older copy dead; deleting one records a tombstone. The manifest is only
+ever replaced with a compare-and-swap on its generation, so concurrent
+ingests and the compactor never lose each other's updates.
+
+A background compactor (app.jobs.compactor) merges a tenant's small
+segments into larger packed ones, dropping dead and tombstoned chunks, so
+hits spread over many documents are served from one or two segments.
+Merged segments are retired and deleted after a grace period, so readers
+holding an older manifest can still finish.
+
+Readers fetch a segment's tail with one suffix-range request (which
+contains the locator and often the hit records), then fetch only the hit
+records, merging nearby ranges into one request. The segments behind one
+query's hits are fetched in parallel. Segments are immutable, so their
+locators, and the hydrated records (app.rag.chunk_cache), are cached
+in-process. Objects are read from GCS with
+ranged downloads, or memory-mapped when CHUNK_STORE_BACKEND is "local".
+
+Documents ingested before segments existed have a per-document
+chunks/{tenant_id}/{doc_id}.bin object (same format) or an older
+chunks/{tenant_id}/{doc_id}.json object; readers fall back to those when
+the manifest does not know the document.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import Config
+from app.rag.chunk_cache import get_chunk_cache
+from app.rag.clients import ClientRegistry, get_clients
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process local development only
+    fcntl = None
+
+MAGIC = b"PLC1"
+_TRAILER = struct.Struct("<QQQ4s")   # checksums offset, locator offset, locator length, magic
+
+
+def chunk_object_name(tenant_id: str, doc_id: str) -> str:
+    """Name of the per-document binary chunk object of a document (pre-segment layout)."""
+    return f"chunks/{tenant_id}/{doc_id}.bin"
+
+
+def legacy_object_name(tenant_id: str, doc_id: str) -> str:
+    """Name of the pre-binary JSON chunk object of a document."""
+    return f"chunks/{tenant_id}/{doc_id}.json"
+
+
+def manifest_name(tenant_id: str) -> str:
+    """Name of a tenant's segment manifest."""
+    return f"chunks/{tenant_id}/manifest.json"
+
+
+def new_segment_name(tenant_id: str) -> str:
+    """Name for a new segment; names sort by creation time."""
+    return f"chunks/{tenant_id}/segments/{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.seg"
+
+
+def _segment_created(name: str) -> float:
+    try:
+        return int(name.rsplit("/", 1)[-1].split("-", 1)[0]) / 1e9
+    except ValueError:
+        return 0.0
+
+
+class ChunkBackend:
+    """Byte-range access to chunk objects."""
+
+    # Identifies the bucket/directory, so in-process caches can tell stores apart
+    namespace = ""
+
+    def create(self, name: str) -> BinaryIO:
+        """
+        Open a new object for writing.
+
+        The object only becomes visible, replacing any previous version,
+        when the returned file is closed.
+        """
+        raise NotImplementedError
+
+    def read_tail(self, name: str, size: int) -> Optional[bytes]:
+        """Return the last size bytes (or the whole object if smaller); None if missing."""
+        raise NotImplementedError
+
+    def read_range(self, name: str, start: int, end: int) -> bytes:
+        """Return bytes [start, end) of an object."""
+        raise NotImplementedError
+
+    def read_all(self, name: str) -> Optional[bytes]:
+        """Return a whole object; None if missing."""
+        raise NotImplementedError
+
+    def read_versioned(self, name: str) -> Tuple[Optional[bytes], str]:
+        """
+        Read a small object together with its version.
+
+        Returns:
+            (data, version); data is None and version "0" when missing
+        """
+        raise NotImplementedError
+
+    def write_if(self, name: str, data: bytes, version: str) -> bool:
+        """
+        Replace an object only if it is still at the given version.
+
+        Returns:
+            False if another writer changed it first
+        """
+        raise NotImplementedError
+
+    def delete(self, name: str) -> None:
+        """Delete an object if it exists."""
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        """Names of the objects under a prefix."""
+        raise NotImplementedError
+
+
+class GcsChunkBackend(ChunkBackend):
+    """Chunk objects in the GCS bucket, read with ranged downloads."""
+
+    def __init__(self, clients: Optional[ClientRegistry] = None, bucket_name: Optional[str] = None):
+        clients = clients or get_clients()
+        self.bucket = clients.bucket(bucket_name or Config.BUCKET_NAME)
+        self.namespace = f"gs://{self.bucket.name}"
+
+    def create(self, name: str) -> BinaryIO:
+        return self.bucket.blob(name).open(
+            "wb",
+            chunk_size=Config.CHUNK_UPLOAD_CHUNK_SIZE,
+            content_type="application/octet-stream"
+        )
+
+    def read_tail(self, name: str, size: int) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            # Negative start is a suffix range: the last `size` bytes
+            return self.bucket.blob(name).download_as_bytes(start=-size, timeout=Config.CHUNK_FETCH_TIMEOUT)
+        except NotFound:
+            return None
+
+    def read_range(self, name: str, start: int, end: int) -> bytes:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            # GCS ranges are inclusive of the end byte
+            return self.bucket.blob(name).download_as_bytes(
+                start=start, end=end - 1, timeout=Config.CHUNK_FETCH_TIMEOUT
+            )
+        except NotFound:
+            raise FileNotFoundError(name)
+
+    def read_all(self, name: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self.bucket.blob(name).download_as_bytes(timeout=Config.CHUNK_FETCH_TIMEOUT)
+        except NotFound:
+            return None
+
+    def read_versioned(self, name: str) -> Tuple[Optional[bytes], str]:
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(name)
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return None, "0"
+        # The download response carries the generation that was read
+        return data, str(blob.generation)
+
+    def write_if(self, name: str, data: bytes, version: str) -> bool:
+        from google.api_core.exceptions import PreconditionFailed
+
+        try:
+            # if_generation_match=0 means "only if the object does not exist"
+            self.bucket.blob(name).upload_from_string(
+                data, content_type="application/json", if_generation_match=int(version)
+            )
+        except PreconditionFailed:
+            return False
+        return True
+
+    def delete(self, name: str) -> None:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            pass
+
+    def list(self, prefix: str) -> List[str]:
+        return [blob.name for blob in self.bucket.list_blobs(prefix=prefix)]
+
+
+class _AtomicFile:
+    """Write to a temporary file and rename it into place on close."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        fd, self.temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> int:
+        return self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self.temp_path, self.path)
+
+
+class LocalChunkBackend(ChunkBackend):
+    """Chunk objects under a local directory, read through a memory map."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.CHUNK_STORE_DIR
+        self.namespace = os.path.abspath(self.directory)
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, *name.split("/"))
+
+    def create(self, name: str) -> BinaryIO:
+        return _AtomicFile(self._path(name))
+
+    def _read(self, name: str, start: int, end: Optional[int]) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    size = len(mapped)
+                    start = max(0, size + start) if start < 0 else start
+                    return mapped[start:size if end is None else end]
+        except FileNotFoundError:
+            return None
+
+    def read_tail(self, name: str, size: int) -> Optional[bytes]:
+        return self._read(name, -size, None)
+
+    def read_range(self, name: str, start: int, end: int) -> bytes:
+        data = self._read(name, start, end)
+        if data is None:
+            raise FileNotFoundError(self._path(name))
+        return data
+
+    def read_all(self, name: str) -> Optional[bytes]:
+        return self._read(name, 0, None)
+
+    def read_versioned(self, name: str) -> Tuple[Optional[bytes], str]:
+        data = self.read_all(name)
+        if data is None:
+            return None, "0"
+        return data, hashlib.sha256(data).hexdigest()
+
+    def write_if(self, name: str, data: bytes, version: str) -> bool:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock, open(path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                if self.read_versioned(name)[1] != version:
+                    return False
+                target = _AtomicFile(path)
+                target.write(data)
+                target.close()
+                return True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix: str) -> List[str]:
+        root = self._path(prefix.rstrip("/"))
+        names = []
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                relative = os.path.relpath(os.path.join(directory, file_name), self.directory)
+                names.append(relative.replace(os.sep, "/"))
+        return sorted(name for name in names if name.startswith(prefix))
+
+
+def get_chunk_backend(clients: Optional[ClientRegistry] = None) -> ChunkBackend:
+    """
+    Return the chunk backend selected by Config.CHUNK_STORE_BACKEND.
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    if Config.CHUNK_STORE_BACKEND == "gcs":
+        return GcsChunkBackend(clients)
+    if Config.CHUNK_STORE_BACKEND == "local":
+        return LocalChunkBackend()
+    raise ValueError(f"Unknown chunk store backend '{Config.CHUNK_STORE_BACKEND}' (choose from gcs, local)")
+
+
+class SegmentWriter:
+    """
+    Stream compressed chunk records into a new segment object.
+
+    The segment only becomes visible when close() is called.
+    """
+
+    def __init__(self, backend: ChunkBackend, name: str, prefix: str):
+        self.name = name
+        self.prefix = prefix
+        self.count = 0
+        self.size = 0
+        self._offset = 0
+        self._chunk_ids: List[str] = []
+        self._lengths: List[int] = []
+        self._doc_index: List[int] = []
+        self._docs: Dict[str, int] = {}
+        self._checksums: List[str] = []
+        self._file = backend.create(name)
+
+    @property
+    def docs(self) -> List[str]:
+        """Documents with at least one record in the segment."""
+        return list(self._docs)
+
+    def add(self, doc_id: str, datapoint_id: str, data: bytes, checksum: str) -> None:
+        """Append one already-compressed record."""
+        if not datapoint_id.startswith(self.prefix):
+            raise ValueError(f"Datapoint id {datapoint_id} does not start with {self.prefix}")
+        self._file.write(data)
+        self._chunk_ids.append(datapoint_id[len(self.prefix):])
+        self._lengths.append(len(data))
+        self._doc_index.append(self._docs.setdefault(doc_id, len(self._docs)))
+        self._checksums.append(checksum)
+        self._offset += len(data)
+        self.count += 1
+
+    def close(self) -> int:
+        """
+        Write the checksum section, locator and trailer and publish the segment.
+
+        Returns:
+            Size of the segment in bytes
+        """
+        checksums = zlib.compress(json.dumps(self._checksums).encode("utf-8"))
+        locator = zlib.compress(json.dumps({
+            "prefix": self.prefix,
+            "ids": self._chunk_ids,
+            "lengths": self._lengths,
+            "docs": list(self._docs),
+            "doc_index": self._doc_index,
+        }).encode("utf-8"))
+        locator_offset = self._offset + len(checksums)
+        self._file.write(checksums + locator + _TRAILER.pack(self._offset, locator_offset, len(locator), MAGIC))
+        self._file.close()
+        self.size = locator_offset + len(locator) + _TRAILER.size
+        return self.size
+
+
+def encode_record(chunk, path: str) -> bytes:
+    """Compress the stored record of one chunk."""
+    record = {
+        "text": chunk.text,
+        "page": chunk.page,
+        "page_end": chunk.page_end,
+        "checksum": chunk.checksum,
+        "path": path
+    }
+    return zlib.compress(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+
+
+class ChunkStoreWriter:
+    """
+    Write the chunks of one ingested document as a new segment of its tenant.
+
+    The segment is published and the tenant manifest switched over to it only
+    when close() is called, so a failed ingest leaves the previous version
+    (and therefore the previous manifest) in place.
+    """
+
+    def __init__(
+        self,
+        tenant_id: str,
+        doc_id: str,
+        gcs_uri: str,
+        backend: Optional[ChunkBackend] = None
+    ):
+        from app.rag.indexer import datapoint_id_for
+
+        self._datapoint_id_for = datapoint_id_for
+        self.backend = backend or get_chunk_backend()
+        self.tenant_id = tenant_id
+        self.doc_id = doc_id
+        self.gcs_uri = gcs_uri
+        self._segment = SegmentWriter(self.backend, new_segment_name(tenant_id), f"{tenant_id}_")
+        self.name = self._segment.name
+
+    @property
+    def count(self) -> int:
+        return self._segment.count
+
+    def write(self, chunk) -> None:
+        """Append one chunk record."""
+        self._segment.add(
+            self.doc_id,
+            self._datapoint_id_for(self.tenant_id, self.doc_id, chunk.chunk_id),
+            encode_record(chunk, self.gcs_uri),
+            chunk.checksum
+        )
+
+    def close(self) -> str:
+        """
+        Publish the segment and make it the document's current version.
+
+        Returns:
+            Name of the segment
+        """
+        size = self._segment.close()
+
+        def add_segment(manifest: dict) -> dict:
+            manifest["segments"].append({"name": self.name, "bytes": size, "docs": [self.doc_id]})
+            manifest["docs"][self.doc_id] = self.name
+            manifest["tombstones"].pop(self.doc_id, None)
+            return manifest
+
+        update_manifest(self.tenant_id, add_segment, backend=self.backend)
+        _invalidate_cached_records(self.tenant_id, self.doc_id)
+        print(f"Chunk texts stored at: {self.name} ({self.count} chunks, {size} bytes)")
+        return self.name
+
+
+def _empty_manifest() -> dict:
+    return {"version": 1, "segments": [], "docs": {}, "tombstones": {}, "retired": []}
+
+
+# (backend namespace, tenant_id) -> (monotonic time read, manifest); manifests
+# written by this process replace their entry immediately
+_manifest_cache: Dict[Tuple[str, str], Tuple[float, dict]] = {}
+_manifest_cache_lock = threading.Lock()
+
+
+def _remember_manifest(backend: ChunkBackend, tenant_id: str, manifest: dict) -> None:
+    with _manifest_cache_lock:
+        _manifest_cache[(backend.namespace, tenant_id)] = (time.monotonic(), manifest)
+
+
+def load_manifest(
+    tenant_id: str,
+    backend: Optional[ChunkBackend] = None,
+    max_age: float = 0.0
+) -> dict:
+    """
+    Read a tenant's segment manifest.
+
+    Args:
+        tenant_id: Tenant identifier
+        backend: Chunk backend to use (defaults to get_chunk_backend())
+        max_age: Seconds a manifest read or written by this process may be
+            reused for (0 always reads the stored manifest)
+
+    Returns:
+        Manifest dictionary (segments, docs, tombstones, retired); empty
+        for a tenant that has no segments yet
+    """
+    backend = backend or get_chunk_backend()
+    if max_age > 0:
+        with _manifest_cache_lock:
+            cached = _manifest_cache.get((backend.namespace, tenant_id))
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+    data, _ = backend.read_versioned(manifest_name(tenant_id))
+    manifest = json.loads(data) if data is not None else _empty_manifest()
+    _remember_manifest(backend, tenant_id, manifest)
+    return manifest
+
+
+def update_manifest(
+    tenant_id: str,
+    mutate: Callable[[dict], Optional[dict]],
+    backend: Optional[ChunkBackend] = None,
+    max_attempts: int = 20
+) -> dict:
+    """
+    Apply a change to a tenant's manifest with compare-and-swap.
+
+    mutate receives the current manifest and returns the new one, or None to
+    leave it unchanged. It is re-run on the fresh manifest whenever another
+    writer got there first.
+
+    Returns:
+        The manifest as written (or as read, when mutate returned None)
+
+    Raises:
+        RuntimeError: If the manifest kept changing for max_attempts tries
+    """
+    backend = backend or get_chunk_backend()
+    name = manifest_name(tenant_id)
+    for attempt in range(max_attempts):
+        data, version = backend.read_versioned(name)
+        manifest = mutate(json.loads(data) if data is not None else _empty_manifest())
+        if manifest is None:
+            return json.loads(data) if data is not None else _empty_manifest()
+        if backend.write_if(name, json.dumps(manifest, ensure_ascii=False).encode("utf-8"), version):
+            _remember_manifest(backend, tenant_id, manifest)
+            return manifest
+        time.sleep(min(1.0, 0.01 * 2 ** attempt))
+    raise RuntimeError(f"Manifest {name} changed concurrently {max_attempts} times")
+
+
+def delete_document(tenant_id: str, doc_id: str, backend: Optional[ChunkBackend] = None) -> None:
+    """
+    Tombstone a document so readers and the compactor ignore its chunks.
+
+    Args:
+        tenant_id: Tenant identifier
+        doc_id: Document identifier
+        backend: Chunk backend to use (defaults to get_chunk_backend())
+    """
+    def tombstone(manifest: dict) -> dict:
+        manifest["docs"].pop(doc_id, None)
+        manifest["tombstones"][doc_id] = time.time()
+        return manifest
+
+    update_manifest(tenant_id, tombstone, backend=backend)
+    _invalidate_cached_records(tenant_id, doc_id)
+
+
+def _invalidate_cached_records(tenant_id: str, doc_id: str) -> None:
+    cache = get_chunk_cache()
+    if cache is not None:
+        cache.invalidate_document(tenant_id, doc_id)
+
+
+class _OpenChunkObject:
+    """The parsed locator of one chunk object plus the tail bytes already fetched."""
+
+    def __init__(self, backend: ChunkBackend, name: str, tail: bytes, doc_id: str = ""):
+        if len(tail) < _TRAILER.size:
+            raise ValueError(f"Chunk object {name} is truncated")
+        checksums_offset, locator_offset, locator_length, magic = _TRAILER.unpack(tail[-_TRAILER.size:])
+        if magic != MAGIC:
+            raise ValueError(f"Chunk object {name} has an unknown format")
+        self.backend = backend
+        self.name = name
+        self.tail = tail
+        # The trailer directly follows the locator, which gives the object size
+        self.size = locator_offset + locator_length + _TRAILER.size
+        self.tail_start = self.size - len(tail)
+        self._checksums_range = (checksums_offset, locator_offset)
+
+        locator = json.loads(zlib.decompress(self._bytes(locator_offset, locator_offset + locator_length)))
+        prefix = locator["prefix"]
+        # Per-document objects have no document table
+        docs = locator.get("docs", [doc_id])
+        doc_index = locator.get("doc_index") or [0] * len(locator["ids"])
+        # datapoint_id -> (offset, length, position in record order, doc_id)
+        self.index: Dict[str, Tuple[int, int, int, str]] = {}
+        offset = 0
+        for position, (chunk_id, length) in enumerate(zip(locator["ids"], locator["lengths"])):
+            self.index[prefix + chunk_id] = (offset, length, position, docs[doc_index[position]])
+            offset += length
+
+    def _bytes(self, start: int, end: int) -> bytes:
+        if start >= self.tail_start:
+            return self.tail[start - self.tail_start:end - self.tail_start]
+        return self.backend.read_range(self.name, start, end)
+
+    def checksums(self, doc_id: Optional[str] = None) -> Dict[str, str]:
+        """Checksum of every chunk (of one document, if given), by datapoint id."""
+        values = json.loads(zlib.decompress(self._bytes(*self._checksums_range)))
+        return {
+            datapoint_id: values[entry[2]]
+            for datapoint_id, entry in self.index.items()
+            if doc_id is None or entry[3] == doc_id
+        }
+
+    def records(self, datapoint_ids: Iterable[str]) -> Dict[str, dict]:
+        """Fetch the records of the given datapoint ids, merging nearby byte ranges."""
+        return {
+            datapoint_id: json.loads(zlib.decompress(data))
+            for datapoint_id, data in self.raw_records(datapoint_ids).items()
+        }
+
+    def raw_records(self, datapoint_ids: Iterable[str]) -> Dict[str, bytes]:
+        """Fetch the compressed records of the given datapoint ids."""
+        wanted = sorted(
+            (self.index[datapoint_id][0], self.index[datapoint_id][1], datapoint_id)
+            for datapoint_id in set(datapoint_ids) if datapoint_id in self.index
+        )
+        # Records inside the tail are already here; the rest are fetched in
+        # as few ranged reads as possible
+        spans: List[Tuple[int, int, List[Tuple[int, int, str]]]] = []
+        for offset, length, datapoint_id in wanted:
+            if offset >= self.tail_start:
+                spans.append((offset, offset + length, [(offset, length, datapoint_id)]))
+            elif spans and offset - spans[-1][1] <= Config.CHUNK_STORE_COALESCE_BYTES:
+                spans[-1] = (spans[-1][0], offset + length, spans[-1][2] + [(offset, length, datapoint_id)])
+            else:
+                spans.append((offset, offset + length, [(offset, length, datapoint_id)]))
+
+        records = {}
+        for start, end, members in spans:
+            data = self._bytes(start, end)
+            for offset, length, datapoint_id in members:
+                records[datapoint_id] = data[offset - start:offset - start + length]
+        return records
+
+
+# Segments never change once written, so their parsed locators can be kept
+_segment_cache: "OrderedDict[str, _OpenChunkObject]" = OrderedDict()
+_segment_cache_lock = threading.Lock()
+
+
+def _open_object(
+    backend: ChunkBackend,
+    name: str,
+    doc_id: str = "",
+    tail_bytes: Optional[int] = None
+) -> Optional[_OpenChunkObject]:
+    tail = backend.read_tail(name, tail_bytes or Config.CHUNK_STORE_TAIL_BYTES)
+    if tail is None:
+        return None
+    return _OpenChunkObject(backend, name, tail, doc_id)
+
+
+def _open_segment(backend: ChunkBackend, name: str) -> _OpenChunkObject:
+    with _segment_cache_lock:
+        segment = _segment_cache.get(name)
+        if segment is not None:
+            _segment_cache.move_to_end(name)
+            return segment
+    segment = _open_object(backend, name)
+    if segment is None:
+        raise FileNotFoundError(f"Chunk segment not found: {name}")
+    with _segment_cache_lock:
+        _segment_cache[name] = segment
+        while len(_segment_cache) > Config.CHUNK_STORE_SEGMENT_CACHE_ITEMS:
+            _segment_cache.popitem(last=False)
+    return segment
+
+
+def read_manifest(
+    tenant_id: str,
+    doc_id: str,
+    backend: Optional[ChunkBackend] = None
+) -> Dict[str, str]:
+    """
+    Read the datapoint ids and checksums of a document's stored chunks.
+
+    Only the index and checksum sections are read, not the chunk texts.
+
+    Args:
+        tenant_id: Tenant identifier
+        doc_id: Document identifier
+        backend: Chunk backend to use (defaults to get_chunk_backend())
+
+    Returns:
+        Mapping of datapoint_id to chunk checksum (empty for a new or
+        deleted document)
+    """
+    backend = backend or get_chunk_backend()
+    manifest = load_manifest(tenant_id, backend)
+    if doc_id in manifest["docs"]:
+        return _open_segment(backend, manifest["docs"][doc_id]).checksums(doc_id)
+    if doc_id in manifest["tombstones"]:
+        return {}
+
+    stored = _open_object(backend, chunk_object_name(tenant_id, doc_id), doc_id)
+    if stored is not None:
+        return stored.checksums()
+    legacy = backend.read_all(legacy_object_name(tenant_id, doc_id))
+    if legacy is None:
+        return {}
+    return {datapoint_id: info.get("checksum", "") for datapoint_id, info in json.loads(legacy).items()}
+
+
+def _fetch_unsegmented(
+    backend: ChunkBackend,
+    tenant_id: str,
+    doc_id: str,
+    datapoint_ids: List[str]
+) -> Dict[str, dict]:
+    stored = _open_object(backend, chunk_object_name(tenant_id, doc_id), doc_id)
+    if stored is not None:
+        return stored.records(datapoint_ids)
+    legacy = backend.read_all(legacy_object_name(tenant_id, doc_id))
+    if legacy is None:
+        return {}
+    chunk_data = json.loads(legacy)
+    return {datapoint_id: chunk_data[datapoint_id] for datapoint_id in datapoint_ids if datapoint_id in chunk_data}
+
+
+_fetch_pool: Optional[ThreadPoolExecutor] = None
+_fetch_pool_lock = threading.Lock()
+
+
+def _get_fetch_pool() -> ThreadPoolExecutor:
+    # Separate from the stage executor: vector_search already runs on that
+    # pool, and waiting on it from one of its own threads can deadlock
+    global _fetch_pool
+    if _fetch_pool is None:
+        with _fetch_pool_lock:
+            if _fetch_pool is None:
+                _fetch_pool = ThreadPoolExecutor(
+                    max_workers=Config.CHUNK_FETCH_CONCURRENCY,
+                    thread_name_prefix="chunk-fetch"
+                )
+    return _fetch_pool
+
+
+def _fetch_segment(backend: ChunkBackend, name: str, datapoint_ids: List[str]) -> Dict[str, dict]:
+    return _open_segment(backend, name).records(datapoint_ids)
+
+
+def fetch_tenant_chunks(
+    tenant_id: str,
+    doc_chunks: Dict[str, List[str]],
+    backend: Optional[ChunkBackend] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, dict]:
+    """
+    Fetch the records of specific chunks from any of a tenant's documents.
+
+    Hits are grouped by the segment holding each document's current chunks,
+    so after compaction hits from many documents need one or two reads.
+    Records already in the chunk record cache are served from memory, and
+    the manifest is reused for up to Config.CHUNK_MANIFEST_TTL seconds, so
+    repeated hits need no reads at all. The remaining segments (and
+    pre-segment objects) are fetched in parallel; a fetch that fails or is
+    still running after `timeout` seconds is logged and its chunks are left
+    out of the result.
+
+    Args:
+        tenant_id: Tenant identifier
+        doc_chunks: Mapping of doc_id to the datapoint ids wanted from it
+        backend: Chunk backend to use (defaults to get_chunk_backend())
+        timeout: Seconds to wait for all fetches (defaults to Config.CHUNK_FETCH_TIMEOUT)
+
+    Returns:
+        Mapping of datapoint_id to record (text, page, page_end, checksum,
+        path) for the ids that exist and were fetched in time
+    """
+    backend = backend or get_chunk_backend()
+    deadline = time.monotonic() + (timeout if timeout is not None else Config.CHUNK_FETCH_TIMEOUT)
+    cache = get_chunk_cache()
+    pool = _get_fetch_pool()
+    records: Dict[str, dict] = {}
+    pending = doc_chunks
+
+    for attempt in range(2):
+        # The retry after a vanished segment must see the stored manifest
+        manifest = load_manifest(tenant_id, backend, max_age=0.0 if attempt else Config.CHUNK_MANIFEST_TTL)
+        # source object -> doc_id -> datapoint ids still to fetch
+        by_source: Dict[str, Dict[str, List[str]]] = {}
+        for doc_id, datapoint_ids in pending.items():
+            if doc_id in manifest["docs"]:
+                source = manifest["docs"][doc_id]
+            elif doc_id in manifest["tombstones"]:
+                continue
+            else:
+                source = chunk_object_name(tenant_id, doc_id)
+            if cache is not None:
+                found, datapoint_ids = cache.get_many(datapoint_ids, source)
+                records.update(found)
+            if datapoint_ids:
+                by_source.setdefault(source, {})[doc_id] = datapoint_ids
+
+        futures: Dict[Future, Tuple[str, Dict[str, List[str]]]] = {}
+        for source, docs in by_source.items():
+            if source.endswith(".seg"):
+                wanted = [datapoint_id for datapoint_ids in docs.values() for datapoint_id in datapoint_ids]
+                futures[pool.submit(_fetch_segment, backend, source, wanted)] = (source, docs)
+            else:
+                for doc_id, datapoint_ids in docs.items():
+                    future = pool.submit(_fetch_unsegmented, backend, tenant_id, doc_id, datapoint_ids)
+                    futures[future] = (source, {doc_id: datapoint_ids})
+        if not futures:
+            break
+
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        for future in not_done:
+            future.cancel()
+            print(f"Warning: chunk fetch from {futures[future][0]} timed out; skipping its chunks")
+
+        moved: List[str] = []
+        for future in done:
+            source, docs = futures[future]
+            try:
+                fetched = future.result()
+            except FileNotFoundError:
+                # The segment was compacted away and deleted; refetch its
+                # documents with a fresh manifest
+                with _segment_cache_lock:
+                    _segment_cache.pop(source, None)
+                moved.extend(docs)
+                continue
+            except Exception as e:
+                print(f"Warning: chunk fetch from {source} failed ({e}); skipping its chunks")
+                continue
+            records.update(fetched)
+            if cache is not None:
+                for doc_id, datapoint_ids in docs.items():
+                    cache.put_many(tenant_id, doc_id, source, {
+                        datapoint_id: fetched[datapoint_id]
+                        for datapoint_id in datapoint_ids if datapoint_id in fetched
+                    })
+
+        if not moved or attempt:
+            if moved:
+                print(f"Warning: chunk segments for {moved} disappeared twice; skipping their chunks")
+            break
+        pending = {doc_id: doc_chunks[doc_id] for doc_id in moved}
+    return records
+
+
+def fetch_chunks(
+    tenant_id: str,
+    doc_id: str,
+    datapoint_ids: Iterable[str],
+    backend: Optional[ChunkBackend] = None
+) -> Dict[str, dict]:
+    """
+    Fetch the records of specific chunks of one document.
+
+    Args:
+        tenant_id: Tenant identifier
+        doc_id: Document identifier
+        datapoint_ids: Datapoint ids of the chunks to fetch
+        backend: Chunk backend to use (defaults to get_chunk_backend())
+
+    Returns:
+        Mapping of datapoint_id to record for the ids that exist
+    """
+    return fetch_tenant_chunks(tenant_id, {doc_id: list(datapoint_ids)}, backend=backend)
+
+
+def compact_tenant(
+    tenant_id: str,
+    backend: Optional[ChunkBackend] = None,
+    min_segments: Optional[int] = None,
+    target_bytes: Optional[int] = None,
+    grace_seconds: Optional[float] = None
+) -> dict:
+    """
+    Merge a tenant's small segments into one packed segment.
+
+    Live chunks of the segments smaller than target_bytes (oldest first, up
+    to target_bytes in total) are copied, without recompressing, into a new
+    segment; dead copies of re-ingested documents and tombstoned documents
+    are dropped (tombstones stay, so a document's pre-segment objects are
+    never read again). Nothing is merged unless at least min_segments segments
+    qualify. Segments retired by earlier compactions, and orphaned segments
+    from ingests that never committed, are deleted once older than
+    grace_seconds.
+
+    Args:
+        tenant_id: Tenant identifier
+        backend: Chunk backend to use (defaults to get_chunk_backend())
+        min_segments: Minimum number of small segments worth merging
+        target_bytes: Size above which a segment is left alone
+        grace_seconds: How long retired segments stay readable
+
+    Returns:
+        Dictionary with merged, written (segment name or None), chunks,
+        dropped and deleted counts, and how many retired segments are
+        still waiting to be deleted
+    """
+    backend = backend or get_chunk_backend()
+    min_segments = min_segments or Config.CHUNK_COMPACT_MIN_SEGMENTS
+    target_bytes = target_bytes or Config.CHUNK_COMPACT_TARGET_BYTES
+    grace = Config.CHUNK_COMPACT_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    stats = {"merged": 0, "written": None, "chunks": 0, "dropped": 0, "deleted": 0, "retired": 0}
+
+    stats["deleted"] = _collect_garbage(tenant_id, backend, grace)
+
+    manifest = load_manifest(tenant_id, backend)
+    stats["retired"] = len(manifest["retired"])
+    candidates, total = [], 0
+    for segment in manifest["segments"]:
+        if segment["bytes"] >= target_bytes:
+            continue
+        if candidates and total + segment["bytes"] > target_bytes:
+            break
+        candidates.append(segment["name"])
+        total += segment["bytes"]
+    if len(candidates) < min_segments:
+        return stats
+
+    live = manifest["docs"]
+    writer = SegmentWriter(backend, new_segment_name(tenant_id), f"{tenant_id}_")
+    for name in candidates:
+        segment = _open_object(backend, name, tail_bytes=1 << 62)   # whole segment in one read
+        entries = sorted(segment.index.items(), key=lambda item: item[1][0])
+        checksums = segment.checksums()
+        keep = [datapoint_id for datapoint_id, entry in entries if live.get(entry[3]) == name]
+        raw = segment.raw_records(keep)
+        for datapoint_id in keep:
+            writer.add(segment.index[datapoint_id][3], datapoint_id, raw[datapoint_id], checksums[datapoint_id])
+        stats["dropped"] += len(entries) - len(keep)
+    size = writer.close()
+    merged = set(candidates)
+
+    def swap(current: dict) -> Optional[dict]:
+        if not merged <= {segment["name"] for segment in current["segments"]}:
+            return None   # another compaction got there first
+        segments = [segment for segment in current["segments"] if segment["name"] not in merged]
+        still_live = [doc_id for doc_id in writer.docs if current["docs"].get(doc_id) in merged]
+        for doc_id in still_live:
+            current["docs"][doc_id] = writer.name
+        segments.append({"name": writer.name, "bytes": size, "docs": still_live})
+        current["segments"] = segments
+        current["retired"].extend({"name": name, "at": time.time()} for name in candidates)
+        return current
+
+    committed = update_manifest(tenant_id, swap, backend=backend)
+    stats["retired"] = len(committed["retired"])
+    if not any(segment["name"] == writer.name for segment in committed["segments"]):
+        backend.delete(writer.name)
+        return stats
+
+    cache = get_chunk_cache()
+    if cache is not None:
+        cache.move_source(candidates, writer.name)
+    stats.update(merged=len(candidates), written=writer.name, chunks=writer.count)
+    print(f"Compacted {len(candidates)} chunk segments of {tenant_id} into {writer.name} "
+          f"({writer.count} chunks, {stats['dropped']} dropped)")
+    return stats
+
+
+def _collect_garbage(tenant_id: str, backend: ChunkBackend, grace: float) -> int:
+    now = time.time()
+    expired: List[str] = []
+
+    def drop_expired(manifest: dict) -> Optional[dict]:
+        expired[:] = [entry["name"] for entry in manifest["retired"] if now - entry["at"] >= grace]
+        if not expired:
+            return None
+        manifest["retired"] = [entry for entry in manifest["retired"] if entry["name"] not in expired]
+        return manifest
+
+    manifest = update_manifest(tenant_id, drop_expired, backend=backend)
+    referenced = {segment["name"] for segment in manifest["segments"]}
+    referenced.update(entry["name"] for entry in manifest["retired"])
+    # Segments written by ingests that failed before committing to the manifest
+    orphans = [
+        name for name in backend.list(f"chunks/{tenant_id}/segments/")
+        if name.endswith(".seg") and name not in referenced and name not in expired
+        and now - _segment_created(name) >= grace
+    ]
+    for name in expired + orphans:
+        backend.delete(name)
+    return len(expired) + len(orphans)
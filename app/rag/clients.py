@@ -0,0 +1,234 @@
+"""Process-wide registry of Vertex AI and Cloud Storage clients.
+
+Creating these clients is expensive (credential discovery, model metadata
+lookups, channel setup), so they are built once per process and shared by
+every request instead of being re-created inside each call.
+"""
+import threading
+from typing import Any, Dict, Optional
+
+from app.config import Config
+
+
+class ClientRegistry:
+    """Lazily-built, thread-safe cache of long-lived Google Cloud clients."""
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        project_number: Optional[str] = None,
+        location: Optional[str] = None,
+        pool_size: Optional[int] = None
+    ):
+        self.project_id = project_id or Config.PROJECT_ID
+        self.project_number = project_number or Config.PROJECT_NUMBER
+        self.location = location or Config.LOCATION
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+
+        self._lock = threading.RLock()
+        self._vertex_initialized = False
+        self._embedding_models: Dict[str, Any] = {}
+        self._generative_models: Dict[str, Any] = {}
+        self._storage_client = None
+        self._http_session = None
+        self._index_endpoint = None
+        self._index = None
+        self._index_service_client = None
+
+    def initialize(self) -> None:
+        """
+        Initialize the Vertex AI SDK and warm up the clients used on every request.
+        """
+        self._ensure_vertex()
+        self.storage_client()
+        self.embedding_model(Config.EMBEDDING_MODEL)
+        self.generative_model(Config.GENERATION_MODEL)
+        self.index_endpoint()
+
+    def _ensure_vertex(self) -> None:
+        if self._vertex_initialized:
+            return
+        with self._lock:
+            if self._vertex_initialized:
+                return
+            import vertexai
+            from google.cloud import aiplatform
+
+            vertexai.init(project=self.project_id, location=self.location)
+            aiplatform.init(project=self.project_id, location=self.location)
+            self._vertex_initialized = True
+
+    def embedding_model(self, model_name: str):
+        """Return a cached TextEmbeddingModel for the given model name."""
+        model = self._embedding_models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._embedding_models.get(model_name)
+            if model is None:
+                self._ensure_vertex()
+                from vertexai.preview.language_models import TextEmbeddingModel
+
+                model = TextEmbeddingModel.from_pretrained(model_name)
+                self._embedding_models[model_name] = model
+        return model
+
+    def generative_model(self, model_name: str):
+        """Return a cached GenerativeModel for the given model name."""
+        model = self._generative_models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._generative_models.get(model_name)
+            if model is None:
+                self._ensure_vertex()
+                from vertexai.preview.generative_models import GenerativeModel
+
+                model = GenerativeModel(model_name)
+                self._generative_models[model_name] = model
+        return model
+
+    def storage_client(self):
+        """
+        Return a shared Cloud Storage client.
+
+        The client's HTTP session mounts an adapter with a connection pool sized
+        to Config.HTTP_POOL_SIZE so concurrent downloads reuse keep-alive
+        connections instead of opening a new TLS session each time.
+        """
+        if self._storage_client is not None:
+            return self._storage_client
+        with self._lock:
+            if self._storage_client is None:
+                import google.auth
+                from google.auth.transport.requests import AuthorizedSession
+                from google.cloud import storage
+                from requests.adapters import HTTPAdapter
+
+                credentials, _ = google.auth.default(
+                    scopes=["https://www.googleapis.com/auth/cloud-platform"]
+                )
+                session = AuthorizedSession(credentials)
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+                self._http_session = session
+                self._storage_client = storage.Client(
+                    project=self.project_id,
+                    credentials=credentials,
+                    _http=session
+                )
+        return self._storage_client
+
+    def bucket(self, bucket_name: Optional[str] = None):
+        """Return a bucket handle on the shared storage client."""
+        return self.storage_client().bucket(bucket_name or Config.BUCKET_NAME)
+
+    def index_endpoint(self):
+        """Return the shared MatchingEngineIndexEndpoint for Config.INDEX_ENDPOINT_ID."""
+        if self._index_endpoint is not None:
+            return self._index_endpoint
+        with self._lock:
+            if self._index_endpoint is None:
+                self._ensure_vertex()
+                from google.cloud import aiplatform
+
+                self._index_endpoint = aiplatform.MatchingEngineIndexEndpoint(
+                    index_endpoint_name=(
+                        f"projects/{self.project_number}/locations/{self.location}"
+                        f"/indexEndpoints/{Config.INDEX_ENDPOINT_ID}"
+                    )
+                )
+        return self._index_endpoint
+
+    def index_name(self) -> str:
+        """Return the fully-qualified resource name of Config.INDEX_ID."""
+        return f"projects/{self.project_number}/locations/{self.location}/indexes/{Config.INDEX_ID}"
+
+    def index(self):
+        """Return the shared MatchingEngineIndex for Config.INDEX_ID."""
+        if self._index is not None:
+            return self._index
+        with self._lock:
+            if self._index is None:
+                self._ensure_vertex()
+                from google.cloud import aiplatform
+
+                self._index = aiplatform.MatchingEngineIndex(index_name=self.index_name())
+        return self._index
+
+    def index_service_client(self):
+        """Return the shared low-level IndexServiceClient (single gRPC channel)."""
+        if self._index_service_client is not None:
+            return self._index_service_client
+        with self._lock:
+            if self._index_service_client is None:
+                from google.cloud import aiplatform_v1
+
+                client_options = {"api_endpoint": f"{self.location}-aiplatform.googleapis.com"}
+                self._index_service_client = aiplatform_v1.IndexServiceClient(
+                    client_options=client_options
+                )
+        return self._index_service_client
+
+    def close(self) -> None:
+        """Release pooled connections held by the registry."""
+        with self._lock:
+            if self._http_session is not None:
+                self._http_session.close()
+            if self._index_service_client is not None:
+                try:
+                    self._index_service_client.transport.close()
+                except Exception:
+                    pass
+            self._embedding_models.clear()
+            self._generative_models.clear()
+            self._storage_client = None
+            self._http_session = None
+            self._index_endpoint = None
+            self._index = None
+            self._index_service_client = None
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_clients() -> ClientRegistry:
+    """
+    Return the process-wide client registry, creating it on first use.
+
+    Returns:
+        Shared ClientRegistry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry()
+    return _registry
+
+
+def init_clients() -> ClientRegistry:
+    """
+    Build and warm up the process-wide client registry.
+
+    Returns:
+        Initialized ClientRegistry instance
+    """
+    clients = get_clients()
+    clients.initialize()
+    return clients
+
+
+def close_clients() -> None:
+    """Close and drop the process-wide client registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is not None:
+            _registry.close()
+            _registry = None
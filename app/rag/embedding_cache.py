@@ -0,0 +1,305 @@
+"""Content-addressed embedding cache with an in-memory LRU tier and an on-disk tier.
+
+Entries are keyed by (model name, task type, text checksum), so identical
+chunk text is embedded once no matter which document or tenant it came from.
+The disk tier stores vectors in an append-only float32 file that is read
+through a memory map, plus an append-only key index. It is never evicted,
+so only chunk embeddings (bounded by the indexed corpus) are written to it;
+query embeddings stay in the memory LRU (persist=False).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process local development only
+    fcntl = None
+
+
+def cache_key(model_name: str, task_type: str, checksum: str) -> str:
+    """
+    Build the cache key for one embedding.
+
+    Args:
+        model_name: Embedding model name
+        task_type: Embedding task type (e.g. RETRIEVAL_DOCUMENT)
+        checksum: Text checksum from calculate_checksum
+
+    Returns:
+        Hex digest identifying the embedding
+    """
+    return hashlib.sha256(f"{model_name}|{task_type}|{checksum}".encode("utf-8")).hexdigest()
+
+
+class _DiskTier:
+    """Append-only float32 vector file plus key index for one dimensionality."""
+
+    def __init__(self, directory: str, dims: int):
+        self.dims = dims
+        self.vectors_path = os.path.join(directory, f"vectors-{dims}.f32")
+        self.index_path = os.path.join(directory, f"keys-{dims}.idx")
+        self.row_bytes = dims * 4
+        self._slots: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._index_offset = 0
+        self._load_index()
+
+    def _vector_rows(self) -> int:
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // self.row_bytes
+
+    def _load_index(self) -> None:
+        """Read index lines appended since the last load (also by other processes)."""
+        if not os.path.exists(self.index_path):
+            return
+        rows = self._vector_rows()
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partially written line from a concurrent writer
+                key, slot = line.decode("ascii").split()
+                if int(slot) < rows:
+                    self._slots[key] = int(slot)
+                self._index_offset += len(line)
+
+    def _matrix(self, min_rows: int) -> Optional[np.memmap]:
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            rows = self._vector_rows()
+            if rows == 0:
+                return None
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dims))
+        return self._mmap
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        slot = self._slots.get(key)
+        if slot is None:
+            self._load_index()
+            slot = self._slots.get(key)
+            if slot is None:
+                return None
+        matrix = self._matrix(slot + 1)
+        if matrix is None or slot >= matrix.shape[0]:
+            return None
+        return np.array(matrix[slot])
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        new = [(k, v) for k, v in zip(keys, vectors) if k not in self._slots]
+        if not new:
+            return
+        with open(self.vectors_path, "ab") as vf, open(self.index_path, "a", encoding="ascii") as idx:
+            if fcntl is not None:
+                fcntl.flock(vf.fileno(), fcntl.LOCK_EX)
+            try:
+                first_slot = vf.seek(0, os.SEEK_END) // self.row_bytes
+                block = np.asarray([v for _, v in new], dtype=np.float32)
+                vf.write(block.tobytes())
+                vf.flush()
+                # Index lines go after the vectors so a reader never sees a dangling slot
+                idx.write("".join(f"{k} {first_slot + i}\n" for i, (k, _) in enumerate(new)))
+                idx.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(vf.fileno(), fcntl.LOCK_UN)
+        self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + memory-mapped disk) embedding cache."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        memory_items: Optional[int] = None,
+        disk_enabled: bool = True
+    ):
+        self.directory = directory or Config.EMBEDDING_CACHE_DIR
+        self.memory_items = memory_items if memory_items is not None else Config.EMBEDDING_CACHE_MEMORY_ITEMS
+        self.disk_enabled = disk_enabled
+        if disk_enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._disk: Dict[int, _DiskTier] = {}
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_tiers(self) -> List[_DiskTier]:
+        if not self.disk_enabled:
+            return []
+        for name in os.listdir(self.directory):
+            if name.startswith("vectors-") and name.endswith(".f32"):
+                dims = int(name[len("vectors-"):-len(".f32")])
+                if dims not in self._disk:
+                    self._disk[dims] = _DiskTier(self.directory, dims)
+        return list(self._disk.values())
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings by key.
+
+        Args:
+            keys: Keys from cache_key
+
+        Returns:
+            One float32 vector per key, or None for misses
+        """
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            tiers = None
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results.append(vector)
+                    continue
+
+                if tiers is None:
+                    tiers = self._disk_tiers()
+                for tier in tiers:
+                    vector = tier.get(key)
+                    if vector is not None:
+                        break
+                if vector is not None:
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+                else:
+                    self.misses += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]], persist: bool = True) -> None:
+        """
+        Store embeddings in the memory tier and, with persist, the disk tier.
+
+        Args:
+            keys: Keys from cache_key
+            vectors: Embedding vectors, one per key
+            persist: Also append them to the (never evicted) disk tier
+        """
+        if not keys:
+            return
+        arrays = [np.asarray(v, dtype=np.float32) for v in vectors]
+        with self._lock:
+            for key, vector in zip(keys, arrays):
+                self._remember(key, vector)
+            if self.disk_enabled and persist:
+                by_dims: Dict[int, List[int]] = {}
+                for i, vector in enumerate(arrays):
+                    by_dims.setdefault(vector.shape[0], []).append(i)
+                for dims, indices in by_dims.items():
+                    tier = self._disk.get(dims)
+                    if tier is None:
+                        tier = self._disk[dims] = _DiskTier(self.directory, dims)
+                    tier.put_many([keys[i] for i in indices], [arrays[i] for i in indices])
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/eviction counters and tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_items": sum(len(tier) for tier in self._disk.values()),
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, or None when disabled.
+
+    Returns:
+        Shared EmbeddingCache instance or None
+    """
+    global _cache
+    if not Config.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def cached_embed(
+    texts: Sequence[str],
+    checksums: Sequence[str],
+    model_name: str,
+    task_type: str,
+    embed_missing,
+    cache: Optional[EmbeddingCache] = None,
+    persist: bool = True
+) -> List[List[float]]:
+    """
+    Embed texts through the cache, calling embed_missing only for unique misses.
+
+    Args:
+        texts: Texts to embed
+        checksums: Checksum of each text
+        model_name: Embedding model name
+        task_type: Embedding task type
+        embed_missing: Callable embedding a list of texts (called at most once)
+        cache: Cache to use (defaults to the process-wide cache)
+        persist: Write new embeddings to the disk tier too (False for
+            unbounded inputs such as user queries)
+
+    Returns:
+        One embedding vector per input text, in input order
+    """
+    cache = cache if cache is not None else get_embedding_cache()
+    if cache is None:
+        return embed_missing(list(texts)) if texts else []
+
+    keys = [cache_key(model_name, task_type, checksum) for checksum in checksums]
+    cached = cache.get_many(keys)
+
+    # Embed each distinct missing text once, even if it repeats within the batch
+    missing: Dict[str, int] = {}
+    for i, (key, vector) in enumerate(zip(keys, cached)):
+        if vector is None and key not in missing:
+            missing[key] = i
+
+    fresh: Dict[str, List[float]] = {}
+    if missing:
+        missing_keys = list(missing)
+        vectors = embed_missing([texts[missing[k]] for k in missing_keys])
+        # Round through float32 so fresh and cached results are bit-identical
+        arrays = [np.asarray(v, dtype=np.float32) for v in vectors]
+        cache.put_many(missing_keys, arrays, persist=persist)
+        fresh = dict(zip(missing_keys, arrays))
+
+    return [
+        (fresh[key] if vector is None else vector).tolist()
+        for key, vector in zip(keys, cached)
+    ]
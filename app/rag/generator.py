@@ -1,7 +1,8 @@
 import json
-from typing import List, Tuple
-from google.cloud import aiplatform
+from typing import List, Optional, Tuple
 from app.schemas.dto import ChunkHit, Citation
+from app.rag.clients import ClientRegistry, get_clients
+from app.utils.concurrency import run_io
 
 
 def generate_answer(
@@ -9,7 +10,8 @@ def generate_answer(
     hits: List[ChunkHit],
     model_name: str = "gemini-2.5-flash",
     temperature: float = 0.0,  # より決定論的に
-    max_tokens: int = 1500  # トークン数を増やす
+    max_tokens: int = 1500,  # トークン数を増やす
+    clients: Optional[ClientRegistry] = None
 ) -> Tuple[str, List[Citation]]:
     """
     Generate answer using Gemini with mandatory citations.
@@ -89,14 +91,9 @@ def generate_answer(
 
 上記の参考資料に基づいて回答してください。cited_chunksには使用したチャンクの情報を必ず含めてください。"""
 
-    # Use Vertex AI Gemini API
-    import vertexai
-    from vertexai.preview.generative_models import GenerativeModel
-    from app.config import Config
-
-    vertexai.init(project=Config.PROJECT_ID, location=Config.LOCATION)
-
-    model = GenerativeModel(model_name)
+    # Use Vertex AI Gemini API (model instance is shared across requests)
+    clients = clients or get_clients()
+    model = clients.generative_model(model_name)
 
     full_prompt = f"{system_prompt}\n\n{user_prompt}"
 
@@ -225,7 +222,7 @@ async def generate_answer_with_retry(
     """
     for attempt in range(max_retries + 1):
         try:
-            return generate_answer(query, hits, **kwargs)
+            return await run_io("generate", generate_answer, query, hits, **kwargs)
         except ValueError as e:
             if attempt == max_retries:
                 raise ValueError(f"Failed to generate answer with citations after {max_retries + 1} attempts: {str(e)}")
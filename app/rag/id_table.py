@@ -0,0 +1,233 @@
+"""Dense integer datapoint ids and a memory-mapped id -> chunk table.
+
+With DATAPOINT_IDS=int the vector index stores each chunk under a small
+integer id ("48213") instead of "{tenant_id}_{doc_id}_{chunk_id}". The
+table maps ids back to the chunk: row i of rows.bin is the fixed-width
+record of id i,
+
+    tenant code (u4) | doc code (u4) | chunk index (u4) | page (i4)
+
+and names.tsv interns tenant and document ids to those codes. Both files
+are append-only; rows.bin is read through a memory map, so a whole
+neighbor list is resolved and filtered by tenant with NumPy indexing.
+
+A chunk keeps its id across re-ingests (the id is looked up by tenant,
+doc and chunk index), so incremental upserts overwrite the same
+datapoint. Removed chunks have their row's tenant set to RELEASED and get
+a new id if they come back. The chunk index is the key of the chunk in
+the chunk store, whose byte offsets change with compaction.
+
+Ids are allocated from files in this instance's DATA_DIR, so two instances
+would hand out the same id for different chunks. Integer ids are therefore
+only accepted with VECTOR_BACKEND=local, where each instance owns its index
+(Config.validate_datapoint_ids).
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process local development only
+    fcntl = None
+
+ROW = np.dtype([("tenant", "<u4"), ("doc", "<u4"), ("chunk", "<u4"), ("page", "<i4")])
+RELEASED = 0xFFFFFFFF
+
+
+class DatapointIdTable:
+    """Allocator and lookup table for integer datapoint ids."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.DATAPOINT_ID_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.rows_path = os.path.join(self.directory, "rows.bin")
+        self.names_path = os.path.join(self.directory, "names.tsv")
+        self._lock = threading.Lock()
+        # kind ("t" tenant, "d" document) -> names by code / codes by name
+        self._names: Dict[str, List[str]] = {"t": [], "d": []}
+        self._codes: Dict[str, Dict[str, int]] = {"t": {}, "d": {}}
+        self._names_offset = 0
+        self._rows: np.ndarray = np.empty(0, dtype=ROW)
+        self._slots: Dict[Tuple[int, int, int], int] = {}
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        """Read names and rows appended since the last load (also by other processes)."""
+        if os.path.exists(self.names_path):
+            with open(self.names_path, "rb") as f:
+                f.seek(self._names_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # partially written line from a concurrent writer
+                    kind, code, name = line.decode("utf-8").rstrip("\n").split("\t", 2)
+                    if int(code) == len(self._names[kind]):
+                        self._names[kind].append(name)
+                        self._codes[kind][name] = int(code)
+                    self._names_offset += len(line)
+
+        count = os.path.getsize(self.rows_path) // ROW.itemsize if os.path.exists(self.rows_path) else 0
+        if count == len(self._rows):
+            return
+        known = len(self._rows)
+        self._rows = np.memmap(self.rows_path, dtype=ROW, mode="r+", shape=(count,))
+        new = self._rows[known:]
+        live = np.flatnonzero(new["tenant"] != RELEASED)
+        for i, tenant, doc, chunk in zip(
+            (live + known).tolist(),
+            new["tenant"][live].tolist(),
+            new["doc"][live].tolist(),
+            new["chunk"][live].tolist()
+        ):
+            self._slots[(tenant, doc, chunk)] = i
+
+    def _intern(self, kind: str, name: str, names_file) -> int:
+        code = self._codes[kind].get(name)
+        if code is None:
+            code = len(self._names[kind])
+            names_file.write(f"{kind}\t{code}\t{name}\n".encode("utf-8"))
+            self._names[kind].append(name)
+            self._codes[kind][name] = code
+        return code
+
+    def _slot(self, key: Tuple[int, int, int]) -> Optional[int]:
+        slot = self._slots.get(key)
+        # Another process may have released the row since it was indexed here
+        if slot is not None and self._rows["tenant"][slot] == RELEASED:
+            del self._slots[key]
+            return None
+        return slot
+
+    def allocate(self, tenant_id: str, doc_id: str, chunks: Sequence[Tuple[int, int]]) -> List[int]:
+        """
+        Return the ids of a document's chunks, allocating ids for new ones.
+
+        Args:
+            tenant_id: Tenant identifier
+            doc_id: Document identifier
+            chunks: (chunk index, page) of each chunk
+
+        Returns:
+            One id per chunk, in input order
+        """
+        with self._lock, open(self.names_path, "ab") as names_file, open(self.rows_path, "ab") as rows_file:
+            if fcntl is not None:
+                fcntl.flock(rows_file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._load()
+                tenant = self._intern("t", tenant_id, names_file)
+                doc = self._intern("d", doc_id, names_file)
+                # Names go to disk before the rows that refer to them
+                names_file.flush()
+
+                ids: List[int] = []
+                new_rows = []
+                next_id = len(self._rows)
+                for index, page in chunks:
+                    slot = self._slot((tenant, doc, index))
+                    if slot is None:
+                        slot = next_id + len(new_rows)
+                        new_rows.append((tenant, doc, index, page))
+                        self._slots[(tenant, doc, index)] = slot
+                    elif self._rows["page"][slot] != page:
+                        self._rows["page"][slot] = page
+                    ids.append(slot)
+                if new_rows:
+                    rows_file.write(np.array(new_rows, dtype=ROW).tobytes())
+                    rows_file.flush()
+                    self._load()
+                return ids
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(rows_file.fileno(), fcntl.LOCK_UN)
+
+    def lookup(self, tenant_id: str, doc_id: str, chunk_indices: Sequence[int]) -> List[Optional[int]]:
+        """Return the ids of existing chunks (None for chunks without one)."""
+        with self._lock:
+            self._load()
+            tenant = self._codes["t"].get(tenant_id)
+            doc = self._codes["d"].get(doc_id)
+            if tenant is None or doc is None:
+                return [None] * len(chunk_indices)
+            return [self._slot((tenant, doc, index)) for index in chunk_indices]
+
+    def release(self, ids: Sequence[int]) -> None:
+        """Mark the ids of removed chunks as no longer belonging to any tenant."""
+        if not ids:
+            return
+        with self._lock:
+            self._load()
+            ids = np.asarray(ids, dtype=np.int64)
+            rows = self._rows[ids]
+            for tenant, doc, chunk in zip(rows["tenant"].tolist(), rows["doc"].tolist(), rows["chunk"].tolist()):
+                self._slots.pop((tenant, doc, chunk), None)
+            self._rows["tenant"][ids] = RELEASED
+            self._rows.flush()
+
+    def resolve(self, tenant_id: str, ids: np.ndarray) -> Tuple[np.ndarray, List[str], np.ndarray, np.ndarray]:
+        """
+        Keep the ids of a neighbor list that belong to a tenant and describe them.
+
+        Args:
+            tenant_id: Tenant the caller is searching for
+            ids: Neighbor ids (negative for ids that are not integers)
+
+        Returns:
+            (positions in ids of the tenant's chunks, their doc ids, chunk
+            indices and pages)
+        """
+        if len(ids) and ids.max() >= len(self._rows):
+            with self._lock:
+                self._load()
+        tenant = self._codes["t"].get(tenant_id)
+        # Plain ndarray view: fancy indexing a memmap builds memmap objects
+        rows = self._rows.view(np.ndarray)
+        doc_names = self._names["d"]
+        if tenant is None or not len(ids):
+            return np.empty(0, dtype=np.int64), [], np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+        valid = (ids >= 0) & (ids < len(rows))
+        positions = np.flatnonzero(valid)
+        matched = rows[ids[positions]]
+        keep = matched["tenant"] == tenant
+        positions, matched = positions[keep], matched[keep]
+        return positions, [doc_names[code] for code in matched["doc"].tolist()], matched["chunk"], matched["page"]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+_table: Optional[DatapointIdTable] = None
+_table_lock = threading.Lock()
+
+
+def get_id_table() -> DatapointIdTable:
+    """
+    Return the process-wide datapoint id table, creating it on first use.
+
+    Returns:
+        Shared DatapointIdTable instance
+
+    Raises:
+        ValueError: If the configured vector backend is shared between instances
+    """
+    global _table
+    Config.validate_datapoint_ids()
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = DatapointIdTable()
+    return _table
+
+
+def neighbor_ids(raw_ids: Sequence[str]) -> np.ndarray:
+    """Convert neighbor ids to int64, with -1 for ids that are not integers."""
+    try:
+        return np.array(raw_ids, dtype=np.int64)
+    except ValueError:
+        # String ids left over from before the switch to integer ids
+        return np.array([int(raw) if raw.isdigit() else -1 for raw in raw_ids], dtype=np.int64)
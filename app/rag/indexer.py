@@ -1,131 +1,263 @@
 import uuid
-from typing import List
-from google.cloud import aiplatform
+from typing import Callable, Dict, List, Optional, Tuple
 from google.cloud import aiplatform_v1
-from app.schemas.dto import Chunk
-from app.utils.pdf import extract_text_from_pdf
-from app.utils.chunks import make_chunks
-
-
-def embed_texts(texts: List[str], model_name: str = "text-embedding-005") -> List[List[float]]:
+from app.rag.batcher import EmbeddingBatcher
+from app.rag.chunk_store import get_chunk_backend, read_manifest
+from app.rag.clients import ClientRegistry, get_clients
+from app.rag.embedding_cache import cached_embed
+from app.rag.id_table import get_id_table
+from app.rag.payload_store import get_payload_store
+from app.rag.vector_store import get_vector_index
+from app.utils.chunks import ChunkRef
+from app.utils.hash import calculate_checksum
+from app.utils.concurrency import run_io
+
+
+def embed_texts(
+    texts: List[str],
+    model_name: str = "text-embedding-005",
+    clients: Optional[ClientRegistry] = None,
+    checksums: Optional[List[str]] = None,
+    parallelism: Optional[int] = None
+) -> List[List[float]]:
     """
     Generate embeddings for a list of texts using Vertex AI.
 
+    Texts whose (model, task type, checksum) is already in the embedding
+    cache are not sent to the API.
+
     Args:
         texts: List of text strings to embed
         model_name: Name of the embedding model
+        clients: Client registry to use (defaults to the process-wide registry)
+        checksums: Checksum of each text (computed when omitted)
+        parallelism: Concurrent requests for this call (default: EMBED_PARALLELISM);
+            callers that already run calls concurrently pass 1
 
     Returns:
         List of embedding vectors
     """
-    from vertexai.preview.language_models import TextEmbeddingInput, TextEmbeddingModel
-    import vertexai
+    from vertexai.preview.language_models import TextEmbeddingInput
+
+    clients = clients or get_clients()
+    model = clients.embedding_model(model_name)
+
+    def embed_batch(batch: List[str]) -> List[List[float]]:
+        # Create TextEmbeddingInput objects with RETRIEVAL_DOCUMENT task type
+        text_inputs = [
+            TextEmbeddingInput(
+                text=text,
+                task_type="RETRIEVAL_DOCUMENT"  # Specify task type for document indexing
+            )
+            for text in batch
+        ]
+        embeddings = model.get_embeddings(text_inputs)
+        return [embedding.values for embedding in embeddings]
+
+    if checksums is None:
+        checksums = [calculate_checksum(text) for text in texts]
+
+    # Pack uncached chunks into request-sized batches and embed them concurrently
+    return cached_embed(
+        texts,
+        checksums,
+        model_name=model_name,
+        task_type="RETRIEVAL_DOCUMENT",
+        embed_missing=EmbeddingBatcher(embed_batch, parallelism=parallelism).embed
+    )
+
+
+def datapoint_id_for(tenant_id: str, doc_id: str, chunk_id: str) -> str:
+    """Build the Vector Search datapoint id of a chunk."""
+    return f"{tenant_id}_{doc_id}_{chunk_id}"
+
+
+def parse_datapoint_id(datapoint_id: str, tenant_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a datapoint id of the given tenant back into doc id and chunk id.
+
+    The tenant id is matched as a prefix and the chunk id (which never
+    contains an underscore) is taken from the end, so tenant and document
+    ids may contain underscores.
+
+    Args:
+        datapoint_id: Datapoint id from datapoint_id_for
+        tenant_id: Tenant the caller is searching for
+
+    Returns:
+        (doc_id, chunk_id), or None when the id belongs to another tenant
+    """
+    if not datapoint_id.startswith(f"{tenant_id}_"):
+        return None
+    doc_id, _, chunk_id = datapoint_id[len(tenant_id) + 1:].rpartition("_")
+    if not doc_id:
+        return None
+    return doc_id, chunk_id
+
+
+def index_ids_for(tenant_id: str, doc_id: str, chunks: List[ChunkRef]) -> List[str]:
+    """
+    Return the ids the vector index stores a document's chunks under.
+
+    With Config.DATAPOINT_IDS == "int" these are dense integer ids from the
+    datapoint id table (allocated on first use); otherwise the chunk
+    datapoint ids themselves.
+    """
     from app.config import Config
 
-    vertexai.init(project=Config.PROJECT_ID, location=Config.LOCATION)
+    if Config.DATAPOINT_IDS == "int":
+        ids = get_id_table().allocate(tenant_id, doc_id, [(chunk.index, chunk.page) for chunk in chunks])
+        return [str(i) for i in ids]
+    return [datapoint_id_for(tenant_id, doc_id, chunk.chunk_id) for chunk in chunks]
 
-    model = TextEmbeddingModel.from_pretrained(model_name)
 
-    # Create TextEmbeddingInput objects with RETRIEVAL_DOCUMENT task type
-    text_inputs = [
-        TextEmbeddingInput(
-            text=text,
-            task_type="RETRIEVAL_DOCUMENT"  # Specify task type for document indexing
-        )
-        for text in texts
-    ]
+def lookup_index_ids(tenant_id: str, doc_id: str, datapoint_ids: List[str]) -> List[str]:
+    """
+    Map chunk datapoint ids to the ids stored in the vector index.
 
-    embeddings = model.get_embeddings(text_inputs)
+    In integer mode chunks that never received an integer id are skipped.
+    """
+    from app.config import Config
+
+    if Config.DATAPOINT_IDS != "int" or not datapoint_ids:
+        return datapoint_ids
+    indices = []
+    for datapoint_id in datapoint_ids:
+        parsed = parse_datapoint_id(datapoint_id, tenant_id)
+        indices.append(int(parsed[1].rpartition("-")[2]) if parsed else -1)
+    return [str(i) for i in get_id_table().lookup(tenant_id, doc_id, indices) if i is not None]
+
+
+def remove_chunks(
+    tenant_id: str,
+    doc_id: str,
+    datapoint_ids: List[str],
+    clients: Optional[ClientRegistry] = None
+) -> int:
+    """
+    Remove chunks that no longer exist from the vector index, id table and payload sidecar.
+
+    The vectors go first and a failure raises, so the caller can keep the
+    previous chunk manifest and the next ingest retries the removal; ids
+    and payloads are released only once their vectors are gone.
+
+    Returns:
+        Number of vectors removed
+    """
+    from app.config import Config
+
+    index_ids = lookup_index_ids(tenant_id, doc_id, datapoint_ids)
+    removed = remove_vectors(index_ids, clients=clients, tenant_id=tenant_id)
+    if Config.DATAPOINT_IDS == "int":
+        get_id_table().release([int(i) for i in index_ids])
+    payloads = get_payload_store()
+    if payloads is not None:
+        payloads.delete_many(datapoint_ids)
+    return removed
+
+
+def load_chunk_manifest(
+    tenant_id: str,
+    doc_id: str,
+    clients: Optional[ClientRegistry] = None
+) -> Dict[str, str]:
+    """
+    Load the datapoint ids and checksums stored by the previous ingest of a document.
 
-    return [embedding.values for embedding in embeddings]
+    Args:
+        tenant_id: Tenant identifier
+        doc_id: Document identifier
+        clients: Client registry to use (defaults to the process-wide registry)
+
+    Returns:
+        Mapping of datapoint_id to chunk checksum (empty for a new document)
+    """
+    return read_manifest(tenant_id, doc_id, backend=get_chunk_backend(clients))
+
+
+def classify_chunk(previous: Dict[str, str], datapoint_id: str, checksum: str) -> str:
+    """
+    Classify a chunk against the previous manifest by datapoint id and checksum.
+
+    Args:
+        previous: Mapping of datapoint_id to checksum from the last ingest
+        datapoint_id: Datapoint id of the chunk
+        checksum: Checksum of the chunk text
+
+    Returns:
+        "added", "updated" or "unchanged"
+    """
+    if datapoint_id not in previous:
+        return "added"
+    if previous[datapoint_id] != checksum:
+        return "updated"
+    return "unchanged"
 
 
 def upsert_vectors(
     tenant_id: str,
     doc_id: str,
-    chunks: List[Chunk],
+    chunks: List[ChunkRef],
     embeddings: List[List[float]],
     index_id: str,
-    gcs_uri: str
+    gcs_uri: str,
+    clients: Optional[ClientRegistry] = None
 ) -> int:
     """
     Upsert vectors to Vertex AI Vector Search with namespace filtering.
 
+    With Config.VECTOR_BACKEND "local" the vectors go to the in-process
+    index instead ("both" writes to both).
+
     Args:
         tenant_id: Tenant identifier for namespace
         doc_id: Document identifier
-        chunks: List of Chunk objects
+        chunks: List of ChunkRef objects to upsert
         embeddings: List of embedding vectors
         index_id: Vector Search index ID
         gcs_uri: Original GCS URI of the document
+        clients: Client registry to use (defaults to the process-wide registry)
 
     Returns:
         Number of vectors upserted
     """
     from app.config import Config
-    import json
-    from google.cloud import storage
-
-    aiplatform.init(project=Config.PROJECT_ID, location=Config.LOCATION)
 
-    try:
+    if not chunks:
+        return 0
 
-        # Save chunk texts to GCS (only this is needed, not full metadata)
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(Config.BUCKET_NAME)
-
-        # Store chunk texts in a simple format
-        chunk_texts = {}
-        for chunk in chunks:
-            chunk_key = f"{tenant_id}_{doc_id}_{chunk.chunk_id}"
-            chunk_texts[chunk_key] = {
-                "text": chunk.text,
-                "page": chunk.page,
-                "checksum": chunk.checksum,
-                "path": gcs_uri
-            }
+    vector_ids = index_ids_for(tenant_id, doc_id, chunks)
+    if Config.VECTOR_BACKEND in ("local", "both"):
+        get_vector_index().upsert(tenant_id, vector_ids, embeddings)
+        if Config.VECTOR_BACKEND == "local":
+            return len(chunks)
 
-        # Save to GCS
-        chunk_blob_name = f"chunks/{tenant_id}/{doc_id}.json"
-        chunk_blob = bucket.blob(chunk_blob_name)
-        chunk_blob.upload_from_string(
-            json.dumps(chunk_texts),
-            content_type="application/json"
-        )
-
-        # Use the basic aiplatform library for vector upsert
-        aiplatform.init(project=Config.PROJECT_ID, location=Config.LOCATION)
-
-        # Prepare datapoints for Vector Search
-        datapoints = []
-        for chunk, embedding in zip(chunks, embeddings):
-            # Create IndexDatapoint with correct structure
-            datapoint = {
-                "datapoint_id": f"{tenant_id}_{doc_id}_{chunk.chunk_id}",
-                "feature_vector": embedding
-            }
-            datapoints.append(datapoint)
+    clients = clients or get_clients()
 
-        # Initialize AI Platform
-        aiplatform.init(project=Config.PROJECT_ID, location=Config.LOCATION)
+    try:
 
         # Get the MatchingEngineIndex using high-level API
-        index_name = f"projects/{Config.PROJECT_NUMBER}/locations/{Config.LOCATION}/indexes/{Config.INDEX_ID}"
+        index_name = clients.index_name()
 
         print(f"DEBUG - Using INDEX_ID: {Config.INDEX_ID}")
         print(f"DEBUG - Using DEPLOYED_INDEX_ID: {Config.DEPLOYED_INDEX_ID}")
         print(f"DEBUG - Constructed index_name: {index_name}")
 
         # Convert datapoints to proper format with namespace restrictions
+        # (tenant_id for tenant isolation, doc_id for per-document query filters)
         datapoints_for_upsert = []
-        for chunk, embedding in zip(chunks, embeddings):
+        for vector_id, embedding in zip(vector_ids, embeddings):
             datapoint = {
-                "datapoint_id": f"{tenant_id}_{doc_id}_{chunk.chunk_id}",
+                "datapoint_id": vector_id,
                 "feature_vector": embedding,
                 "restricts": [
                     {
                         "namespace": "tenant_id",
                         "allow_list": [tenant_id]
+                    },
+                    {
+                        "namespace": "doc_id",
+                        "allow_list": [doc_id]
                     }
                 ]
             }
@@ -133,7 +265,7 @@ def upsert_vectors(
 
         # Use MatchingEngineIndex for upsert
         try:
-            index = aiplatform.MatchingEngineIndex(index_name=index_name)
+            index = clients.index()
 
             # Perform the upsert operation using high-level API
             response = index.upsert_datapoints(
@@ -143,9 +275,8 @@ def upsert_vectors(
             print(f"High-level API failed: {high_level_error}")
             print("Falling back to low-level API...")
 
-            # リージョンを指定してクライアントを作成
-            client_options = {"api_endpoint": f"{Config.LOCATION}-aiplatform.googleapis.com"}
-            client = aiplatform_v1.IndexServiceClient(client_options=client_options)
+            # リージョン指定済みの共有クライアントを使用
+            client = clients.index_service_client()
 
             # Convert to low-level format
             formatted_datapoints = []
@@ -157,6 +288,10 @@ def upsert_vectors(
                         aiplatform_v1.IndexDatapoint.Restriction(
                             namespace="tenant_id",
                             allow_list=[tenant_id]
+                        ),
+                        aiplatform_v1.IndexDatapoint.Restriction(
+                            namespace="doc_id",
+                            allow_list=[doc_id]
                         )
                     ]
                 )
@@ -170,7 +305,6 @@ def upsert_vectors(
             response = client.upsert_datapoints(request=request)
 
         print(f"Successfully upserted {len(chunks)} vectors to Vector Search")
-        print(f"Chunk texts stored at: gs://{Config.BUCKET_NAME}/{chunk_blob_name}")
         print(f"Response: {response}")
 
         return len(chunks)
@@ -182,44 +316,121 @@ def upsert_vectors(
         raise
 
 
+def remove_vectors(
+    datapoint_ids: List[str],
+    clients: Optional[ClientRegistry] = None,
+    batch_size: Optional[int] = None,
+    tenant_id: str = ""
+) -> int:
+    """
+    Delete datapoints from Vertex AI Vector Search in batches.
+
+    Args:
+        datapoint_ids: Datapoint ids to remove
+        clients: Client registry to use (defaults to the process-wide registry)
+        batch_size: Maximum ids per remove request
+        tenant_id: Tenant owning the datapoints (needed by the local backend)
+
+    Returns:
+        Number of datapoints removed
+    """
+    from app.config import Config
+
+    if not datapoint_ids:
+        return 0
+
+    if Config.VECTOR_BACKEND in ("local", "both"):
+        get_vector_index().remove(tenant_id, datapoint_ids)
+        if Config.VECTOR_BACKEND == "local":
+            print(f"Removed {len(datapoint_ids)} orphaned vectors from the local index")
+            return len(datapoint_ids)
+
+    clients = clients or get_clients()
+    batch_size = batch_size or Config.REMOVE_BATCH_SIZE
+
+    for start in range(0, len(datapoint_ids), batch_size):
+        batch = datapoint_ids[start:start + batch_size]
+        try:
+            clients.index().remove_datapoints(datapoint_ids=batch)
+        except Exception as high_level_error:
+            print(f"High-level remove failed: {high_level_error}")
+            print("Falling back to low-level API...")
+            request = aiplatform_v1.RemoveDatapointsRequest(
+                index=clients.index_name(),
+                datapoint_ids=batch
+            )
+            clients.index_service_client().remove_datapoints(request=request)
+
+    print(f"Removed {len(datapoint_ids)} orphaned vectors from Vector Search")
+    return len(datapoint_ids)
+
+
 async def process_document_ingestion(
     tenant_id: str,
     gcs_uri: str,
     doc_id: str,
-    index_id: str
+    index_id: str,
+    job_id: Optional[str] = None,
+    progress: Optional[Callable[[str, int], None]] = None,
+    mode: str = "incremental"
 ) -> dict:
     """
     Process document ingestion: extract, split, embed, and upsert.
     
+    In incremental mode only chunks that are new or whose checksum changed
+    since the previous ingest of doc_id are embedded and upserted. Chunks
+    that no longer exist are removed from the index in both modes.
+    
     Args:
         tenant_id: Tenant identifier
         gcs_uri: GCS URI of the PDF file
         doc_id: Document identifier
         index_id: Vector Search index ID
+        job_id: Job identifier (generated when omitted)
+        progress: Callback receiving (stage, count) as each stage completes
+        mode: "incremental" (diff against the previous version) or "full"
         
     Returns:
-        Dictionary with job_id, doc_id, and number of chunks
+        Dictionary with job_id, doc_id, number of chunks, the
+        added/updated/unchanged/removed counts and the characters/tokens of
+        header/footer boilerplate stripped before chunking
     """
-    job_id = str(uuid.uuid4())
-    
-    pages = extract_text_from_pdf(gcs_uri)
-    
-    chunks = make_chunks(pages)
-    
-    chunk_texts = [chunk.text for chunk in chunks]
-    embeddings = embed_texts(chunk_texts)
+    from app.rag.pipeline import run_ingest_pipeline
+
+    if mode not in ("incremental", "full"):
+        raise ValueError(f"Invalid ingest mode: {mode}")
+
+    job_id = job_id or str(uuid.uuid4())
     
-    num_chunks = upsert_vectors(
+    previous = await run_io("storage", load_chunk_manifest, tenant_id, doc_id)
+
+    # Pages -> chunks -> embedding batches -> upsert batches, with bounded
+    # queues between the stages so memory stays flat and the stages overlap
+    stats = await run_ingest_pipeline(
         tenant_id=tenant_id,
+        gcs_uri=gcs_uri,
         doc_id=doc_id,
-        chunks=chunks,
-        embeddings=embeddings,
         index_id=index_id,
-        gcs_uri=gcs_uri
+        previous=previous,
+        incremental=(mode == "incremental"),
+        progress=progress
+    )
+
+    num_removed = stats["removed_vectors"]
+    print(
+        f"Ingest diff for {tenant_id}/{doc_id} ({mode}): added={stats['added']} "
+        f"updated={stats['updated']} unchanged={stats['unchanged']} removed={num_removed}"
     )
     
     return {
         "job_id": job_id,
         "doc_id": doc_id,
-        "chunks": num_chunks
-    }
\ No newline at end of file
+        "chunks": stats["chunks"],
+        "mode": mode,
+        "added": stats["added"],
+        "updated": stats["updated"],
+        "unchanged": stats["unchanged"],
+        "removed": num_removed,
+        "boilerplate_removed_chars": stats["boilerplate_removed_chars"],
+        "boilerplate_removed_tokens": stats["boilerplate_removed_tokens"]
+    }
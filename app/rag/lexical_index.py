@@ -0,0 +1,363 @@
+"""Per-tenant BM25 index over character n-grams of the chunk texts.
+
+Exact terms (room names, product codes, phone numbers) are poorly served by
+embedding search alone, so with LEXICAL_INDEX enabled the ingest pipeline
+also indexes every chunk here and retriever.search fuses BM25 hits with the
+vector results. Texts are NFKC-normalized, lowercased and split into runs
+of letters/digits; each run contributes its character bi- and tri-grams
+(a one-character run itself), so Japanese needs no morphological analyzer.
+
+Per tenant, under LEXICAL_INDEX_DIR/{tenant_id}/, one file per document,
+rewritten as a whole on every ingest (np.savez_compressed):
+
+    {doc_id}.npz   terms     sorted n-grams
+                   offsets   start of each term's posting list (len(terms) + 1)
+                   gaps      chunk positions of the postings, delta-encoded per
+                             list (first entry absolute), narrowest uint dtype
+                   tfs       term frequency of each posting (uint8/uint16)
+                   chunks    chunk index at each chunk position
+                   lengths   n-grams per chunk (BM25 length normalization)
+
+The posting lists stay delta-encoded in memory; a query decodes the lists
+of its terms with one cumsum per document and scores them with one
+bincount. Files are written to a temporary name and renamed, so searches
+never see a half-written document; a tenant's loaded documents are
+refreshed when its directory changes.
+"""
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from app.config import Config
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+_RUN = re.compile(r"[^\W_]+")
+_SUFFIX = ".npz"
+
+
+def ngrams(text: str) -> List[str]:
+    """Split text into the character bi- and tri-grams of its letter/digit runs."""
+    grams = []
+    for run in _RUN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if len(run) == 1:
+            grams.append(run)
+            continue
+        grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+        grams.extend(run[i:i + 3] for i in range(len(run) - 2))
+    return grams
+
+
+def _narrow(values: np.ndarray, max_value: int) -> np.ndarray:
+    """Cast non-negative integers to the smallest unsigned dtype holding max_value."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+
+class LexicalHit(NamedTuple):
+    """One BM25 result."""
+    doc_id: str
+    chunk_index: int
+    score: float
+    coverage: float     # share of the query's distinct n-grams found in the chunk
+
+
+class LexicalDocumentBuilder:
+    """
+    Collects the postings of one document as its chunks stream past.
+
+    Each chunk costs one Counter and two small arrays; the postings are
+    sorted by term and written in close().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._term_ids: Dict[str, int] = {}
+        self._chunks: List[int] = []
+        self._lengths: List[int] = []
+        self._ids: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+
+    def add(self, chunk_index: int, text: str) -> None:
+        """Index one chunk."""
+        grams = ngrams(text)
+        counts = Counter(grams)
+        term_ids = self._term_ids
+        self._ids.append(np.fromiter(
+            (term_ids.setdefault(term, len(term_ids)) for term in counts), dtype=np.int64, count=len(counts)
+        ))
+        self._tfs.append(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+        self._chunks.append(chunk_index)
+        self._lengths.append(len(grams))
+
+    def close(self) -> int:
+        """
+        Write the document's index (replacing the previous one).
+
+        Returns:
+            Number of postings written
+        """
+        if not self._chunks:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return 0
+        vocabulary = np.array(list(self._term_ids), dtype="<U3")
+        order = np.argsort(vocabulary)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        terms = rank[np.concatenate(self._ids)]
+        positions = np.repeat(np.arange(len(self._chunks)), [len(ids) for ids in self._ids])
+        tfs = np.concatenate(self._tfs)
+        # Stable sort keeps each term's postings in chunk order
+        by_term = np.argsort(terms, kind="stable")
+        terms, positions, tfs = terms[by_term], positions[by_term], tfs[by_term]
+
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=offsets[1:])
+        gaps = np.diff(positions, prepend=0)
+        gaps[offsets[:-1]] = positions[offsets[:-1]]
+
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    terms=vocabulary[order],
+                    offsets=offsets,
+                    gaps=_narrow(gaps, len(self._chunks)),
+                    tfs=_narrow(np.minimum(tfs, 65535), int(tfs.max())),
+                    chunks=np.asarray(self._chunks, dtype=np.int32),
+                    lengths=np.asarray(self._lengths, dtype=np.int32),
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return len(tfs)
+
+
+class _DocumentPostings:
+    """The loaded index of one document (posting lists still delta-encoded)."""
+
+    def __init__(self, doc_id: str, path: str):
+        self.doc_id = doc_id
+        with np.load(path) as data:
+            self.terms = data["terms"]
+            self.offsets = data["offsets"]
+            self.gaps = data["gaps"]
+            self.tfs = data["tfs"]
+            self.chunks = data["chunks"]
+            self.lengths = data["lengths"]
+
+    def locate(self, query_terms: np.ndarray):
+        """Return (found mask, posting starts, posting ends) of the query terms."""
+        if not len(self.terms):
+            empty = np.zeros(len(query_terms), dtype=np.int64)
+            return np.zeros(len(query_terms), dtype=bool), empty, empty
+        index = np.minimum(np.searchsorted(self.terms, query_terms), len(self.terms) - 1)
+        return self.terms[index] == query_terms, self.offsets[index], self.offsets[index + 1]
+
+    def postings(self, starts: np.ndarray, ends: np.ndarray):
+        """
+        Decode several posting lists at once.
+
+        Returns:
+            (chunk positions, term frequencies, list number) of every posting
+        """
+        lengths = ends - starts
+        total = int(lengths.sum())
+        first = np.cumsum(lengths) - lengths
+        flat = np.arange(total) - np.repeat(first - starts, lengths)
+        # One running sum over all lists, restarted at each list's absolute first entry
+        sums = np.cumsum(self.gaps[flat], dtype=np.int64)
+        positions = sums - np.repeat(sums[first] - self.gaps[starts].astype(np.int64), lengths)
+        return positions, self.tfs[flat].astype(np.float64), np.repeat(np.arange(len(lengths)), lengths)
+
+
+class _TenantLexicon:
+    """The loaded documents of one tenant, refreshed when the directory changes."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._version = None
+        self._files: Dict[str, tuple] = {}                   # file name -> (mtime_ns, size)
+        self._documents: Dict[str, _DocumentPostings] = {}   # file name -> postings
+
+    def documents(self) -> List[_DocumentPostings]:
+        """Return the current documents, reloading those rewritten since the last call."""
+        try:
+            version = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if version != self._version:
+                files = {}
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(_SUFFIX):
+                            stat = entry.stat()
+                            files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                for name in list(self._documents):
+                    if name not in files:
+                        del self._documents[name]
+                for name, signature in files.items():
+                    if self._files.get(name) != signature or name not in self._documents:
+                        try:
+                            self._documents[name] = _DocumentPostings(
+                                unquote(name[:-len(_SUFFIX)]), os.path.join(self.directory, name)
+                            )
+                        except (OSError, ValueError, KeyError) as e:
+                            print(f"Warning: Could not load lexical index {name}: {e}")
+                            self._documents.pop(name, None)
+                self._files = files
+                self._version = version
+            return list(self._documents.values())
+
+
+class LexicalIndex:
+    """Per-tenant BM25 indexes under one directory."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.LEXICAL_INDEX_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self._tenants: Dict[str, _TenantLexicon] = {}
+        self._lock = threading.Lock()
+
+    def _tenant_path(self, tenant_id: str) -> str:
+        if not tenant_id or tenant_id.startswith(".") or "/" in tenant_id or os.sep in tenant_id:
+            raise ValueError(f"Invalid tenant id for the lexical index: {tenant_id!r}")
+        return os.path.join(self.directory, tenant_id)
+
+    def _tenant(self, tenant_id: str) -> _TenantLexicon:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            path = self._tenant_path(tenant_id)
+            with self._lock:
+                tenant = self._tenants.setdefault(tenant_id, _TenantLexicon(path))
+        return tenant
+
+    def builder(self, tenant_id: str, doc_id: str) -> LexicalDocumentBuilder:
+        """
+        Start (re)indexing a document; nothing changes until the builder is closed.
+
+        Args:
+            tenant_id: Tenant identifier
+            doc_id: Document identifier
+
+        Returns:
+            Builder to add the document's chunks to
+        """
+        path = self._tenant_path(tenant_id)
+        os.makedirs(path, exist_ok=True)
+        return LexicalDocumentBuilder(os.path.join(path, quote(doc_id, safe="") + _SUFFIX))
+
+    def search(
+        self,
+        tenant_id: str,
+        query: str,
+        top_k: int,
+        doc_ids: Optional[Sequence[str]] = None,
+        exclude_doc_ids: Optional[Sequence[str]] = None
+    ) -> List[LexicalHit]:
+        """
+        Return the top_k chunks of a tenant by BM25 score, best first.
+
+        Args:
+            tenant_id: Tenant whose chunks are searched
+            query: Query text
+            top_k: Number of hits
+            doc_ids: Only search these documents
+            exclude_doc_ids: Leave these documents out
+
+        Returns:
+            Hits with a positive score (at most top_k)
+        """
+        query_terms = np.unique(np.array(ngrams(query), dtype="<U3"))
+        if not len(query_terms) or top_k <= 0:
+            return []
+        allowed = set(doc_ids) if doc_ids else None
+        denied = set(exclude_doc_ids or ())
+        documents = [
+            document for document in self._tenant(tenant_id).documents()
+            if (allowed is None or document.doc_id in allowed) and document.doc_id not in denied
+        ]
+        chunk_count = sum(len(document.lengths) for document in documents)
+        if not chunk_count:
+            return []
+        average_length = max(sum(int(document.lengths.sum()) for document in documents) / chunk_count, 1.0)
+
+        # Document frequencies over every searched document first, then scores
+        located = []
+        frequencies = np.zeros(len(query_terms))
+        for document in documents:
+            found, starts, ends = document.locate(query_terms)
+            frequencies += np.where(found, ends - starts, 0)
+            located.append((document, np.flatnonzero(found), starts, ends))
+        idf = np.log(1 + (chunk_count - frequencies + 0.5) / (frequencies + 0.5))
+
+        scored = []
+        for document, found, starts, ends in located:
+            if not len(found):
+                continue
+            positions, tfs, lists = document.postings(starts[found], ends[found])
+            norm = K1 * (1 - B + B * document.lengths[positions] / average_length)
+            weights = idf[found][lists] * tfs * (K1 + 1) / (tfs + norm)
+            scores = np.bincount(positions, weights=weights, minlength=len(document.chunks))
+            matched = np.bincount(positions, minlength=len(document.chunks))
+            hit = np.flatnonzero(scores)
+            scored.append((document, hit, scores[hit], matched[hit]))
+        if not scored:
+            return []
+
+        scores = np.concatenate([entry[2] for entry in scored])
+        top = np.argpartition(-scores, min(top_k, len(scores)) - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        owners = np.repeat(np.arange(len(scored)), [len(entry[1]) for entry in scored])
+        starts = np.cumsum([0] + [len(entry[1]) for entry in scored])
+        hits = []
+        for flat in top.tolist():
+            document, hit, document_scores, matched = scored[owners[flat]]
+            local = flat - starts[owners[flat]]
+            hits.append(LexicalHit(
+                doc_id=document.doc_id,
+                chunk_index=int(document.chunks[hit[local]]),
+                score=float(document_scores[local]),
+                coverage=int(matched[local]) / len(query_terms)
+            ))
+        return hits
+
+
+_index: Optional[LexicalIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """
+    Return the process-wide lexical index, or None when LEXICAL_INDEX is off.
+
+    Returns:
+        Shared LexicalIndex instance or None
+    """
+    global _index
+    if not Config.LEXICAL_INDEX:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LexicalIndex()
+    return _index
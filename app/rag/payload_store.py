@@ -0,0 +1,173 @@
+"""SQLite sidecar holding each chunk's metadata and text next to the vectors.
+
+With INLINE_PAYLOADS enabled, ingest writes one row per chunk (tenant, doc,
+chunk id and the compressed chunk-store record) as its vector is upserted,
+and vector_search turns a whole neighbor list into tenant, doc, page, path,
+checksum and text with one local primary-key query. Neither the datapoint
+id has to be parsed nor the chunk store read. Neighbors missing from the
+sidecar (ingested before it was enabled, or on another instance) fall back
+to the chunk store.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.config import Config
+from app.rag.chunk_store import encode_record
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    datapoint_id TEXT PRIMARY KEY,
+    tenant_id    TEXT NOT NULL,
+    doc_id       TEXT NOT NULL,
+    chunk_id     TEXT NOT NULL,
+    record       BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_payloads_doc ON payloads (tenant_id, doc_id);
+"""
+
+# SQLite's default limit on host parameters per statement is 999 on older builds
+_MAX_PARAMS = 900
+
+
+class ChunkPayloadStore:
+    """
+    Persistent datapoint_id -> (tenant, doc, chunk, record) table.
+
+    A single connection is shared behind a lock, like the job store; every
+    statement is a short indexed lookup or a small batch write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def put_many(self, tenant_id: str, doc_id: str, rows: Sequence[Tuple[str, str, bytes]]) -> None:
+        """
+        Insert or replace the payloads of some chunks of one document.
+
+        Args:
+            tenant_id: Tenant identifier
+            doc_id: Document identifier
+            rows: (datapoint_id, chunk_id, record from encode_record) tuples
+        """
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO payloads (datapoint_id, tenant_id, doc_id, chunk_id, record)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(datapoint_id, tenant_id, doc_id, chunk_id, record) for datapoint_id, chunk_id, record in rows]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_many(self, datapoint_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        Look up the payloads of a neighbor list.
+
+        Args:
+            datapoint_ids: Datapoint ids to look up
+
+        Returns:
+            Mapping of datapoint_id to its record (text, page, page_end,
+            checksum, path) plus tenant_id, doc_id and chunk_id, for the ids
+            present in the sidecar
+        """
+        ids = list(dict.fromkeys(datapoint_ids))
+        payloads: Dict[str, dict] = {}
+        for start in range(0, len(ids), _MAX_PARAMS):
+            batch = ids[start:start + _MAX_PARAMS]
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT datapoint_id, tenant_id, doc_id, chunk_id, record FROM payloads"
+                    f" WHERE datapoint_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+            for datapoint_id, tenant_id, doc_id, chunk_id, record in rows:
+                payload = json.loads(zlib.decompress(record))
+                payload.update(tenant_id=tenant_id, doc_id=doc_id, chunk_id=chunk_id)
+                payloads[datapoint_id] = payload
+        return payloads
+
+    def delete_many(self, datapoint_ids: Sequence[str]) -> int:
+        """
+        Delete the payloads of removed chunks.
+
+        Returns:
+            Number of rows deleted
+        """
+        deleted = 0
+        for start in range(0, len(datapoint_ids), _MAX_PARAMS):
+            batch = list(datapoint_ids[start:start + _MAX_PARAMS])
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"DELETE FROM payloads WHERE datapoint_id IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+            deleted += cursor.rowcount
+        return deleted
+
+    def delete_document(self, tenant_id: str, doc_id: str) -> int:
+        """
+        Delete every payload of a document.
+
+        Returns:
+            Number of rows deleted
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM payloads WHERE tenant_id = ? AND doc_id = ?", (tenant_id, doc_id)
+            )
+        return cursor.rowcount
+
+    def count(self) -> int:
+        """Return the number of stored payloads."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM payloads").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[ChunkPayloadStore] = None
+_store_lock = threading.Lock()
+
+
+def get_payload_store() -> Optional[ChunkPayloadStore]:
+    """
+    Return the process-wide payload sidecar, or None when INLINE_PAYLOADS is off.
+
+    Returns:
+        Shared ChunkPayloadStore instance or None
+    """
+    global _store
+    if not Config.INLINE_PAYLOADS:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChunkPayloadStore(Config.PAYLOAD_DB_PATH)
+    return _store
+
+
+def payload_rows(datapoint_ids: List[str], chunks: list, path: str) -> List[Tuple[str, str, bytes]]:
+    """Build put_many rows for chunks and their datapoint ids."""
+    return [
+        (datapoint_id, chunk.chunk_id, encode_record(chunk, path))
+        for datapoint_id, chunk in zip(datapoint_ids, chunks)
+    ]
@@ -0,0 +1,274 @@
+"""Streaming ingest pipeline: pages -> chunks -> embedding batches -> upsert batches.
+
+Each stage is connected to the next by a bounded queue, so a large document
+never has more than a few batches in memory and PDF parsing, embedding and
+upserting run at the same time instead of one after another.
+"""
+import asyncio
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.config import Config
+from app.jobs.compactor import get_compactor
+from app.rag.batcher import MAX_INPUT_TOKENS
+from app.rag.chunk_store import ChunkStoreWriter, get_chunk_backend
+from app.rag.clients import ClientRegistry, get_clients
+from app.rag.indexer import (
+    classify_chunk,
+    datapoint_id_for,
+    embed_texts,
+    remove_chunks,
+    upsert_vectors,
+)
+from app.rag.lexical_index import get_lexical_index
+from app.rag.payload_store import get_payload_store, payload_rows
+from app.schemas.dto import PageText
+from app.utils.boilerplate import BoilerplateStripper
+from app.utils.chunks import ChunkRef, get_chunker
+from app.utils.concurrency import run_io
+from app.utils.pdf import iter_pdf_pages
+from app.utils.tokens import estimate_tokens
+
+_DONE = object()
+
+
+class _PipelineAborted(Exception):
+    """Raised in the producer thread when a downstream stage has failed."""
+
+
+def _put_from_thread(
+    queue: asyncio.Queue,
+    item,
+    loop: asyncio.AbstractEventLoop,
+    stop: threading.Event
+) -> None:
+    """Blocking put from a worker thread that gives up once the pipeline is stopped."""
+    future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+    while True:
+        try:
+            future.result(timeout=0.5)
+            return
+        except TimeoutError:
+            if stop.is_set():
+                future.cancel()
+                raise _PipelineAborted()
+
+
+async def run_ingest_pipeline(
+    tenant_id: str,
+    gcs_uri: str,
+    doc_id: str,
+    index_id: str,
+    previous: Dict[str, str],
+    incremental: bool = True,
+    progress: Optional[Callable[[str, int], None]] = None,
+    clients: Optional[ClientRegistry] = None
+) -> dict:
+    """
+    Stream a document through extraction, chunking, embedding and upsert.
+
+    Args:
+        tenant_id: Tenant identifier
+        gcs_uri: GCS URI of the source document
+        doc_id: Document identifier
+        index_id: Vector Search index ID
+        previous: Mapping of datapoint_id to checksum from the last ingest
+        incremental: Skip embedding/upsert for chunks whose checksum is unchanged
+        progress: Callback receiving (stage, count) as work completes
+        clients: Client registry to use (defaults to the process-wide registry)
+
+    Returns:
+        Dictionary with chunk counts (chunks, added, updated, unchanged),
+        the list of removed datapoint ids, the number of vectors removed
+        for them and the characters/tokens of boilerplate stripped from
+        the pages
+    """
+    clients = clients or get_clients()
+    chunker = get_chunker()
+    report = progress or (lambda stage, count: None)
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=max(2, Config.EMBED_PARALLELISM))
+
+    counts = {"extracted_pages": 0, "chunks": 0, "embedded": 0, "upserted": 0,
+              "added": 0, "updated": 0, "unchanged": 0}
+    seen: Set[str] = set()
+    stripper = BoilerplateStripper()
+    writer_box: List[ChunkStoreWriter] = []
+    payloads = get_payload_store()
+    lexicon = get_lexical_index()
+    # Every chunk (unchanged ones too) is indexed, so the document is rewritten whole
+    lexical = lexicon.builder(tenant_id, doc_id) if lexicon is not None else None
+
+    def counted_pages() -> Iterator[PageText]:
+        for page in iter_pdf_pages(gcs_uri, stripper=stripper):
+            counts["extracted_pages"] += 1
+            report("extracted_pages", counts["extracted_pages"])
+            yield page
+
+    def produce() -> None:
+        # Runs on a worker thread: parse pages lazily, chunk them, record the
+        # chunk texts and hand each chunk to the event loop (blocking when full)
+        writer = ChunkStoreWriter(tenant_id, doc_id, gcs_uri, backend=get_chunk_backend(clients))
+        writer_box.append(writer)
+        try:
+            for chunk in chunker(counted_pages()):
+                writer.write(chunk)
+                if lexical is not None:
+                    lexical.add(chunk.index, chunk.text)
+                _put_from_thread(chunk_queue, chunk, loop, stop)
+        finally:
+            if not stop.is_set():
+                _put_from_thread(chunk_queue, _DONE, loop, stop)
+
+    def store_payloads(chunks: List[ChunkRef]) -> None:
+        payloads.put_many(tenant_id, doc_id, payload_rows(
+            [datapoint_id_for(tenant_id, doc_id, chunk.chunk_id) for chunk in chunks], chunks, gcs_uri
+        ))
+
+    async def embed_stage() -> None:
+        semaphore = asyncio.Semaphore(Config.EMBED_PARALLELISM)
+        in_flight: Set[asyncio.Task] = set()
+
+        async def embed_batch(batch: List[ChunkRef]) -> None:
+            try:
+                # EMBED_PARALLELISM batches are already in flight on the shared
+                # executor, so each call sends its requests one after another
+                embeddings = await run_io(
+                    "embed",
+                    embed_texts,
+                    [chunk.text for chunk in batch],
+                    clients=clients,
+                    checksums=[chunk.checksum for chunk in batch],
+                    parallelism=1
+                )
+                counts["embedded"] += len(batch)
+                report("embedded", counts["embedded"])
+                await upsert_queue.put((batch, embeddings))
+            finally:
+                semaphore.release()
+
+        async def dispatch(batch: List[ChunkRef]) -> None:
+            await semaphore.acquire()
+            for task in [t for t in in_flight if t.done()]:
+                in_flight.discard(task)
+                task.result()  # surface a failed batch early
+            in_flight.add(asyncio.create_task(embed_batch(batch)))
+
+        batch: List[ChunkRef] = []
+        batch_tokens = 0
+        # Unchanged chunks are not upserted, but the payload sidecar may not have them yet
+        unchanged: List[ChunkRef] = []
+        while True:
+            chunk = await chunk_queue.get()
+            if chunk is _DONE:
+                break
+
+            counts["chunks"] += 1
+            report("chunks", counts["chunks"])
+            datapoint_id = datapoint_id_for(tenant_id, doc_id, chunk.chunk_id)
+            seen.add(datapoint_id)
+            status = classify_chunk(previous, datapoint_id, chunk.checksum)
+            counts[status] += 1
+            if incremental and status == "unchanged":
+                if payloads is not None:
+                    unchanged.append(chunk)
+                    if len(unchanged) >= Config.UPSERT_BATCH_SIZE:
+                        await run_io("storage", store_payloads, unchanged)
+                        unchanged = []
+                continue
+
+            tokens = min(estimate_tokens(chunk.text), MAX_INPUT_TOKENS)
+            if batch and (
+                len(batch) >= Config.EMBED_MAX_BATCH_SIZE
+                or batch_tokens + tokens > Config.EMBED_MAX_BATCH_TOKENS
+            ):
+                await dispatch(batch)
+                batch, batch_tokens = [], 0
+            batch.append(chunk)
+            batch_tokens += tokens
+
+        if batch:
+            await dispatch(batch)
+        if unchanged:
+            await run_io("storage", store_payloads, unchanged)
+        await asyncio.gather(*in_flight)
+        await upsert_queue.put(_DONE)
+
+    async def upsert_stage() -> None:
+        pending: List[Tuple[ChunkRef, List[float]]] = []
+
+        async def flush(items: List[Tuple[ChunkRef, List[float]]]) -> None:
+            upserted = await run_io(
+                "upsert",
+                upsert_vectors,
+                tenant_id=tenant_id,
+                doc_id=doc_id,
+                chunks=[chunk for chunk, _ in items],
+                embeddings=[embedding for _, embedding in items],
+                index_id=index_id,
+                gcs_uri=gcs_uri,
+                clients=clients
+            )
+            # Payloads follow their vectors, so a hit never lacks its text
+            if payloads is not None:
+                await run_io("storage", store_payloads, [chunk for chunk, _ in items])
+            counts["upserted"] += upserted
+            report("upserted", counts["upserted"])
+
+        while True:
+            item = await upsert_queue.get()
+            if item is _DONE:
+                break
+            batch, embeddings = item
+            pending.extend(zip(batch, embeddings))
+            while len(pending) >= Config.UPSERT_BATCH_SIZE:
+                await flush(pending[:Config.UPSERT_BATCH_SIZE])
+                pending = pending[Config.UPSERT_BATCH_SIZE:]
+
+        if pending:
+            await flush(pending)
+
+    tasks = [
+        asyncio.ensure_future(run_io("pdf", produce)),
+        asyncio.create_task(embed_stage()),
+        asyncio.create_task(upsert_stage()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # The producer thread cannot be cancelled; it stops at its next put
+        stop.set()
+        for task in tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    if counts["chunks"] == 0:
+        raise ValueError(f"No text could be extracted from file: {gcs_uri}")
+
+    # Chunks that no longer exist leave the index before the new version is
+    # published: if their removal fails, the stored manifest still lists them
+    # and the next ingest retries it instead of leaving orphaned vectors
+    removed = [datapoint_id for datapoint_id in previous if datapoint_id not in seen]
+    removed_vectors = await run_io("upsert", remove_chunks, tenant_id, doc_id, removed, clients)
+
+    # Publish the new chunk texts only after every changed vector is upserted,
+    # so the manifest never claims chunks the index does not have
+    await run_io("storage", writer_box[0].close)
+    if lexical is not None:
+        await run_io("storage", lexical.close)
+    get_compactor().schedule(tenant_id)
+
+    return {
+        "chunks": counts["chunks"],
+        "added": counts["added"],
+        "updated": counts["updated"],
+        "unchanged": counts["unchanged"],
+        "removed": removed,
+        "removed_vectors": removed_vectors,
+        "boilerplate_removed_chars": stripper.removed_chars,
+        "boilerplate_removed_tokens": stripper.removed_tokens,
+    }
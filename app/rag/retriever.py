@@ -1,194 +1,571 @@
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import threading
+import time
 import numpy as np
-from google.cloud import aiplatform
 from app.schemas.dto import ChunkHit
-
-
-def embed_query(query: str, model_name: str = "text-embedding-005") -> List[float]:
+from app.rag.chunk_store import fetch_tenant_chunks, get_chunk_backend
+from app.rag.clients import ClientRegistry, get_clients
+from app.rag.embedding_cache import cache_key, cached_embed, get_embedding_cache
+from app.rag.id_table import get_id_table, neighbor_ids
+from app.rag.indexer import datapoint_id_for, embed_texts, parse_datapoint_id
+from app.rag.lexical_index import LexicalHit, get_lexical_index
+from app.rag.payload_store import get_payload_store
+from app.rag.vector_store import get_vector_index, normalize
+from app.utils.chunks import chunk_id_for
+from app.utils.hash import calculate_checksum
+from app.utils.concurrency import run_io
+
+logger = logging.getLogger(__name__)
+
+
+def embed_query(
+    query: str,
+    model_name: str = "text-embedding-005",
+    clients: Optional[ClientRegistry] = None
+) -> List[float]:
     """
     Generate embedding for a query using Vertex AI.
 
     Args:
         query: Query text to embed
         model_name: Name of the embedding model
+        clients: Client registry to use (defaults to the process-wide registry)
 
     Returns:
         Embedding vector
     """
-    from vertexai.preview.language_models import TextEmbeddingInput, TextEmbeddingModel
-    import vertexai
+    from vertexai.preview.language_models import TextEmbeddingInput
+
+    clients = clients or get_clients()
+
+    def embed_missing(texts: List[str]) -> List[List[float]]:
+        model = clients.embedding_model(model_name)
+        text_inputs = [
+            TextEmbeddingInput(
+                text=text,
+                task_type="RETRIEVAL_QUERY"  # Specify task type for search queries
+            )
+            for text in texts
+        ]
+        return [embedding.values for embedding in model.get_embeddings(text_inputs)]
+
+    # Repeated questions are served from the embedding cache's memory tier;
+    # queries are unbounded, so they are never written to its disk tier
+    embeddings = cached_embed(
+        [query],
+        [calculate_checksum(query)],
+        model_name=model_name,
+        task_type="RETRIEVAL_QUERY",
+        embed_missing=embed_missing,
+        persist=False
+    )
+
+    return embeddings[0]
+
+
+# Set when the endpoint rejects namespace filters; queries then over-fetch instead
+_pushdown_unavailable = False
+_sdk_returns_vectors: Optional[bool] = None
+
+
+def _neighbors_carry_vectors() -> bool:
+    """Whether this aiplatform release fills MatchNeighbor.feature_vector (return_full_datapoint)."""
+    global _sdk_returns_vectors
+    if _sdk_returns_vectors is None:
+        from google.cloud.aiplatform.matching_engine.matching_engine_index_endpoint import MatchNeighbor
+
+        _sdk_returns_vectors = "feature_vector" in getattr(MatchNeighbor, "__dataclass_fields__", {})
+    return _sdk_returns_vectors
+
+
+def cached_chunk_vectors(
+    checksums: Sequence[str],
+    model_name: str = "text-embedding-005"
+) -> List[Optional[np.ndarray]]:
+    """
+    Look up the document embeddings of chunks in the embedding cache.
+
+    Args:
+        checksums: Chunk checksums (as stored with the chunk)
+        model_name: Embedding model the chunks were embedded with
+
+    Returns:
+        One vector per checksum, or None where it is not cached
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return [None] * len(checksums)
+    return cache.get_many([cache_key(model_name, "RETRIEVAL_DOCUMENT", checksum) for checksum in checksums])
+
+
+def query_filters(
+    tenant_id: str,
+    doc_ids: Optional[Sequence[str]] = None,
+    exclude_doc_ids: Optional[Sequence[str]] = None
+) -> list:
+    """
+    Build the Vector Search namespace filters matching the upsert restricts.
+
+    Args:
+        tenant_id: Tenant whose datapoints are eligible
+        doc_ids: Only these documents (None: all of the tenant's documents)
+        exclude_doc_ids: Documents to leave out
+
+    Returns:
+        List of Namespace filters (ANDed by Vector Search)
+    """
+    from google.cloud.aiplatform.matching_engine.matching_engine_index_endpoint import Namespace
+
+    filters = [Namespace(name="tenant_id", allow_tokens=[tenant_id])]
+    if doc_ids or exclude_doc_ids:
+        filters.append(Namespace(
+            name="doc_id",
+            allow_tokens=list(doc_ids or []),
+            deny_tokens=list(exclude_doc_ids or [])
+        ))
+    return filters
+
+
+def _resolve_neighbors(tenant_id: str, neighbors: list) -> Tuple[Dict[int, Tuple[str, str, str]], dict]:
+    """
+    Resolve each neighbor to (datapoint_id, doc_id, chunk_id) of this tenant.
+
+    With inline payloads the whole neighbor list is hydrated by one local lookup.
+
+    Returns:
+        (neighbor position -> (datapoint_id, doc_id, chunk_id) for the
+        tenant's neighbors, payloads found in the sidecar)
+    """
     from app.config import Config
 
-    vertexai.init(project=Config.PROJECT_ID, location=Config.LOCATION)
+    resolved = {}
+    payloads = {}
+    payload_store = get_payload_store()
+    if Config.DATAPOINT_IDS == "int":
+        # Integer ids: one array lookup filters the whole list by tenant
+        ids = neighbor_ids([neighbor.id for neighbor in neighbors])
+        positions, doc_ids, chunk_indices, _ = get_id_table().resolve(tenant_id, ids)
+        for position, doc_id, chunk_index in zip(positions.tolist(), doc_ids, chunk_indices.tolist()):
+            chunk_id = chunk_id_for(chunk_index)
+            resolved[position] = (datapoint_id_for(tenant_id, doc_id, chunk_id), doc_id, chunk_id)
+        # String ids of documents not re-ingested since the switch
+        for position in np.flatnonzero(ids < 0).tolist():
+            parsed = parse_datapoint_id(neighbors[position].id, tenant_id)
+            if parsed:
+                resolved[position] = (neighbors[position].id, *parsed)
+        if payload_store is not None:
+            payloads = payload_store.get_many(datapoint_id for datapoint_id, _, _ in resolved.values())
+    else:
+        if payload_store is not None:
+            payloads = payload_store.get_many(neighbor.id for neighbor in neighbors)
+        for position, neighbor in enumerate(neighbors):
+            payload = payloads.get(neighbor.id)
+            if payload is not None:
+                if payload["tenant_id"] == tenant_id:
+                    resolved[position] = (neighbor.id, payload["doc_id"], payload["chunk_id"])
+                continue
+            # Format: {tenant_id}_{doc_id}_{chunk_id}, e.g. t_003_doc-2025-003_c-00004
+            parsed = parse_datapoint_id(neighbor.id, tenant_id)
+            if parsed:
+                resolved[position] = (neighbor.id, *parsed)
+    return resolved, payloads
+
+
+class RetrievalStats:
+    """Per-process counters of neighbors fetched vs chunks hydrated vs hits returned."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.index_calls = 0
+        self.fetched = 0      # tenant neighbors returned by the index
+        self.hydrated = 0     # candidates kept (hydrated and passed to MMR)
+        self.returned = 0     # hits left after MMR
+        self.lexical_only = 0  # searches answered by the lexical fast path (no embedding call)
+
+    def record_search(self, index_calls: int, fetched: int, hydrated: int) -> None:
+        with self._lock:
+            self.searches += 1
+            self.index_calls += index_calls
+            self.fetched += fetched
+            self.hydrated += hydrated
+
+    def record_lexical_only(self) -> None:
+        with self._lock:
+            self.lexical_only += 1
+
+    def record_returned(self, returned: int) -> None:
+        with self._lock:
+            self.returned += returned
+
+    def stats(self) -> Dict[str, float]:
+        """Return totals and per-search averages."""
+        with self._lock:
+            searches = self.searches or 1
+            return {
+                "searches": self.searches,
+                "index_calls": self.index_calls,
+                "fetched": self.fetched,
+                "hydrated": self.hydrated,
+                "returned": self.returned,
+                "lexical_only": self.lexical_only,
+                "fetched_per_search": self.fetched / searches,
+                "hydrated_per_search": self.hydrated / searches,
+                "returned_per_search": self.returned / searches,
+            }
+
+
+_retrieval_stats = RetrievalStats()
+
+
+def get_retrieval_stats() -> RetrievalStats:
+    """Return the process-wide retrieval counters."""
+    return _retrieval_stats
+
+
+def neighbor_similarity(distances: Sequence[float]) -> Optional[np.ndarray]:
+    """
+    Convert neighbor distances to similarities where larger is better.
 
-    model = TextEmbeddingModel.from_pretrained(model_name)
+    Vertex reports the index's own measure: a cosine distance (smaller is
+    better) for COSINE_DISTANCE but the dot product itself (larger is
+    better) for DOT_PRODUCT_DISTANCE. For normalized embeddings all three
+    supported measures map to the cosine similarity.
+
+    Args:
+        distances: Neighbor distances as returned by the index
+
+    Returns:
+        Similarities, or None for a measure that cannot be converted
+    """
+    from app.config import Config
+
+    measure = "COSINE_DISTANCE" if Config.VECTOR_BACKEND == "local" else Config.VECTOR_DISTANCE_MEASURE
+    distances = np.asarray(distances, dtype=np.float64)
+    if measure == "COSINE_DISTANCE":
+        return 1.0 - distances
+    if measure == "DOT_PRODUCT_DISTANCE":
+        return distances
+    if measure == "SQUARED_L2_DISTANCE":
+        return 1.0 - distances / 2
+    return None
+
+
+def candidate_pool_size(similarities: Sequence[float], min_size: int) -> int:
+    """
+    Number of leading neighbors worth keeping.
+
+    Cuts at the first neighbor (after min_size) that is more than
+    RETRIEVAL_SCORE_WINDOW less similar than the nearest one, or more than
+    RETRIEVAL_SCORE_GAP less similar than the neighbor before it.
+
+    Args:
+        similarities: Neighbor similarities (see neighbor_similarity), nearest first
+        min_size: Neighbors always kept
+
+    Returns:
+        Pool size (len(similarities) when no neighbor is cut)
+    """
+    from app.config import Config
+
+    similarities = np.asarray(similarities, dtype=np.float64)
+    if len(similarities) <= min_size:
+        return len(similarities)
+    cut = (similarities[0] - similarities > Config.RETRIEVAL_SCORE_WINDOW) \
+        | (-np.diff(similarities, prepend=similarities[0]) > Config.RETRIEVAL_SCORE_GAP)
+    cut[:min_size] = False
+    positions = np.flatnonzero(cut)
+    return int(positions[0]) if len(positions) else len(similarities)
 
-    text_input = TextEmbeddingInput(
-        text=query,
-        task_type="RETRIEVAL_QUERY"  # Specify task type for search queries
-    )
 
-    embeddings = model.get_embeddings([text_input])
+def fill_missing_vectors(metadatas: List[dict], clients: ClientRegistry) -> None:
+    """
+    Set metadata["embedding"] of hydrated results the index returned no vector for.
+
+    Sources, in order: the chunk embeddings cached at ingest, the deployed
+    Vertex index (read_index_datapoints; MatchNeighbor carries no vector on
+    older SDKs), and finally re-embedding the chunk text, which also caches
+    it for the next query. Results still missing a vector keep None.
+
+    Args:
+        metadatas: Hydrated result metadata (with checksum and full_text)
+        clients: Client registry for the index endpoint and embedding model
+    """
+    from app.config import Config
+
+    missing = [m for m in metadatas if m.get("embedding") is None]
+    sources = {}
+
+    lookup = [m for m in missing if m.get("checksum")]
+    for metadata, vector in zip(lookup, cached_chunk_vectors([m["checksum"] for m in lookup])):
+        metadata["embedding"] = vector
+    missing = [m for m in missing if m.get("embedding") is None]
+    sources["cache"] = len(lookup) - len(missing)
+
+    if missing and Config.VECTOR_BACKEND != "local":
+        ids = [str(m.get("index_datapoint_id", m["datapoint_id"])) for m in missing]
+        try:
+            datapoints = clients.index_endpoint().read_index_datapoints(
+                deployed_index_id=Config.DEPLOYED_INDEX_ID, ids=ids
+            )
+            vectors = {datapoint.datapoint_id: datapoint.feature_vector for datapoint in datapoints}
+            for metadata, datapoint_id in zip(missing, ids):
+                vector = vectors.get(datapoint_id)
+                if vector is not None and len(vector):
+                    metadata["embedding"] = np.asarray(vector, dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: Could not read {len(ids)} vectors from the index: {e}")
+        remaining = [m for m in missing if m.get("embedding") is None]
+        sources["index"] = len(missing) - len(remaining)
+        missing = remaining
+
+    texts = [m for m in missing if m.get("full_text")]
+    if texts:
+        try:
+            vectors = embed_texts(
+                [m["full_text"] for m in texts],
+                clients=clients,
+                checksums=[m.get("checksum") or calculate_checksum(m["full_text"]) for m in texts]
+            )
+            for metadata, vector in zip(texts, vectors):
+                metadata["embedding"] = np.asarray(vector, dtype=np.float32)
+            sources["embedded"] = len(texts)
+        except Exception as e:
+            print(f"Warning: Could not re-embed {len(texts)} chunks for MMR: {e}")
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"{sum(m.get('embedding') is not None for m in metadatas)} of {len(metadatas)} results "
+                     f"have vectors (filled: {sources})")
+
+
+def hydrate_results(
+    tenant_id: str,
+    results: List[Tuple[str, float, dict]],
+    payloads: dict,
+    clients: ClientRegistry,
+    return_vectors: bool = False
+) -> List[Tuple[str, float, dict]]:
+    """
+    Add text, preview, path, checksum and page to search results.
+
+    Args:
+        tenant_id: Tenant the results belong to
+        results: Tuples (datapoint_id, distance or score, metadata with doc_id)
+        payloads: Records already read from the payload sidecar, by datapoint id
+        clients: Client registry used to read the chunk store
+        return_vectors: Fill metadata["embedding"] left None from the embedding cache
 
-    return embeddings[0].values
+    Returns:
+        The results with enhanced metadata, in the same order
+    """
+    # Results missing from the sidecar are read from the chunk store,
+    # grouped by document so the segments holding them are read in parallel
+    doc_chunks = {}
+    for datapoint_id, distance, metadata in results:
+        if datapoint_id not in payloads:
+            doc_chunks.setdefault(metadata["doc_id"], []).append(datapoint_id)
+
+    chunk_texts = dict(payloads)
+    if doc_chunks:
+        hydrate_start = time.perf_counter()
+        try:
+            chunk_texts.update(fetch_tenant_chunks(
+                tenant_id,
+                doc_chunks,
+                backend=get_chunk_backend(clients)
+            ))
+            print(
+                f"Loaded {len(chunk_texts) - len(payloads)} chunks from {len(doc_chunks)} docs in "
+                f"{(time.perf_counter() - hydrate_start) * 1000:.0f} ms"
+            )
+        except Exception as e:
+            print(f"Warning: Could not load chunk texts: {e}")
+
+    enhanced_results = []
+    for datapoint_id, distance, metadata in results:
+        # Enhance metadata for each result
+        chunk_info = chunk_texts.get(datapoint_id, {})
+        enhanced_metadata = metadata.copy()
+        enhanced_metadata["full_text"] = chunk_info.get("text", "")
+        enhanced_metadata["preview_text"] = chunk_info.get("text", "")[:200]
+        enhanced_metadata["path"] = chunk_info.get("path", "")
+        enhanced_metadata["checksum"] = chunk_info.get("checksum", "")
+        enhanced_metadata["page"] = chunk_info.get("page", metadata.get("page", 1))
+
+        enhanced_results.append((datapoint_id, distance, enhanced_metadata))
+
+    if return_vectors:
+        fill_missing_vectors([metadata for _, _, metadata in enhanced_results], clients)
+
+    print(f"Enhanced results: {len(enhanced_results)} chunks with text loaded")
+    return enhanced_results
 
 
 def vector_search(
     tenant_id: str,
     query_embedding: List[float],
     index_endpoint_id: str,
-    top_k: int = 30
+    top_k: int = 30,
+    clients: Optional[ClientRegistry] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+    exclude_doc_ids: Optional[Sequence[str]] = None,
+    return_vectors: bool = False,
+    adaptive_from: Optional[int] = None
 ) -> List[Tuple[str, float, dict]]:
     """
-    Perform vector search with namespace filtering using Vertex AI Vector Search.
+    Perform vector search with namespace filtering using Vertex AI Vector Search,
+    or the in-process index when Config.VECTOR_BACKEND is "local".
+
+    The tenant (and document) filters are sent with the query. Where they
+    cannot be (the local index has no per-document filter, or the endpoint
+    rejects them), the query over-fetches, growing num_neighbors until
+    top_k matching neighbors are found or VECTOR_OVERFETCH_MAX is reached.
+
+    With adaptive_from, top_k is only the upper bound of the candidate pool:
+    the first query asks for adaptive_from neighbors, the pool doubles while
+    its farthest neighbor is still relevant (see candidate_pool_size), and
+    only the neighbors before the cut are hydrated and returned.
 
     Args:
         tenant_id: Tenant identifier for namespace filtering
         query_embedding: Query embedding vector
         index_endpoint_id: Vector Search index endpoint ID
         top_k: Number of results to retrieve
+        clients: Client registry to use (defaults to the process-wide registry)
+        doc_ids: Only search these documents of the tenant
+        exclude_doc_ids: Leave these documents out
+        return_vectors: Add each neighbor's embedding as metadata["embedding"]
+            (from the index, or the embedding cache; None when unavailable)
+        adaptive_from: Initial pool size for adaptive retrieval (None: fixed top_k)
 
     Returns:
         List of tuples (datapoint_id, distance, metadata)
     """
+    global _pushdown_unavailable
     from app.config import Config
-    import json
-    from google.cloud import storage
-
-    try:
-        # Use the basic aiplatform library for vector search
-        from google.cloud import aiplatform
 
-        aiplatform.init(project=Config.PROJECT_ID, location=Config.LOCATION)
+    clients = clients or get_clients()
+    allowed = set(doc_ids) if doc_ids else None
+    denied = set(exclude_doc_ids or ())
 
-        # 🔧 修正: PROJECT_NUMBER を使用してエンドポイントを指定
-        index_endpoint = aiplatform.MatchingEngineIndexEndpoint(
-            index_endpoint_name=f"projects/{Config.PROJECT_NUMBER}/locations/{Config.LOCATION}/indexEndpoints/{Config.INDEX_ENDPOINT_ID}"
-        )
-
-        # Perform vector search
-        # Note: High-level API doesn't support namespace filtering directly
-        # We'll filter results manually based on datapoint_id prefix
+    try:
         print(f"DEBUG: Query executed for tenant: {tenant_id}")
 
-        response = index_endpoint.find_neighbors(
-            deployed_index_id=Config.DEPLOYED_INDEX_ID,
-            queries=[query_embedding],
-            num_neighbors=top_k
+        def find_neighbors(num_neighbors: int, pushdown: bool) -> list:
+            if Config.VECTOR_BACKEND == "local":
+                # In-process search over this tenant's vectors only
+                return get_vector_index().find_neighbors(
+                    tenant_id, query_embedding, num_neighbors, return_vectors=return_vectors
+                )
+            # Endpoint is created once per process (PROJECT_NUMBER-qualified name)
+            index_endpoint = clients.index_endpoint()
+            response = index_endpoint.find_neighbors(
+                deployed_index_id=Config.DEPLOYED_INDEX_ID,
+                queries=[query_embedding],
+                num_neighbors=num_neighbors,
+                return_full_datapoint=return_vectors and _neighbors_carry_vectors(),
+                **({"filter": query_filters(tenant_id, doc_ids, exclude_doc_ids)} if pushdown else {})
+            )
+            # find_neighbors returns a list containing a list of Neighbor objects
+            if response and isinstance(response[0], list):
+                return response[0]
+            return response or []
+
+        # Filters go into the query; the local index is already per tenant
+        # but cannot filter documents, so it relies on over-fetching for those
+        pushdown = (
+            Config.VECTOR_BACKEND != "local" and Config.VECTOR_FILTER_PUSHDOWN and not _pushdown_unavailable
         )
-
-        print(f"DEBUG: Response type: {type(response)}")
-        print(f"DEBUG: Response length: {len(response) if response else 0}")
-
-        # Process results - find_neighbors returns a list containing a list of Neighbor objects
-        results = []
-        if response and len(response) > 0:
-            print(f"DEBUG: Response is a list of {len(response)} elements")
-            print(f"DEBUG: First element type: {type(response[0])}")
-
-            # Extract neighbors from response structure
-            neighbors = response[0] if isinstance(response[0], list) else response
-            print(f"DEBUG: Neighbors list length: {len(neighbors)}")
+        filtered = pushdown or (Config.VECTOR_BACKEND == "local" and allowed is None and not denied)
+        adaptive = adaptive_from is not None and adaptive_from < top_k
+        # The window/gap cut needs distances it can turn into similarities
+        adaptive = adaptive and neighbor_similarity([]) is not None
+        pool = adaptive_from if adaptive else top_k
+        requested = pool
+        index_calls = 0
+        while True:
+            try:
+                index_calls += 1
+                neighbors = find_neighbors(requested, pushdown)
+            except Exception as e:
+                if not pushdown or not (isinstance(e, TypeError) or type(e).__name__ == "InvalidArgument"):
+                    raise
+                print(f"Warning: Namespace filters rejected by the index endpoint, over-fetching instead: {e}")
+                _pushdown_unavailable = True
+                pushdown = filtered = False
+                continue
+            logger.debug(f"Neighbors list length: {len(neighbors)} (requested {requested}, pushdown={pushdown})")
 
             # 最初の5件のIDを詳細表示
             for i, neighbor in enumerate(neighbors[:5]):
                 print(f"DEBUG: Neighbor {i}: ID='{neighbor.id}', Distance={neighbor.distance}, Type={type(neighbor.id)}")
 
-            # Process each neighbor from neighbors list
-            for neighbor in neighbors:
-                datapoint_id = neighbor.id
-                # Parse datapoint_id to extract metadata
-                # Format: {tenant_id}_{doc_id}_{chunk_id}
-                # Example: t_003_doc-2025-003_c-00004
-
-                # Split all underscores to properly handle tenant_id format like t_003
-                parts = datapoint_id.split('_')
-                print(f"DEBUG: Processing {datapoint_id}, all_parts={parts}, expected tenant={tenant_id}")
-
-                # Extract tenant_id correctly (first two parts: t_003)
-                if len(parts) >= 2:
-                    extracted_tenant_id = f"{parts[0]}_{parts[1]}"  # 't_003'
-
-                    # Extract doc_id and chunk_id from remaining parts
-                    # Standard format: t_003_doc-2025-003_c-00004
-                    if len(parts) >= 3:
-                        doc_id = parts[2]  # 'doc-2025-003'
-                        chunk_id = '_'.join(parts[3:]) if len(parts) > 3 else ""  # 'c-00004'
-                    else:
-                        doc_id = ""
-                        chunk_id = ""
-                else:
-                    extracted_tenant_id = ""
-                    doc_id = ""
-                    chunk_id = ""
-
-                print(f"DEBUG: Extracted tenant_id='{extracted_tenant_id}', doc_id='{doc_id}', chunk_id='{chunk_id}'")
-
-                # 🔧 Manual tenant filtering: skip if tenant_id doesn't match
-                if extracted_tenant_id != tenant_id:
-                    print(f"DEBUG: Skipped due to tenant mismatch: {extracted_tenant_id} != {tenant_id}")
-                    continue
-
-                metadata = {
-                    "tenant_id": extracted_tenant_id,
-                    "doc_id": doc_id,
-                    "chunk_id": chunk_id,
-                    "datapoint_id": datapoint_id
-                }
-
-                results.append((
-                    datapoint_id,
-                    neighbor.distance,
-                    metadata
-                ))
-        else:
-            print(f"DEBUG: Empty or no response from vector search. Response: {response}")
+            resolved, payloads = _resolve_neighbors(tenant_id, neighbors)
+            # Client-side check even with pushdown: datapoints upserted before
+            # the doc_id restrict existed are filtered here
+            resolved = {
+                position: entry for position, entry in resolved.items()
+                if (allowed is None or entry[1] in allowed) and entry[1] not in denied
+            }
+            exhausted = len(neighbors) < requested or requested >= Config.VECTOR_OVERFETCH_MAX
+            if filtered or len(resolved) >= pool or exhausted:
+                # Adaptive pool: grow while even the farthest neighbor is still relevant
+                if not adaptive or exhausted or pool >= top_k:
+                    break
+                similarities = neighbor_similarity([neighbors[position].distance for position in sorted(resolved)])
+                if candidate_pool_size(similarities, Config.RETRIEVAL_POOL_MIN) < len(similarities):
+                    break
+                grown = min(top_k, pool * 2)
+                requested = min(Config.VECTOR_OVERFETCH_MAX, requested * grown // pool)
+                pool = grown
+                continue
+            # Grow by the observed share of matching neighbors (at least double)
+            share = max(len(resolved), 1) / len(neighbors)
+            requested = min(Config.VECTOR_OVERFETCH_MAX, max(requested * 2, int(pool / share * 1.2)))
+
+        limit = top_k
+        if adaptive:
+            similarities = neighbor_similarity([neighbors[position].distance for position in sorted(resolved)])
+            limit = min(top_k, candidate_pool_size(similarities, Config.RETRIEVAL_POOL_MIN))
+        logger.debug(f"{len(resolved)} of {len(neighbors)} neighbors belong to tenant {tenant_id}, "
+                     f"{len(payloads)} found in the payload sidecar, keeping {min(limit, len(resolved))} "
+                     f"after {index_calls} index calls")
+
+        # Process each neighbor from neighbors list
+        results = []
+        for position, neighbor in enumerate(neighbors):
+            # 🔧 Manual tenant filtering: skip neighbors of other tenants (or excluded documents)
+            if position not in resolved:
+                continue
+            datapoint_id, doc_id, chunk_id = resolved[position]
+
+            metadata = {
+                "tenant_id": tenant_id,
+                "doc_id": doc_id,
+                "chunk_id": chunk_id,
+                "datapoint_id": datapoint_id
+            }
+            if return_vectors:
+                # Local index: the stored vector; Vertex: feature_vector on newer SDKs (may be empty)
+                vector = getattr(neighbor, "feature_vector", None)
+                metadata["embedding"] = (
+                    np.asarray(vector, dtype=np.float32) if vector is not None and len(vector) else None
+                )
+                # The id the index stores the vector under (an integer with DATAPOINT_IDS=int)
+                metadata["index_datapoint_id"] = neighbor.id
+
+            results.append((
+                datapoint_id,
+                neighbor.distance,
+                metadata
+            ))
+            if len(results) == limit:
+                break
+        _retrieval_stats.record_search(index_calls, len(resolved), len(results))
 
         print(f"Vector search returned {len(results)} results for tenant {tenant_id}")
-
-        # Load chunk texts from GCS to get full text
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(Config.BUCKET_NAME)
-
-        # Group results by doc_id to minimize GCS reads
-        doc_chunks = {}
-        for datapoint_id, distance, metadata in results:
-            doc_id = metadata.get("doc_id", "")
-            if doc_id not in doc_chunks:
-                doc_chunks[doc_id] = []
-            doc_chunks[doc_id].append((datapoint_id, distance, metadata))
-
-        # Load chunk texts and enhance results
-        enhanced_results = []
-        for doc_id, doc_results in doc_chunks.items():
-            chunk_texts = {}
-            try:
-                # Load chunk texts for this document
-                chunk_blob_name = f"chunks/{tenant_id}/{doc_id}.json"
-                chunk_blob = bucket.blob(chunk_blob_name)
-                if chunk_blob.exists():
-                    chunk_data = json.loads(chunk_blob.download_as_text())
-                    chunk_texts = chunk_data
-                    print(f"Loaded {len(chunk_texts)} chunks for doc {doc_id}")
-                else:
-                    print(f"Warning: Chunk file not found: {chunk_blob_name}")
-            except Exception as e:
-                print(f"Warning: Could not load chunk texts for {doc_id}: {e}")
-
-            # Enhance metadata for each result
-            for datapoint_id, distance, metadata in doc_results:
-                chunk_info = chunk_texts.get(datapoint_id, {})
-                enhanced_metadata = metadata.copy()
-                enhanced_metadata["full_text"] = chunk_info.get("text", "")
-                enhanced_metadata["preview_text"] = chunk_info.get("text", "")[:200]
-                enhanced_metadata["path"] = chunk_info.get("path", "")
-                enhanced_metadata["checksum"] = chunk_info.get("checksum", "")
-                enhanced_metadata["page"] = chunk_info.get("page", metadata.get("page", 1))
-
-                enhanced_results.append((datapoint_id, distance, enhanced_metadata))
-
-        print(f"Enhanced results: {len(enhanced_results)} chunks with text loaded")
-        return enhanced_results
+        return hydrate_results(tenant_id, results, payloads, clients, return_vectors)
 
     except Exception as e:
         print(f"Error in vector search: {e}")
@@ -197,27 +574,184 @@ def vector_search(
         return []
 
 
+def lexical_results(
+    tenant_id: str,
+    lexical_hits: Sequence[LexicalHit],
+    clients: Optional[ClientRegistry] = None,
+    return_vectors: bool = False
+) -> List[Tuple[str, float, dict]]:
+    """
+    Hydrate BM25 hits like vector_search results.
+
+    Args:
+        tenant_id: Tenant the hits belong to
+        lexical_hits: Hits from LexicalIndex.search
+        clients: Client registry to use (defaults to the process-wide registry)
+        return_vectors: Add metadata["embedding"] from the embedding cache
+
+    Returns:
+        List of tuples (datapoint_id, BM25 score, metadata)
+    """
+    clients = clients or get_clients()
+    results = []
+    for hit in lexical_hits:
+        chunk_id = chunk_id_for(hit.chunk_index)
+        datapoint_id = datapoint_id_for(tenant_id, hit.doc_id, chunk_id)
+        metadata = {"tenant_id": tenant_id, "doc_id": hit.doc_id, "chunk_id": chunk_id, "datapoint_id": datapoint_id}
+        if return_vectors:
+            metadata["embedding"] = None
+        results.append((datapoint_id, hit.score, metadata))
+    payload_store = get_payload_store()
+    payloads = payload_store.get_many(result[0] for result in results) if payload_store is not None else {}
+    return hydrate_results(tenant_id, results, payloads, clients, return_vectors)
+
+
+def lexical_fast_path(query: str, lexical_hits: Sequence[LexicalHit]) -> List[LexicalHit]:
+    """
+    Return the hits that answer a strong keyword query on their own.
+
+    A query qualifies when it is at most LEXICAL_FAST_PATH_MAX_CHARS long
+    (a room name, product code or phone number rather than a question) and
+    some chunk contains at least LEXICAL_FAST_PATH_COVERAGE of its n-grams;
+    only such chunks are returned.
+
+    Returns:
+        Qualifying hits, best first (empty: use vector search)
+    """
+    from app.config import Config
+
+    if not Config.LEXICAL_FAST_PATH or len(query.strip()) > Config.LEXICAL_FAST_PATH_MAX_CHARS:
+        return []
+    return [hit for hit in lexical_hits if hit.coverage >= Config.LEXICAL_FAST_PATH_COVERAGE]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> Dict[str, float]:
+    """
+    Fuse ranked lists of ids: each list adds 1 / (k + rank) to an id's score.
+
+    Args:
+        rankings: Lists of ids, best first
+        k: Damping constant (larger: lower ranks count relatively more)
+
+    Returns:
+        Fused score per id
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def fuse_results(
+    tenant_id: str,
+    vector_results: List[Tuple[str, float, dict]],
+    lexical_hits: Sequence[LexicalHit],
+    clients: Optional[ClientRegistry] = None
+) -> List[Tuple[str, float, dict]]:
+    """
+    Merge vector and BM25 results by reciprocal rank fusion (Config.LEXICAL_RRF_K).
+
+    Chunks found only lexically are hydrated (with their cached embeddings).
+
+    Returns:
+        List of tuples (datapoint_id, fused score min-max scaled to 0-1, metadata),
+        best first
+    """
+    from app.config import Config
+
+    by_id = {datapoint_id: metadata for datapoint_id, _, metadata in vector_results}
+    lexical_ids = [
+        datapoint_id_for(tenant_id, hit.doc_id, chunk_id_for(hit.chunk_index)) for hit in lexical_hits
+    ]
+    lexical_only = [hit for hit, datapoint_id in zip(lexical_hits, lexical_ids) if datapoint_id not in by_id]
+    for datapoint_id, _, metadata in lexical_results(tenant_id, lexical_only, clients, return_vectors=True):
+        by_id[datapoint_id] = metadata
+
+    fused = reciprocal_rank_fusion(
+        [[datapoint_id for datapoint_id, _, _ in vector_results], lexical_ids], k=Config.LEXICAL_RRF_K
+    )
+    ranked = sorted(fused.items(), key=lambda item: -item[1])
+    high, low = ranked[0][1], ranked[-1][1]
+    logger.debug(f"Fused {len(vector_results)} vector and {len(lexical_ids)} lexical results "
+                 f"({len(lexical_only)} lexical only)")
+    return [
+        (datapoint_id, (score - low) / (high - low) if high > low else 1.0, by_id[datapoint_id])
+        for datapoint_id, score in ranked
+    ]
+
+
 def apply_mmr(
     hits: List[ChunkHit],
     query_embedding: List[float],
     lambda_param: float = 0.5,
-    top_k: int = 15
+    top_k: int = 15,
+    embeddings: Optional[Sequence[Optional[Sequence[float]]]] = None,
+    relevance: Optional[Sequence[float]] = None
 ) -> List[ChunkHit]:
     """
     Apply Maximum Marginal Relevance (MMR) to diversify results.
-    
+
+    With an embedding for every hit, relevance is the cosine similarity to
+    the query and redundancy the highest cosine similarity to an already
+    selected hit. Each pick adds one row of similarities to a running
+    maximum, so selecting top_k of n hits is top_k matrix-vector products.
+    A hit without an embedding keeps its relevance (relevance, or its score)
+    and is never penalized as redundant; only when no hit has an embedding
+    is token overlap of the preview texts used instead.
+    relevance replaces the query similarity (e.g. fused hybrid scores).
+
     Args:
         hits: List of ChunkHit objects
         query_embedding: Query embedding vector
         lambda_param: Balance between relevance and diversity (0-1)
         top_k: Number of results to return
-        
+        embeddings: Embedding of each hit (same order as hits)
+        relevance: Relevance of each hit (default: cosine similarity to the query)
+
     Returns:
         List of diversified ChunkHit objects
     """
     if len(hits) <= top_k:
         return hits
-    
+    missing = [i for i, embedding in enumerate(embeddings or [None] * len(hits)) if embedding is None]
+    if len(missing) == len(hits):
+        print(f"Warning: No embeddings for {len(hits)} hits, MMR falling back to text similarity")
+        return _apply_text_mmr(hits, lambda_param, top_k)
+
+    dims = len(next(embedding for embedding in embeddings if embedding is not None))
+    vectors = np.zeros((len(hits), dims), dtype=np.float32)
+    for i, embedding in enumerate(embeddings):
+        if embedding is not None:
+            vectors[i] = embedding
+    # Zero rows normalize to zero: similarity 0 to the query and to every pick
+    vectors = normalize(vectors)
+    if relevance is None:
+        relevance = vectors @ normalize(np.asarray(query_embedding, dtype=np.float32))
+        relevance[missing] = [hits[i].score for i in missing]
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    if missing:
+        print(f"Warning: {len(missing)} of {len(hits)} hits have no embedding, "
+              f"MMR treats them as non-redundant")
+    available = np.ones(len(hits), dtype=bool)
+
+    selected = [int(np.argmax(relevance))]
+    available[selected[0]] = False
+    max_similarity = vectors @ vectors[selected[0]]
+    while len(selected) < top_k:
+        mmr_scores = lambda_param * relevance - (1 - lambda_param) * max_similarity
+        mmr_scores[~available] = -np.inf
+        best_idx = int(np.argmax(mmr_scores))
+        selected.append(best_idx)
+        available[best_idx] = False
+        np.maximum(max_similarity, vectors @ vectors[best_idx], out=max_similarity)
+
+    return [hits[i] for i in selected]
+
+
+def _apply_text_mmr(hits: List[ChunkHit], lambda_param: float, top_k: int) -> List[ChunkHit]:
+    """MMR with hit scores as relevance and preview-text token overlap as similarity."""
     selected = []
     candidates = hits.copy()
     
@@ -270,50 +804,121 @@ def calculate_text_similarity(text1: str, text2: str) -> float:
     return intersection / union if union > 0 else 0.0
 
 
+def _chunk_hit(metadata: dict, score: float) -> ChunkHit:
+    """Build a ChunkHit from hydrated result metadata."""
+    return ChunkHit(
+        chunk_id=metadata.get("chunk_id", ""),
+        doc_id=metadata.get("doc_id", ""),
+        page=int(metadata.get("page", 1)),
+        path=metadata.get("path", ""),
+        checksum=metadata.get("checksum", ""),
+        preview_text=metadata.get("preview_text", ""),
+        score=score,
+        full_text=metadata.get("full_text", "")
+    )
+
+
 async def search(
     tenant_id: str,
     query: str,
     index_endpoint_id: str,
-    top_k_vector: int = 30,
-    top_k_final: int = 15
+    top_k_vector: Optional[int] = None,
+    top_k_final: int = 15,
+    clients: Optional[ClientRegistry] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+    exclude_doc_ids: Optional[Sequence[str]] = None
 ) -> List[ChunkHit]:
     """
     Search for relevant chunks with namespace filtering and MMR.
+
+    With Config.LEXICAL_INDEX, BM25 hits are fused with the vector results
+    by reciprocal rank fusion, and strong keyword matches (see
+    lexical_fast_path) are returned without embedding the query.
     
     Args:
         tenant_id: Tenant identifier
         query: User query
         index_endpoint_id: Vector Search index endpoint ID
-        top_k_vector: Number of results to retrieve from vector search
+        top_k_vector: Number of results to retrieve from vector search; with
+            Config.RETRIEVAL_ADAPTIVE the upper bound of the candidate pool
+            (default RETRIEVAL_POOL_MAX, or 30 when not adaptive)
         top_k_final: Number of results to return after MMR
+        clients: Client registry to use (defaults to the process-wide registry)
+        doc_ids: Only search these documents of the tenant
+        exclude_doc_ids: Leave these documents out
         
     Returns:
         List of ChunkHit objects
     """
-    query_embedding = embed_query(query)
+    from app.config import Config
 
-    search_results = vector_search(
+    # Exact terms first: a strong keyword match is answered without the embedding call
+    lexical_hits = []
+    lexicon = get_lexical_index()
+    if lexicon is not None:
+        lexical_hits = await run_io(
+            "lexical_search", lexicon.search, tenant_id, query, Config.LEXICAL_TOP_K,
+            doc_ids=doc_ids, exclude_doc_ids=exclude_doc_ids
+        )
+        keyword_hits = lexical_fast_path(query, lexical_hits)
+        if keyword_hits:
+            results = await run_io("storage", lexical_results, tenant_id, keyword_hits[:top_k_final], clients)
+            best = results[0][1]
+            hits = [_chunk_hit(metadata, score / best) for _, score, metadata in results]
+            get_retrieval_stats().record_search(0, len(lexical_hits), len(hits))
+            get_retrieval_stats().record_lexical_only()
+            get_retrieval_stats().record_returned(len(hits))
+            print(f"Lexical fast path: {len(hits)} of {len(lexical_hits)} keyword hits, no embedding call")
+            return hits
+
+    # Blocking Vertex AI calls run on the I/O pool so the event loop stays free
+    query_embedding = await run_io("embed", embed_query, query, clients=clients)
+
+    # Adaptive pool: start with top_k_final neighbors and grow only while the
+    # tail is still relevant; hydration and MMR run on the final pool only
+    if Config.RETRIEVAL_ADAPTIVE:
+        top_k_vector = top_k_vector or Config.RETRIEVAL_POOL_MAX
+        adaptive_from = min(top_k_final, top_k_vector)
+    else:
+        top_k_vector = top_k_vector or 30
+        adaptive_from = None
+
+    search_results = await run_io(
+        "vector_search",
+        vector_search,
         tenant_id=tenant_id,
         query_embedding=query_embedding,
         index_endpoint_id=index_endpoint_id,
-        top_k=top_k_vector
+        top_k=top_k_vector,
+        clients=clients,
+        doc_ids=doc_ids,
+        exclude_doc_ids=exclude_doc_ids,
+        return_vectors=True,
+        adaptive_from=adaptive_from
     )
 
+    if lexical_hits:
+        # Hybrid: reciprocal rank fusion of both lists drives the ranking and MMR
+        search_results = await run_io("storage", fuse_results, tenant_id, search_results, lexical_hits, clients)
+        relevance = [score for _, score, _ in search_results]
+    else:
+        # Similarity from the index, so hits whose vector could not be read
+        # still rank by their similarity to the query
+        similarities = neighbor_similarity([distance for _, distance, _ in search_results])
+        relevance = similarities.tolist() if similarities is not None else None
+
     hits = []
-    for datapoint_id, distance, metadata in search_results:
-        score = 1.0 / (1.0 + distance)
-
-        hit = ChunkHit(
-            chunk_id=metadata.get("chunk_id", ""),
-            doc_id=metadata.get("doc_id", ""),
-            page=int(metadata.get("page", 1)),
-            path=metadata.get("path", ""),
-            checksum=metadata.get("checksum", ""),
-            preview_text=metadata.get("preview_text", ""),
-            score=score,
-            full_text=metadata.get("full_text", "")
-        )
-        hits.append(hit)
+    embeddings = []
+    for i, (datapoint_id, distance, metadata) in enumerate(search_results):
+        if lexical_hits:
+            score = distance
+        elif relevance is not None:
+            # 1 / (1 + cosine distance), clipped to 0-1 for unnormalized dot products
+            score = 1.0 / (2.0 - min(max(relevance[i], -1.0), 1.0))
+        else:
+            score = 1.0 / (1.0 + distance)
+        hits.append(_chunk_hit(metadata, score))
+        embeddings.append(metadata.get("embedding"))
     
     print(f"Created {len(hits)} ChunkHit objects")
     
@@ -321,8 +926,11 @@ async def search(
         hits=hits,
         query_embedding=query_embedding,
         lambda_param=0.6,
-        top_k=top_k_final
+        top_k=top_k_final,
+        embeddings=embeddings,
+        relevance=relevance
     )
     
+    get_retrieval_stats().record_returned(len(diversified_hits))
     print(f"After MMR: {len(diversified_hits)} diversified hits")
     return diversified_hits
\ No newline at end of file
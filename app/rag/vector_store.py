@@ -0,0 +1,352 @@
+"""In-process exact vector search over per-tenant memory-mapped matrices.
+
+With VECTOR_BACKEND=local the ingest path upserts embeddings here instead of
+Vertex AI Vector Search, and vector_search answers from here without a
+network round trip. Every tenant has its own float32 matrix of
+L2-normalized embeddings, so a query is one matrix-vector product over that
+tenant's rows plus an argpartition for the top k; other tenants' chunks are
+never scanned.
+
+Per tenant, under LOCAL_VECTOR_DIR/{tenant_id}/:
+
+    vectors-{dims}.f32   row-major float32 matrix, grown by doubling
+    rows.log             append-only "row<TAB>datapoint_id" lines; an empty
+                         id frees the row, which is reused by a later upsert
+
+Vectors are written before the log line that makes them visible, so a
+crash never exposes a half-written row. Distances are cosine distances
+(1 - cosine similarity), like the COSINE_DISTANCE Vertex index.
+
+With LOCAL_VECTOR_ENGINE=ivfpq, tenants past VECTOR_ANN_MIN_ROWS vectors
+are searched through an IVF-PQ index kept next to the matrix
+(app.rag.ann); smaller tenants are still scanned exactly.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.config import Config
+from app.rag.ann import TRAIN_SAMPLE, IvfPqIndex
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_ROWS = 1024
+
+
+class Neighbor(NamedTuple):
+    """One search result, shaped like the Vertex find_neighbors result."""
+    id: str
+    distance: float
+    feature_vector: Optional[np.ndarray] = None   # stored (normalized) vector, when requested
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class _TenantMatrix:
+    """The vectors of one tenant plus the row <-> datapoint id mapping."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "rows.log")
+        self._lock = threading.Lock()
+        self.dims = 0
+        self._matrix: Optional[np.memmap] = None
+        self._ids: List[Optional[str]] = []          # row -> datapoint id (None when free)
+        self._rows: Dict[str, int] = {}              # datapoint id -> row
+        self._free: List[int] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._ann: Optional[IvfPqIndex] = None
+        self._pending: Optional[List[np.ndarray]] = None   # rows upserted while an index is being trained
+        self._trainer: Optional[threading.Thread] = None
+        self._load()
+
+    def _vectors_path(self, dims: int) -> str:
+        return os.path.join(self.directory, f"vectors-{dims}.f32")
+
+    def _load(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.startswith("vectors-") and name.endswith(".f32"):
+                self.dims = int(name[len("vectors-"):-len(".f32")])
+                self._map()
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn write from a crash
+                row, datapoint_id = line.rstrip("\n").split("\t", 1)
+                self._assign(int(row), datapoint_id or None)
+        self._free = [row for row, datapoint_id in enumerate(self._ids) if datapoint_id is None]
+        if Config.LOCAL_VECTOR_ENGINE == "ivfpq" and self._matrix is not None:
+            self._ann = IvfPqIndex.load(self.directory)
+            if self._ann is not None:
+                # Rows logged after their codes were lost to a crash
+                unencoded = self._ann.unencoded_rows(self._matrix.shape[0], self._live)
+                self._encode_rows(self._ann, unencoded, self._matrix)
+            self._update_ann(np.empty(0, dtype=np.int64))
+
+    def _map(self) -> None:
+        path = self._vectors_path(self.dims)
+        capacity = os.path.getsize(path) // (self.dims * 4)
+        self._matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dims))
+        if len(self._live) < capacity:
+            self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+
+    def _assign(self, row: int, datapoint_id: Optional[str]) -> None:
+        while len(self._ids) <= row:
+            self._ids.append(None)
+        previous = self._ids[row]
+        if previous is not None and self._rows.get(previous) == row:
+            del self._rows[previous]
+        self._ids[row] = datapoint_id
+        if datapoint_id is not None:
+            self._rows[datapoint_id] = row
+        if row < len(self._live):
+            self._live[row] = datapoint_id is not None
+
+    def _grow(self, rows: int) -> None:
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(_INITIAL_ROWS, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+        with open(self._vectors_path(self.dims), "ab") as f:
+            f.truncate(new_capacity * self.dims * 4)
+        self._map()
+
+    def upsert(self, datapoint_ids: Sequence[str], vectors: np.ndarray) -> None:
+        with self._lock:
+            if not self.dims:
+                self.dims = vectors.shape[1]
+            if vectors.shape[1] != self.dims:
+                raise ValueError(f"Expected {self.dims}-d vectors, got {vectors.shape[1]}-d")
+            rows, log = [], []
+            new_rows: Dict[str, int] = {}
+            next_row = len(self._ids)
+            for datapoint_id in datapoint_ids:
+                row = self._rows.get(datapoint_id, new_rows.get(datapoint_id))
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row, next_row = next_row, next_row + 1
+                    new_rows[datapoint_id] = row
+                    log.append(f"{row}\t{datapoint_id}\n")
+                rows.append(row)
+            self._grow(next_row)
+            self._matrix[rows] = normalize(vectors)
+            self._matrix.flush()
+            if log:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(log))
+                for line in log:
+                    row, datapoint_id = line.rstrip("\n").split("\t", 1)
+                    self._assign(int(row), datapoint_id)
+            if Config.LOCAL_VECTOR_ENGINE == "ivfpq":
+                self._update_ann(np.asarray(rows, dtype=np.int64))
+
+    def _encode_rows(self, ann: IvfPqIndex, rows: np.ndarray, matrix: np.ndarray) -> None:
+        for start in range(0, len(rows), TRAIN_SAMPLE):
+            block = rows[start:start + TRAIN_SAMPLE]
+            ann.add(block, np.asarray(matrix[block]), matrix.shape[0])
+
+    def _update_ann(self, rows: np.ndarray) -> None:
+        """Encode upserted rows and start a (re)training when one is due. Called with the lock held."""
+        if self._ann is not None:
+            self._ann.add(rows, np.asarray(self._matrix[rows]), self._matrix.shape[0])
+        if self._pending is not None:
+            self._pending.append(rows)
+            return
+        trained_rows = self._ann.trained_rows if self._ann is not None else 0
+        if len(self._rows) >= max(Config.VECTOR_ANN_MIN_ROWS, trained_rows * Config.VECTOR_ANN_RETRAIN_GROWTH):
+            self._pending = []
+            self._trainer = threading.Thread(target=self._train, name="ivfpq-train", daemon=True)
+            self._trainer.start()
+
+    def _train(self) -> None:
+        """Train a new index generation off the lock, then swap it in."""
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                matrix = self._matrix
+                live_rows = np.flatnonzero(self._live)
+            sample = np.random.default_rng(len(live_rows)).choice(
+                live_rows, min(len(live_rows), TRAIN_SAMPLE), replace=False
+            )
+            ann = IvfPqIndex.train(self.directory, np.asarray(matrix[np.sort(sample)]), len(live_rows))
+            self._encode_rows(ann, live_rows, matrix)
+            with self._lock:
+                # Rows upserted while training (live_rows may have been overwritten too)
+                for rows in self._pending:
+                    ann.add(rows, np.asarray(self._matrix[rows]), self._matrix.shape[0])
+                ann.save()
+                self._ann = ann
+            ann.delete_older()
+            logger.debug(f"Trained IVF-PQ index generation {ann.generation} for {self.directory} "
+                         f"({len(live_rows)} vectors, {ann.nlist} lists) in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"Warning: IVF-PQ training failed for {self.directory}: {e}")
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def remove(self, datapoint_ids: Sequence[str]) -> int:
+        with self._lock:
+            rows = [self._rows[d] for d in datapoint_ids if d in self._rows]
+            if not rows:
+                return 0
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{row}\t\n" for row in rows))
+            for row in rows:
+                self._assign(row, None)
+                self._free.append(row)
+            return len(rows)
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int] = None,
+        rerank: Optional[int] = None,
+        exact: bool = False,
+        return_vectors: bool = False
+    ) -> List[Neighbor]:
+        with self._lock:
+            matrix, live, ids, used = self._matrix, self._live, self._ids, len(self._ids)
+            live_count = len(self._rows)
+            ann = self._ann
+        if matrix is None or not live_count or top_k <= 0:
+            return []
+        query = normalize(query.astype(np.float32))
+        if ann is not None and not exact:
+            rows, similarities = ann.search(query, top_k, matrix, live, nprobe=nprobe, rerank=rerank)
+        else:
+            scores = matrix[:used] @ query
+            scores[~live[:used]] = -np.inf
+            k = min(top_k, live_count)
+            rows = np.argpartition(-scores, k - 1)[:k]
+            rows = rows[np.argsort(-scores[rows])]
+            similarities = scores[rows]
+        vectors = np.asarray(matrix[rows]) if return_vectors else [None] * len(rows)
+        return [
+            Neighbor(ids[row], float(1.0 - similarity), vector)
+            for row, similarity, vector in zip(rows.tolist(), similarities.tolist(), vectors)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class LocalVectorIndex:
+    """Per-tenant exact vector search with memory-mapped persistence."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.LOCAL_VECTOR_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self._tenants: Dict[str, _TenantMatrix] = {}
+        self._lock = threading.Lock()
+
+    def _tenant(self, tenant_id: str, create: bool = False) -> Optional[_TenantMatrix]:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None:
+            if not tenant_id or tenant_id.startswith(".") or "/" in tenant_id or os.sep in tenant_id:
+                raise ValueError(f"Invalid tenant id for the local vector index: {tenant_id!r}")
+            path = os.path.join(self.directory, tenant_id)
+            if not create and not os.path.isdir(path):
+                return None
+            with self._lock:
+                tenant = self._tenants.get(tenant_id)
+                if tenant is None:
+                    os.makedirs(path, exist_ok=True)
+                    tenant = self._tenants[tenant_id] = _TenantMatrix(path)
+        return tenant
+
+    def upsert(self, tenant_id: str, datapoint_ids: Sequence[str], embeddings: Sequence[Sequence[float]]) -> int:
+        """
+        Insert or replace vectors of a tenant.
+
+        Returns:
+            Number of vectors written
+        """
+        if not datapoint_ids:
+            return 0
+        self._tenant(tenant_id, create=True).upsert(datapoint_ids, np.asarray(embeddings, dtype=np.float32))
+        return len(datapoint_ids)
+
+    def remove(self, tenant_id: str, datapoint_ids: Sequence[str]) -> int:
+        """
+        Delete vectors of a tenant.
+
+        Returns:
+            Number of vectors that existed and were removed
+        """
+        tenant = self._tenant(tenant_id)
+        return tenant.remove(datapoint_ids) if tenant is not None else 0
+
+    def find_neighbors(
+        self,
+        tenant_id: str,
+        query: Sequence[float],
+        top_k: int,
+        nprobe: Optional[int] = None,
+        rerank: Optional[int] = None,
+        exact: bool = False,
+        return_vectors: bool = False
+    ) -> List[Neighbor]:
+        """
+        Return the top_k nearest vectors of a tenant, nearest first.
+
+        Args:
+            tenant_id: Tenant whose vectors are searched
+            query: Query embedding
+            top_k: Number of neighbors
+            nprobe: IVF clusters to visit (default Config.VECTOR_ANN_NPROBE)
+            rerank: PQ candidates rescored exactly (default Config.VECTOR_ANN_RERANK)
+            exact: Scan every row even if the tenant has an ANN index
+            return_vectors: Fill Neighbor.feature_vector with the stored vectors
+
+        Returns:
+            Neighbors with datapoint id and cosine distance
+        """
+        tenant = self._tenant(tenant_id)
+        if tenant is None:
+            return []
+        return tenant.search(
+            np.asarray(query, dtype=np.float32), top_k,
+            nprobe=nprobe, rerank=rerank, exact=exact, return_vectors=return_vectors
+        )
+
+    def count(self, tenant_id: str) -> int:
+        """Return the number of vectors stored for a tenant."""
+        tenant = self._tenant(tenant_id)
+        return len(tenant) if tenant is not None else 0
+
+
+_index: Optional[LocalVectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> LocalVectorIndex:
+    """
+    Return the process-wide local vector index, creating it on first use.
+
+    Returns:
+        Shared LocalVectorIndex instance
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalVectorIndex()
+    return _index
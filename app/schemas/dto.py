@@ -1,23 +1,55 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
 class IngestRequest(BaseModel):
     tenant_id: str = Field(..., min_length=1, description="Tenant identifier")
-    gcs_uri: str = Field(..., pattern=r"^gs://.*", description="GCS URI of the PDF file")
+    gcs_uri: str = Field(
+        ...,
+        pattern=r"^(gs|file)://.*",
+        description="GCS URI of the PDF file (file:// only when ALLOW_LOCAL_FILES is enabled)"
+    )
     doc_id: str = Field(..., min_length=1, description="Document identifier")
+    mode: str = Field(
+        "incremental",
+        pattern=r"^(incremental|full)$",
+        description="incremental: embed/upsert only changed chunks; full: re-embed everything"
+    )
 
 
 class IngestResponse(BaseModel):
     job_id: str = Field(..., description="Job identifier")
     doc_id: str = Field(..., description="Document identifier")
-    chunks: int = Field(..., ge=0, description="Number of chunks created")
+    status: str = Field("queued", description="Job status (queued, running, succeeded, failed)")
+    chunks: int = Field(0, ge=0, description="Number of chunks created")
+
+
+class JobProgress(BaseModel):
+    extracted_pages: int = Field(0, ge=0, description="Pages extracted from the document")
+    chunks: int = Field(0, ge=0, description="Chunks created")
+    embedded: int = Field(0, ge=0, description="Chunks embedded")
+    upserted: int = Field(0, ge=0, description="Vectors upserted")
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str = Field(..., description="Job identifier")
+    tenant_id: str = Field(..., description="Tenant identifier")
+    doc_id: str = Field(..., description="Document identifier")
+    status: str = Field(..., description="Job status (queued, running, succeeded, failed)")
+    progress: JobProgress = Field(..., description="Per-stage progress counters")
+    attempts: int = Field(..., ge=0, description="Number of times the job was started")
+    result: Optional[Dict[str, Any]] = Field(None, description="Ingestion result when succeeded")
+    error: Optional[str] = Field(None, description="Error message when failed")
+    created_at: float = Field(..., description="Creation time (Unix seconds)")
+    updated_at: float = Field(..., description="Last update time (Unix seconds)")
 
 
 class ChatRequest(BaseModel):
     tenant_id: str = Field(..., min_length=1, description="Tenant identifier")
     query: str = Field(..., min_length=1, description="User query")
     top_k: int = Field(15, ge=1, le=50, description="Number of top results to retrieve")
+    doc_ids: Optional[List[str]] = Field(None, description="Only search these documents")
+    exclude_doc_ids: Optional[List[str]] = Field(None, description="Documents to leave out of the search")
 
 
 class Citation(BaseModel):
@@ -43,6 +75,7 @@ class Chunk(BaseModel):
     chunk_id: str = Field(..., description="Chunk identifier")
     text: str = Field(..., description="Chunk text content")
     page: int = Field(..., ge=1, description="Page number")
+    page_end: Optional[int] = Field(None, ge=1, description="Last page the chunk covers (when it spans pages)")
     checksum: str = Field(..., description="SHA256 checksum")
     preview_text: str = Field(..., description="Preview text (first 200 chars)")
 
@@ -0,0 +1,158 @@
+"""Detect and strip headers, footers and other lines repeated on most pages.
+
+Corporate PDFs repeat the same title lines, page numbers and confidentiality
+notices on every page. Left in, they are chunked, embedded, stored and sent
+to the generator with every hit. BoilerplateStripper looks only at the
+header/footer zone of each page (its first and last
+Config.BOILERPLATE_EDGE_LINES non-empty lines) and removes the lines whose
+key occurs on at least Config.BOILERPLATE_MIN_PAGE_RATIO of the pages.
+
+A line's key is its exact (whitespace-normalized) text, so templated body
+lines such as "料金: 12000円" or "客室3: デラックスツイン" only match
+where they really are identical. Short, mostly numeric lines additionally
+get one key per number they contain, with that number replaced by its
+offset from the page number: "Page 3 of 10" on page 3 and "Page 4 of 10"
+on page 4 share a key, a price that happens to sit in the footer does not.
+
+Pages are streamed: the first Config.BOILERPLATE_SAMPLE_PAGES pages are
+buffered to learn the repeated lines, which are then stripped from those
+and every following page. Documents shorter than the sample window are
+therefore handled as a whole.
+"""
+import hashlib
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional, Set
+
+from app.config import Config
+from app.schemas.dto import PageText
+from app.utils.tokens import estimate_tokens
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+# Lines this short and with this few letters may be page counters
+# ("- 3 -", "3 / 10", "Page 3 of 10", "ページ 3")
+_COUNTER_MAX_CHARS = 40
+_COUNTER_MAX_LETTERS = 6
+_LETTERS = re.compile(r"[^\W\d_]")
+
+
+def _hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+def _line_keys(line: str, page_num: int) -> List[bytes]:
+    """Exact-text key of a line plus, for short lines, one page-counter key per number."""
+    normalized = _SPACES.sub(" ", line).strip()
+    if not normalized:
+        return []
+    keys = [_hash(normalized)]
+    if len(normalized) <= _COUNTER_MAX_CHARS and len(_LETTERS.findall(normalized)) <= _COUNTER_MAX_LETTERS:
+        numbers = list(_DIGITS.finditer(normalized))
+        folded = _DIGITS.sub("#", normalized)
+        for position, number in enumerate(numbers):
+            keys.append(_hash(f"{folded}\0{position}\0{int(number.group()) - page_num}"))
+    return keys
+
+
+def _edge_lines(lines: List[str], edge: int) -> Set[int]:
+    """Indices of the first and last `edge` non-empty lines of a page."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:edge]) | set(filled[-edge:]) if edge > 0 else set()
+
+
+class BoilerplateStripper:
+    """
+    Strip repeated lines from a stream of pages and count what was removed.
+
+    Attributes:
+        removed_chars: Characters removed so far
+        removed_tokens: Estimated tokens removed so far
+        removed_lines: Lines removed so far
+    """
+
+    def __init__(
+        self,
+        sample_pages: Optional[int] = None,
+        min_pages: Optional[int] = None,
+        min_page_ratio: Optional[float] = None,
+        edge_lines: Optional[int] = None
+    ):
+        self.sample_pages = sample_pages or Config.BOILERPLATE_SAMPLE_PAGES
+        self.min_pages = min_pages or Config.BOILERPLATE_MIN_PAGES
+        self.min_page_ratio = min_page_ratio or Config.BOILERPLATE_MIN_PAGE_RATIO
+        self.edge_lines = edge_lines if edge_lines is not None else Config.BOILERPLATE_EDGE_LINES
+        self.removed_chars = 0
+        self.removed_tokens = 0
+        self.removed_lines = 0
+        self._repeated: Set[bytes] = set()
+
+    def learn(self, pages: List[PageText]) -> Set[bytes]:
+        """
+        Find the header/footer line keys that repeat on enough of the given pages.
+
+        Args:
+            pages: Sample of pages from one document
+
+        Returns:
+            Keys of the lines to strip (empty when there are too few pages)
+        """
+        if len(pages) < self.min_pages:
+            return set()
+        counts: Counter = Counter()
+        for page in pages:
+            lines = page.text.splitlines()
+            counts.update({
+                key for i in _edge_lines(lines, self.edge_lines) for key in _line_keys(lines[i], page.page_num)
+            })
+        threshold = max(2, self.min_page_ratio * len(pages))
+        return {key for key, count in counts.items() if count >= threshold}
+
+    def strip_page(self, page: PageText) -> PageText:
+        """Remove the learned repeated lines from the header/footer zone of one page."""
+        if not self._repeated:
+            return page
+        lines = page.text.splitlines()
+        removed = {
+            i for i in _edge_lines(lines, self.edge_lines)
+            if not self._repeated.isdisjoint(_line_keys(lines[i], page.page_num))
+        }
+        if not removed:
+            return page
+        for i in removed:
+            self.removed_chars += len(lines[i])
+            self.removed_tokens += estimate_tokens(lines[i])
+            self.removed_lines += 1
+        kept = [line for i, line in enumerate(lines) if i not in removed]
+        return PageText(page_num=page.page_num, text="\n".join(kept).strip())
+
+    def strip(self, pages: Iterable[PageText]) -> Iterator[PageText]:
+        """
+        Lazily strip repeated lines from a document's pages.
+
+        Pages left without text are dropped, like pages the PDF parser
+        returns empty.
+
+        Args:
+            pages: Pages of one document, in order
+
+        Yields:
+            Stripped PageText objects in page order
+        """
+        iterator = iter(pages)
+        sample: List[PageText] = []
+        for page in iterator:
+            sample.append(page)
+            if len(sample) >= self.sample_pages:
+                break
+        self._repeated = self.learn(sample)
+
+        for page in sample:
+            stripped = self.strip_page(page)
+            if stripped.text:
+                yield stripped
+        for page in iterator:
+            stripped = self.strip_page(page)
+            if stripped.text:
+                yield stripped
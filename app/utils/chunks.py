@@ -1,6 +1,120 @@
-from typing import List
+import re
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.config import Config
 from app.schemas.dto import Chunk, PageText
 from app.utils.hash import calculate_checksum
+from app.utils.tokens import estimate_tokens, is_cjk
+
+PREVIEW_CHARS = 200
+
+
+# Chunk indices are page * CHUNKS_PER_PAGE + position among the chunks
+# starting on that page, so an edit that changes one page's chunk count
+# leaves the ids (and datapoints) of every other page unchanged
+CHUNKS_PER_PAGE = 1000
+
+
+def chunk_index_for(page: int, position: int) -> int:
+    """
+    Build the page-stable index of the position-th chunk starting on a page.
+
+    Raises:
+        ValueError: If the page has more than CHUNKS_PER_PAGE chunks
+    """
+    if position >= CHUNKS_PER_PAGE:
+        raise ValueError(f"Page {page} has more than {CHUNKS_PER_PAGE} chunks")
+    return page * CHUNKS_PER_PAGE + position
+
+
+def chunk_id_for(index: int) -> str:
+    """Build the chunk id of the chunk with the given index (see chunk_index_for)."""
+    return f"c-{index:05d}"
+
+
+class ChunkRef:
+    """
+    A chunk recorded as (page, start, end) offsets into its page text.
+
+    The chunk text and preview are sliced from the shared page string on
+    access instead of being stored, and the checksum is computed the first
+    time it is needed. Use to_model() where a pydantic Chunk is required.
+
+    Chunks that span pages (see iter_sentence_chunks) index into a shared
+    buffer of consecutive pages instead; page is the first page and
+    page_end the last.
+    """
+
+    __slots__ = ("index", "page", "page_end", "start", "end", "_page_text", "_checksum")
+
+    def __init__(
+        self,
+        index: int,
+        page: int,
+        start: int,
+        end: int,
+        page_text: str,
+        checksum: Optional[str] = None,
+        page_end: Optional[int] = None
+    ):
+        self.index = index
+        self.page = page
+        self.page_end = page if page_end is None else page_end
+        self.start = start
+        self.end = end
+        self._page_text = page_text
+        self._checksum = checksum
+
+    @property
+    def chunk_id(self) -> str:
+        return chunk_id_for(self.index)
+
+    @property
+    def text(self) -> str:
+        return self._page_text[self.start:self.end]
+
+    @property
+    def preview_text(self) -> str:
+        return self._page_text[self.start:min(self.end, self.start + PREVIEW_CHARS)]
+
+    @property
+    def checksum(self) -> str:
+        if self._checksum is None:
+            self._checksum = calculate_checksum(self.text)
+        return self._checksum
+
+    def to_model(self) -> Chunk:
+        """Materialize the chunk as a validated pydantic Chunk."""
+        text = self.text
+        return Chunk(
+            chunk_id=self.chunk_id,
+            text=text,
+            page=self.page,
+            page_end=self.page_end,
+            checksum=self.checksum,
+            preview_text=text[:PREVIEW_CHARS]
+        )
+
+    def __repr__(self) -> str:
+        pages = f"{self.page}" if self.page_end == self.page else f"{self.page}-{self.page_end}"
+        return f"ChunkRef({self.chunk_id!r}, page={pages}, start={self.start}, end={self.end})"
+
+
+def page_spans(length: int, size: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """
+    Yield the (start, end) offsets of the chunks of a page of the given length.
+
+    A page that fits in one chunk (including an empty page) yields a single
+    span; longer pages are cut into size-character windows that overlap by
+    overlap characters.
+    """
+    if length <= size:
+        yield 0, length
+        return
+    start = 0
+    while start < length:
+        yield start, min(start + size, length)
+        start += size - overlap
 
 
 def make_chunks(
@@ -10,52 +124,234 @@ def make_chunks(
 ) -> List[Chunk]:
     """
     Split pages into chunks with overlap.
-    
+
     Args:
         pages: List of PageText objects
         size: Chunk size in characters
         overlap: Overlap size in characters
-        
+
     Returns:
         List of Chunk objects
     """
-    chunks = []
-    chunk_counter = 0
-    
+    return [chunk.to_model() for chunk in iter_chunks(pages, size=size, overlap=overlap)]
+
+
+def iter_chunks(
+    pages: Iterable[PageText],
+    size: int = 1400,
+    overlap: int = 160
+) -> Iterator[ChunkRef]:
+    """
+    Lazily split a stream of pages into chunks with overlap.
+
+    Produces the same chunks as make_chunks, one page at a time, so the
+    caller never holds more than one page of chunks.
+
+    Args:
+        pages: Iterable of PageText objects
+        size: Chunk size in characters
+        overlap: Overlap size in characters
+
+    Yields:
+        ChunkRef objects in document order
+    """
     for page_text in pages:
         text = page_text.text
-        page_num = page_text.page_num
-        
-        if len(text) <= size:
-            chunk_id = f"c-{chunk_counter:05d}"
-            chunk = Chunk(
-                chunk_id=chunk_id,
-                text=text,
-                page=page_num,
-                checksum=calculate_checksum(text),
-                preview_text=text[:200]
-            )
-            chunks.append(chunk)
-            chunk_counter += 1
+        for position, (start, end) in enumerate(page_spans(len(text), size, overlap)):
+            yield ChunkRef(chunk_index_for(page_text.page_num, position), page_text.page_num, start, end, text)
+
+
+# A sentence ends at Japanese 。！？ (plus any closing brackets/quotes), at
+# .!? followed by whitespace or the end of the page (so "3.5" and "e.g" do
+# not split), or at a blank line.
+_SENTENCE_END = re.compile(
+    r"[。！？][」』）)\"']*"
+    r"|[.!?][\"')\]]*(?=\s|$)"
+    r"|\n[ \t\u3000]*\n"
+)
+
+
+def sentence_spans(text: str, max_tokens: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Split a text into sentences.
+
+    Leading whitespace is dropped from each sentence and whitespace-only
+    sentences are skipped. A sentence longer than max_tokens is cut into
+    pieces of about equal token count that each fit the budget.
+
+    Args:
+        text: Text to split
+        max_tokens: Maximum estimated tokens per sentence
+
+    Yields:
+        (start, end, tokens) of each sentence
+    """
+    position = 0
+    boundaries = [match.end() for match in _SENTENCE_END.finditer(text)]
+    for boundary in boundaries + [len(text)]:
+        start, end = position, boundary
+        position = boundary
+        while start < end and text[start].isspace():
+            start += 1
+        if start >= end:
+            continue
+        tokens = estimate_tokens(text[start:end])
+        if tokens <= max_tokens:
+            yield start, end, tokens
+            continue
+        pieces = -(-tokens // max_tokens)
+        yield from _token_pieces(text, start, end, -(-tokens // pieces))
+
+
+def _token_pieces(text: str, start: int, end: int, budget: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Cut text[start:end] into consecutive pieces of at most budget estimated tokens.
+
+    Pieces are cut by the estimate_tokens count rather than by characters,
+    so mixed ASCII/Japanese text never yields a piece over the budget.
+    """
+    piece_start = start
+    cjk = other = 0
+    for position in range(start, end):
+        if is_cjk(text[position]):
+            cjk += 1
         else:
-            start = 0
-            while start < len(text):
-                end = min(start + size, len(text))
-                chunk_text = text[start:end]
-                
-                chunk_id = f"c-{chunk_counter:05d}"
-                chunk = Chunk(
-                    chunk_id=chunk_id,
-                    text=chunk_text,
-                    page=page_num,
-                    checksum=calculate_checksum(chunk_text),
-                    preview_text=chunk_text[:200]
-                )
-                chunks.append(chunk)
-                chunk_counter += 1
-                
-                start += size - overlap
-                if start >= len(text):
-                    break
-    
-    return chunks
\ No newline at end of file
+            other += 1
+        if position > piece_start and cjk + (other + 3) // 4 > budget:
+            # This character starts the next piece
+            if is_cjk(text[position]):
+                cjk -= 1
+            else:
+                other -= 1
+            yield piece_start, position, max(1, cjk + (other + 3) // 4)
+            piece_start = position
+            cjk, other = (1, 0) if is_cjk(text[position]) else (0, 1)
+    yield piece_start, end, max(1, cjk + (other + 3) // 4)
+
+
+def iter_sentence_chunks(
+    pages: Iterable[PageText],
+    max_tokens: Optional[int] = None,
+    overlap_sentences: Optional[int] = None
+) -> Iterator[ChunkRef]:
+    """
+    Lazily pack sentences into chunks of up to max_tokens, across page boundaries.
+
+    Pages are joined with a newline and split on Japanese and English
+    sentence boundaries; consecutive sentences are packed greedily until the
+    next one would exceed the token budget, so short pages share a chunk and
+    long pages are never cut mid-sentence. Each chunk starts with the last
+    overlap_sentences sentences of the previous one. Only the pages that
+    still have unchunked sentences are buffered. Chunk ids are numbered per
+    starting page, so an edit only renumbers chunks from the edited page
+    on, until the packing realigns at a page start.
+
+    Args:
+        pages: Iterable of PageText objects
+        max_tokens: Token budget per chunk (defaults to Config.CHUNK_MAX_TOKENS)
+        overlap_sentences: Sentences repeated from the previous chunk
+            (defaults to Config.CHUNK_OVERLAP_SENTENCES)
+
+    Yields:
+        ChunkRef objects in document order, with page and page_end set to
+        the first and last page the chunk covers
+    """
+    max_tokens = max_tokens or Config.CHUNK_MAX_TOKENS
+    if overlap_sentences is None:
+        overlap_sentences = Config.CHUNK_OVERLAP_SENTENCES
+
+    buffer = ""
+    page_starts: List[int] = []   # offset of each buffered page in buffer
+    page_nums: List[int] = []
+    sentences: List[Tuple[int, int, int]] = []   # (start, end, tokens) in buffer
+    carried = 0   # leading sentences already emitted, repeated as overlap
+    page_chunks: Dict[int, int] = {}   # chunks emitted per starting page
+
+    def next_index(page: int) -> int:
+        position = page_chunks.get(page, 0)
+        page_chunks[page] = position + 1
+        return chunk_index_for(page, position)
+
+    def page_at(offset: int) -> int:
+        return page_nums[bisect_right(page_starts, offset) - 1]
+
+    def fitting() -> int:
+        # Number of leading sentences that fit the budget (at least one)
+        total = 0
+        for count, (_, _, tokens) in enumerate(sentences, start=1):
+            total += tokens
+            if total > max_tokens:
+                return max(1, count - 1)
+        return len(sentences)
+
+    for page_text in pages:
+        offset = len(buffer) + 1 if page_starts else 0
+        buffer = f"{buffer}\n{page_text.text}" if page_starts else page_text.text
+        page_starts.append(offset)
+        page_nums.append(page_text.page_num)
+        sentences.extend(
+            (offset + start, offset + end, tokens)
+            for start, end, tokens in sentence_spans(page_text.text, max_tokens)
+        )
+
+        # Emit only chunks that are full; the rest waits for the next page
+        while len(sentences) > carried and sum(t for _, _, t in sentences) > max_tokens:
+            count = fitting()
+            if count <= carried:
+                # The overlap alone fills the budget; drop it to make progress
+                del sentences[:carried]
+                carried = 0
+                continue
+
+            start, end = sentences[0][0], sentences[count - 1][1]
+            yield ChunkRef(next_index(page_at(start)), page_at(start), start, end, buffer,
+                           page_end=page_at(end - 1))
+
+            carried = min(overlap_sentences, count - 1)
+            del sentences[:count - carried]
+            if not sentences:
+                # Everything buffered has been emitted
+                buffer = ""
+                page_starts.clear()
+                page_nums.clear()
+                break
+
+            # Forget the pages before the first pending sentence
+            first_page = bisect_right(page_starts, sentences[0][0]) - 1
+            shift = page_starts[first_page]
+            if shift:
+                buffer = buffer[shift:]
+                del page_starts[:first_page], page_nums[:first_page]
+                page_starts[:] = [page_start - shift for page_start in page_starts]
+                sentences[:] = [(s - shift, e - shift, t) for s, e, t in sentences]
+
+    if len(sentences) > carried:
+        start, end = sentences[0][0], sentences[-1][1]
+        yield ChunkRef(next_index(page_at(start)), page_at(start), start, end, buffer,
+                       page_end=page_at(end - 1))
+
+
+CHUNKERS: Dict[str, Callable[[Iterable[PageText]], Iterator[ChunkRef]]] = {
+    "fixed": iter_chunks,
+    "sentence": iter_sentence_chunks,
+}
+
+
+def get_chunker(name: Optional[str] = None) -> Callable[[Iterable[PageText]], Iterator[ChunkRef]]:
+    """
+    Look up a chunker by name.
+
+    Args:
+        name: Chunker name (defaults to Config.CHUNKER)
+
+    Returns:
+        Function turning an iterable of pages into a lazy stream of chunks
+
+    Raises:
+        ValueError: If the chunker is unknown
+    """
+    name = name or Config.CHUNKER
+    chunker = CHUNKERS.get(name)
+    if chunker is None:
+        raise ValueError(f"Unknown chunker '{name}' (choose from {', '.join(CHUNKERS)})")
+    return chunker
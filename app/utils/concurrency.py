@@ -0,0 +1,141 @@
+"""Offload blocking work from the event loop with per-stage concurrency limits.
+
+Network-bound calls (embedding, vector search, Gemini, GCS) run on a bounded
+thread pool. Each named stage is additionally capped by an asyncio semaphore
+so a burst of one kind of work cannot starve the others.
+
+The process pool (cpu_pool) is used by the streaming ingest pipeline's
+producer, which runs on the "pdf" stage and hands page ranges of large PDFs
+to it for parallel text extraction (app/utils/pdf.py). Boilerplate stripping
+and chunking stay on the producer thread: they are lazy, order-dependent
+and cheap next to parsing, and shipping every page to another process
+would cost more than it saves.
+"""
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+
+
+class StageExecutor:
+    """Thread/process pools plus per-stage semaphores for the async API."""
+
+    def __init__(
+        self,
+        io_workers: Optional[int] = None,
+        cpu_workers: Optional[int] = None,
+        stage_limits: Optional[Dict[str, int]] = None
+    ):
+        self.io_workers = io_workers if io_workers is not None else Config.IO_WORKERS
+        self.cpu_workers = cpu_workers if cpu_workers is not None else Config.CPU_WORKERS
+        self.stage_limits = dict(Config.stage_limits())
+        if stage_limits:
+            self.stage_limits.update(stage_limits)
+
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._cpu_pool: Optional[Executor] = None
+        self._semaphores: Dict[Any, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def io_pool(self) -> ThreadPoolExecutor:
+        if self._io_pool is None:
+            with self._lock:
+                if self._io_pool is None:
+                    self._io_pool = ThreadPoolExecutor(
+                        max_workers=self.io_workers,
+                        thread_name_prefix="rag-io"
+                    )
+        return self._io_pool
+
+    @property
+    def cpu_pool(self) -> Executor:
+        if self._cpu_pool is None:
+            with self._lock:
+                if self._cpu_pool is None:
+                    if self.cpu_workers > 0:
+                        # spawn: forking a process that holds gRPC channels is unsafe
+                        self._cpu_pool = ProcessPoolExecutor(
+                            max_workers=self.cpu_workers,
+                            mp_context=multiprocessing.get_context("spawn")
+                        )
+                    else:
+                        self._cpu_pool = self.io_pool
+        return self._cpu_pool
+
+    def _semaphore(self, stage: str) -> asyncio.Semaphore:
+        # Semaphores are bound to the running loop, so key them by loop as well
+        key = (id(asyncio.get_running_loop()), stage)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            limit = self.stage_limits.get(stage, self.io_workers)
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[key] = semaphore
+        return semaphore
+
+    async def run_io(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking network call on the thread pool.
+
+        Args:
+            stage: Stage name used for the concurrency limit
+            fn: Blocking callable
+            *args, **kwargs: Arguments for fn
+
+        Returns:
+            Return value of fn
+        """
+        loop = asyncio.get_running_loop()
+        async with self._semaphore(stage):
+            return await loop.run_in_executor(
+                self.io_pool, functools.partial(fn, *args, **kwargs)
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down both pools."""
+        with self._lock:
+            if self._cpu_pool is not None and self._cpu_pool is not self._io_pool:
+                self._cpu_pool.shutdown(wait=wait)
+            if self._io_pool is not None:
+                self._io_pool.shutdown(wait=wait)
+            self._cpu_pool = None
+            self._io_pool = None
+            self._semaphores.clear()
+
+
+_executor: Optional[StageExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> StageExecutor:
+    """
+    Return the process-wide stage executor, creating it on first use.
+
+    Returns:
+        Shared StageExecutor instance
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = StageExecutor()
+    return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shut down and drop the process-wide stage executor."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+async def run_io(stage: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking network call on the shared executor's thread pool."""
+    return await get_executor().run_io(stage, fn, *args, **kwargs)
+
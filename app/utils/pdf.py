@@ -1,9 +1,19 @@
+import io
+import mmap
 import os
-import tempfile
-from typing import List
-from google.cloud import storage
-from pypdf import PdfReader
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Deque, Iterator, List, Optional, Tuple
+from google.api_core.exceptions import NotFound
+from app.config import Config
 from app.schemas.dto import PageText
+from app.rag.clients import get_clients
+from app.utils.boilerplate import BoilerplateStripper
+from app.utils.concurrency import get_executor
+from app.utils.pdf_engines import PdfDocument, get_engine
 
 
 def extract_text_from_pdf(gcs_uri: str) -> List[PageText]:
@@ -11,7 +21,7 @@ def extract_text_from_pdf(gcs_uri: str) -> List[PageText]:
     Extract text from a PDF or text file stored in GCS.
 
     Args:
-        gcs_uri: GCS URI of the file (gs://bucket/path/to/file.pdf or .txt)
+        gcs_uri: GCS URI of the file (gs://bucket/path/to/file.pdf or .txt, or file://)
 
     Returns:
         List of PageText objects containing text from each page
@@ -20,60 +30,446 @@ def extract_text_from_pdf(gcs_uri: str) -> List[PageText]:
         ValueError: If the GCS URI is invalid
         Exception: If extraction fails
     """
-    if not gcs_uri.startswith("gs://"):
-        raise ValueError(f"Invalid GCS URI: {gcs_uri}")
+    pages = list(iter_pdf_pages(gcs_uri))
 
-    parts = gcs_uri[5:].split("/", 1)
+    if not pages:
+        raise ValueError(f"No text could be extracted from file: {gcs_uri}")
+
+    return pages
+
+
+class _DownloadBuffer:
+    """
+    Growable byte buffer reused for every download on the same thread.
+
+    Implements the small file-like surface that blob.download_to_file needs
+    (write/seek/tell/truncate) so objects stream straight into it.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.length = 0
+        self.position = 0
+        self.in_use = False
+
+    def reset(self) -> None:
+        self.length = 0
+        self.position = 0
+
+    def write(self, b) -> int:
+        n = len(b)
+        end = self.position + n
+        if end > len(self.data):
+            # Grow geometrically so repeated downloads settle on one allocation
+            self.data.extend(bytes(max(end - len(self.data), len(self.data))))
+        self.data[self.position:end] = b
+        self.position = end
+        self.length = max(self.length, end)
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.length
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        self.length = self.position if size is None else size
+        return self.length
+
+    def flush(self) -> None:
+        pass
+
+    def view(self) -> memoryview:
+        return memoryview(self.data)[:self.length]
+
+    def release(self) -> None:
+        self.in_use = False
+        self.reset()
+        if len(self.data) > Config.PDF_BUFFER_KEEP_BYTES:
+            self.data = bytearray()
+
+
+class _MemoryReader(io.RawIOBase):
+    """Read-only, seekable file object over a memoryview (no copy of the document)."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._position + size)
+        data = self._view[self._position:end].tobytes()
+        self._position = max(self._position, end)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+_thread_buffers = threading.local()
+
+
+def _acquire_buffer() -> _DownloadBuffer:
+    buffer = getattr(_thread_buffers, "buffer", None)
+    if buffer is None or buffer.in_use:
+        # A still-open document on this thread keeps its buffer; use a fresh one
+        buffer = _DownloadBuffer()
+        if getattr(_thread_buffers, "buffer", None) is None:
+            _thread_buffers.buffer = buffer
+    buffer.in_use = True
+    buffer.reset()
+    return buffer
+
+
+@contextmanager
+def open_document(uri: str) -> Iterator[memoryview]:
+    """
+    Load a document into memory without temporary files.
+
+    gs:// objects are streamed into a per-thread reusable buffer; file://
+    paths are memory-mapped. Either way the caller gets a memoryview over
+    the bytes, valid until the context exits.
+
+    Args:
+        uri: gs://bucket/path or file:///absolute/path
+
+    Yields:
+        Read-only view of the document bytes
+
+    Raises:
+        ValueError: If the URI is invalid or the object does not exist
+    """
+    if uri.startswith("file://"):
+        path = uri[len("file://"):]
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    yield memoryview(b"")
+                    return
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise ValueError(f"File not found: {uri}")
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            mapped.close()
+        return
+
+    if not uri.startswith("gs://"):
+        raise ValueError(f"Invalid GCS URI: {uri}")
+
+    parts = uri[5:].split("/", 1)
     if len(parts) != 2:
-        raise ValueError(f"Invalid GCS URI format: {gcs_uri}")
+        raise ValueError(f"Invalid GCS URI format: {uri}")
 
     bucket_name, blob_name = parts
+    blob = get_clients().bucket(bucket_name).blob(blob_name)
 
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-
-    if not blob.exists():
-        raise ValueError(f"File not found: {gcs_uri}")
-
-    pages = []
-    file_extension = blob_name.lower().split('.')[-1] if '.' in blob_name else ''
-
-    # Handle text files
-    if file_extension in ['txt', 'text', 'md']:
-        content = blob.download_as_text(encoding='utf-8')
-        # Split content into pages by double newline or fixed size
-        # For simplicity, treat entire content as one page for text files
-        if content:
-            pages.append(PageText(
-                page_num=1,
-                text=content.strip()
-            ))
-    # Handle PDF files
-    else:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_path = tmp_file.name
-
+    buffer = _acquire_buffer()
+    try:
         try:
-            blob.download_to_filename(tmp_path)
+            blob.download_to_file(buffer)
+        except NotFound:
+            # A missing object surfaces on the download itself; no exists() probe
+            raise ValueError(f"File not found: {uri}")
+        view = buffer.view()
+        try:
+            yield view
+        finally:
+            view.release()
+    finally:
+        buffer.release()
+
 
-            reader = PdfReader(tmp_path)
+def iter_pdf_pages(
+    gcs_uri: str,
+    stripper: Optional[BoilerplateStripper] = None
+) -> Iterator[PageText]:
+    """
+    Lazily extract text from a PDF or text file, page by page.
+
+    The document is held in memory once (see open_document) and handed to
+    the PDF parser without copying. Pages without text are skipped; callers
+    that need at least one page must check for an empty result themselves.
+    When Config.STRIP_BOILERPLATE is set, lines repeated on most pages of a
+    PDF (headers, footers, page numbers) are removed.
+
+    Args:
+        gcs_uri: URI of the file (gs://bucket/path/to/file.pdf or .txt, or file://)
+        stripper: Boilerplate stripper to use, so the caller can read how
+            much it removed (a new one is created when omitted)
+
+    Yields:
+        PageText objects in page order
+
+    Raises:
+        ValueError: If the URI is invalid or the file does not exist
+    """
+    path = gcs_uri.split("://", 1)[-1]
+    file_extension = path.lower().split('.')[-1] if '.' in path else ''
+
+    with open_document(gcs_uri) as view:
+        # Handle text files
+        if file_extension in ['txt', 'text', 'md']:
+            content = str(view, encoding='utf-8')
+            # For simplicity, treat entire content as one page for text files
+            if content:
+                yield PageText(
+                    page_num=1,
+                    text=content.strip()
+                )
+        # Handle PDF files
+        else:
+            pages = iter_pdf_view_pages(view, gcs_uri)
+            if Config.STRIP_BOILERPLATE:
+                pages = (stripper or BoilerplateStripper()).strip(pages)
+            yield from pages
+
+
+def iter_pdf_view_pages(
+    view: memoryview,
+    uri: str,
+    cpu_pool: Optional[Executor] = None,
+    pages_per_task: Optional[int] = None,
+    engine: Optional[str] = None
+) -> Iterator[PageText]:
+    """
+    Extract the pages of an in-memory PDF, in parallel when it is large enough.
+
+    Documents with at least Config.PDF_PARALLEL_MIN_PAGES pages are split into
+    page ranges that the process pool extracts concurrently; every worker
+    opens the same bytes (shared memory, or the mmap'd file for file://).
+    Pages are still yielded in order, and a page that fails in a worker is
+    re-extracted serially, so the output is identical to serial extraction.
 
-            for page_num, page in enumerate(reader.pages, start=1):
-                text = page.extract_text()
+    Args:
+        view: Document bytes
+        uri: Source URI (file:// sources are re-mapped by workers directly)
+        cpu_pool: Process pool to use (defaults to the shared stage executor's)
+        pages_per_task: Pages per worker task
+        engine: PDF engine name (defaults to Config.PDF_ENGINE)
+
+    Yields:
+        PageText objects in page order
+    """
+    pdf_engine = get_engine(engine)
+    stream = _MemoryReader(view[:])
+    document = None
+    try:
+        document = pdf_engine.open(stream)
+        page_count = document.page_count
+
+        if cpu_pool is None and page_count >= Config.PDF_PARALLEL_MIN_PAGES and Config.CPU_WORKERS > 0:
+            cpu_pool = get_executor().cpu_pool
+
+        if cpu_pool is None or page_count < 2:
+            for index in range(page_count):
+                text = document.page_text(index)
+                if text:
+                    yield PageText(
+                        page_num=index + 1,
+                        text=text.strip()
+                    )
+        else:
+            for page_num, text in _iter_parallel_page_texts(
+                view, uri, pdf_engine.name, document, cpu_pool,
+                pages_per_task or Config.PDF_PAGES_PER_TASK
+            ):
                 if text:
-                    pages.append(PageText(
+                    yield PageText(
                         page_num=page_num,
                         text=text.strip()
-                    ))
-        finally:
+                    )
+    finally:
+        # Drop parser references before the buffer is reused
+        if document is not None:
+            document.close()
+        stream.close()
+
+
+def _iter_parallel_page_texts(
+    view: memoryview,
+    uri: str,
+    engine_name: str,
+    document: PdfDocument,
+    cpu_pool: Executor,
+    pages_per_task: int
+) -> Iterator[Tuple[int, Optional[str]]]:
+    shm = None
+    if uri.startswith("file://"):
+        path = uri[len("file://"):]
+        # mtime is part of the key so a rewritten file is never served from a worker's cache
+        source = ("file", path, len(view), os.stat(path).st_mtime_ns, engine_name)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(view)))
+        shm.buf[:len(view)] = view
+        source = ("shm", shm.name, len(view), 0, engine_name)
+
+    page_count = document.page_count
+    ranges = iter([(start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task)])
+    max_in_flight = max(2, getattr(cpu_pool, "_max_workers", 2) * 2)
+    pending: Deque[Tuple[Tuple[int, int], Optional[Future]]] = deque()
+
+    def submit_next() -> None:
+        page_range = next(ranges, None)
+        if page_range is None:
+            return
+        try:
+            future = cpu_pool.submit(_extract_page_range, source, *page_range)
+        except Exception as e:  # e.g. BrokenProcessPool: extract this range serially
+            print(f"Warning: could not submit pages {page_range}: {e}")
+            future = None
+        pending.append((page_range, future))
+
+    try:
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while pending:
+            (start, end), future = pending.popleft()
             try:
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
-            except:
-                pass
+                results = future.result() if future is not None else None
+            except Exception as e:
+                print(f"Warning: PDF worker failed on pages {start + 1}-{end}: {e}")
+                results = None
+            if results is None:
+                results = [(index, None, "worker unavailable") for index in range(start, end)]
+            submit_next()
 
-    if not pages:
-        raise ValueError(f"No text could be extracted from file: {gcs_uri}")
+            for index, text, error in results:
+                if error is not None:
+                    # Retry in this process; a page that fails here too fails
+                    # the document, exactly as serial extraction would
+                    text = document.page_text(index)
+                yield index + 1, text
+    finally:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+# Per-worker-process cache of the document currently being extracted. A worker
+# that gets no task for _WORKER_DOCUMENT_IDLE seconds drops it, so the decoded
+# copy does not outlive the extraction it was opened for.
+_worker_document = None
+_worker_lock = threading.Lock()
+_worker_release_timer: Optional[threading.Timer] = None
+_WORKER_DOCUMENT_IDLE = 2.0
+
+
+def _open_worker_document(source: Tuple[str, str, int, int, str]) -> PdfDocument:
+    global _worker_document
+    if _worker_document is not None and _worker_document[0] == source:
+        return _worker_document[-1]
+    _close_worker_document()
+
+    kind, name, length, _, engine_name = source
+    if kind == "shm":
+        # Copy once per worker and detach, so the parent can unlink the segment
+        # and nothing stays exported from it when the worker exits
+        segment = shared_memory.SharedMemory(name=name)
+        try:
+            handle = None
+            view = memoryview(bytes(segment.buf[:length]))
+        finally:
+            segment.close()
+    else:
+        with open(name, "rb") as f:
+            handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(handle)[:length]
+    stream = _MemoryReader(view)
+    document = get_engine(engine_name).open(stream)
+    _worker_document = (source, handle, view, stream, document)
+    return document
 
-    return pages
\ No newline at end of file
+
+def _close_worker_document() -> None:
+    global _worker_document
+    if _worker_document is None:
+        return
+    _, handle, view, stream, document = _worker_document
+    _worker_document = None
+    document.close()
+    stream.close()
+    try:
+        view.release()
+        if handle is not None:
+            handle.close()
+    except BufferError:
+        pass
+
+
+def _release_idle_worker_document() -> None:
+    with _worker_lock:
+        # A task that started after this timer was scheduled has replaced it
+        if threading.current_thread() is _worker_release_timer:
+            _close_worker_document()
+
+
+def _schedule_worker_release() -> None:
+    global _worker_release_timer
+    _worker_release_timer = threading.Timer(_WORKER_DOCUMENT_IDLE, _release_idle_worker_document)
+    _worker_release_timer.daemon = True
+    _worker_release_timer.start()
+
+
+def _extract_page_range(
+    source: Tuple[str, str, int, int, str],
+    start: int,
+    end: int
+) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Process-pool task: extract pages [start, end) of a shared document.
+
+    Returns:
+        (page_index, text, error) per page; error is set when that page failed
+    """
+    global _worker_release_timer
+    with _worker_lock:
+        if _worker_release_timer is not None:
+            _worker_release_timer.cancel()
+            _worker_release_timer = None
+        document = _open_worker_document(source)
+        results = []
+        for index in range(start, end):
+            try:
+                results.append((index, document.page_text(index), None))
+            except Exception as e:
+                results.append((index, None, repr(e)))
+        _schedule_worker_release()
+    return results
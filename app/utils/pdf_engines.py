@@ -0,0 +1,205 @@
+"""Interchangeable PDF text extraction engines.
+
+Every engine opens a document from an in-memory view and extracts text one
+page at a time, so the streaming and page-parallel paths in app.utils.pdf
+work the same whichever engine is configured (Config.PDF_ENGINE).
+
+Engines other than pypdf are optional dependencies and are imported only
+when selected. Switching engines changes the extracted text, and with it
+every chunk checksum, so the next ingest of each document re-embeds it.
+"""
+import io
+import threading
+from typing import Dict, List, Optional, Type
+
+from app.config import Config
+
+
+class PdfDocument:
+    """An open PDF whose pages can be extracted in any order."""
+
+    page_count: int = 0
+
+    def page_text(self, index: int) -> str:
+        """
+        Extract the text of one page.
+
+        Args:
+            index: Zero-based page index
+
+        Returns:
+            Page text ("" when the page has none)
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release parser state and any reference to the document bytes."""
+
+
+class PdfEngine:
+    """Factory for PdfDocument objects."""
+
+    name: str = ""
+
+    def open(self, stream: io.RawIOBase) -> PdfDocument:
+        """
+        Open a document.
+
+        Args:
+            stream: Seekable binary stream over the document bytes
+
+        Returns:
+            Open document; the caller must close it
+        """
+        raise NotImplementedError
+
+
+class _PypdfDocument(PdfDocument):
+    def __init__(self, stream: io.RawIOBase):
+        from pypdf import PdfReader
+
+        self._reader = PdfReader(stream)
+        self.page_count = len(self._reader.pages)
+
+    def page_text(self, index: int) -> str:
+        return self._reader.pages[index].extract_text() or ""
+
+    def close(self) -> None:
+        self._reader = None
+
+
+class PypdfEngine(PdfEngine):
+    """pypdf: pure Python, no extra dependency (the default)."""
+
+    name = "pypdf"
+
+    def open(self, stream: io.RawIOBase) -> PdfDocument:
+        return _PypdfDocument(stream)
+
+
+class _PdfminerDocument(PdfDocument):
+    def __init__(self, stream: io.RawIOBase):
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+
+        self._pages = list(PDFPage.create_pages(PDFDocument(PDFParser(stream))))
+        self._resources = PDFResourceManager(caching=True)
+        self._laparams = LAParams()
+        self.page_count = len(self._pages)
+
+    def page_text(self, index: int) -> str:
+        from pdfminer.converter import TextConverter
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        output = io.StringIO()
+        device = TextConverter(self._resources, output, laparams=self._laparams)
+        try:
+            PDFPageInterpreter(self._resources, device).process_page(self._pages[index])
+        finally:
+            device.close()
+        # pdfminer ends every page with a form feed
+        return output.getvalue().rstrip("\x0c")
+
+    def close(self) -> None:
+        self._pages = []
+        self._resources = None
+
+
+class PdfminerEngine(PdfEngine):
+    """pdfminer.six: pure Python, layout-aware, handles CID/CMap fonts well."""
+
+    name = "pdfminer"
+
+    def open(self, stream: io.RawIOBase) -> PdfDocument:
+        return _PdfminerDocument(stream)
+
+
+# PDFium is not thread-safe: all calls into it from one process are serialized
+_pdfium_lock = threading.RLock()
+
+
+class _PdfiumDocument(PdfDocument):
+    def __init__(self, stream: io.RawIOBase):
+        import pypdfium2
+
+        with _pdfium_lock:
+            self._document = pypdfium2.PdfDocument(stream)
+            self.page_count = len(self._document)
+
+    def page_text(self, index: int) -> str:
+        with _pdfium_lock:
+            page = self._document[index]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    text = text_page.get_text_range()
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+        return text.replace("\r\n", "\n")
+
+    def close(self) -> None:
+        with _pdfium_lock:
+            if self._document is not None:
+                self._document.close()
+                self._document = None
+
+
+class PdfiumEngine(PdfEngine):
+    """pypdfium2: bindings to the native PDFium library, usually the fastest."""
+
+    name = "pypdfium2"
+
+    def open(self, stream: io.RawIOBase) -> PdfDocument:
+        return _PdfiumDocument(stream)
+
+
+ENGINES: Dict[str, Type[PdfEngine]] = {
+    PypdfEngine.name: PypdfEngine,
+    PdfminerEngine.name: PdfminerEngine,
+    PdfiumEngine.name: PdfiumEngine,
+}
+
+_ENGINE_MODULES = {
+    "pypdf": "pypdf",
+    "pdfminer": "pdfminer",
+    "pypdfium2": "pypdfium2",
+}
+
+
+def available_engines() -> List[str]:
+    """
+    List the engines whose dependency is installed.
+
+    Returns:
+        Engine names, in registration order
+    """
+    import importlib.util
+
+    return [name for name in ENGINES if importlib.util.find_spec(_ENGINE_MODULES[name]) is not None]
+
+
+def get_engine(name: Optional[str] = None) -> PdfEngine:
+    """
+    Look up a PDF engine by name.
+
+    Args:
+        name: Engine name (defaults to Config.PDF_ENGINE)
+
+    Returns:
+        Engine instance
+
+    Raises:
+        ValueError: If the engine is unknown or its dependency is not installed
+    """
+    name = name or Config.PDF_ENGINE
+    engine_class = ENGINES.get(name)
+    if engine_class is None:
+        raise ValueError(f"Unknown PDF engine '{name}' (choose from {', '.join(ENGINES)})")
+    if name not in available_engines():
+        raise ValueError(f"PDF engine '{name}' requires the '{_ENGINE_MODULES[name]}' package")
+    return engine_class()
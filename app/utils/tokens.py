@@ -0,0 +1,32 @@
+"""Character classes and token estimates shared by chunking and embedding."""
+
+
+def is_cjk(ch: str) -> bool:
+    """Return True for Japanese kana, CJK ideographs, full-width forms and CJK punctuation."""
+    code = ord(ch)
+    return (
+        0x3040 <= code <= 0x30FF      # Hiragana / Katakana
+        or 0x3400 <= code <= 0x4DBF   # CJK Extension A
+        or 0x4E00 <= code <= 0x9FFF   # CJK Unified Ideographs
+        or 0xF900 <= code <= 0xFAFF   # CJK Compatibility Ideographs
+        or 0xFF00 <= code <= 0xFFEF   # Full-width forms
+        or 0x3000 <= code <= 0x303F   # CJK punctuation
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text without calling a tokenizer.
+
+    Japanese characters are counted as one token each and everything else as
+    one token per four characters, which errs on the high side for both.
+
+    Args:
+        text: Input text
+
+    Returns:
+        Estimated number of tokens (at least 1)
+    """
+    cjk = sum(1 for ch in text if is_cjk(ch))
+    other = len(text) - cjk
+    return max(1, cjk + (other + 3) // 4)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+検索候補プールのベンチマーク（固定30件 vs 適応的プール）
+
+Builds one tenant in the local vector index (VECTOR_BACKEND=local) from
+synthetic 768-d chunks grouped in topics of very different sizes, and runs
+retriever.search (embedding stubbed, hydration skipped) for
+
+  narrow   questions about a topic with a handful of chunks
+  broad    questions about a topic with ~150 chunks
+
+with the fixed pool (top_k_vector=30) and the adaptive pool. Reports per
+question the index calls, chunks hydrated, relevant chunks (of the asked
+topic) in the hydrated pool and hits returned after MMR, plus the
+fetched/hydrated/returned counters exposed on GET /stats.
+
+Usage:
+    python scripts/bench_candidate_pool.py
+    python scripts/bench_candidate_pool.py --queries 100 --top-k 15 --pool-max 120
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import Config
+from app.rag import retriever, vector_store
+from app.rag.indexer import datapoint_id_for
+from app.rag.vector_store import LocalVectorIndex, normalize
+from app.utils.chunks import chunk_id_for
+
+
+def build_tenant(rng, dims, narrow_topics, broad_topics):
+    sizes = [int(rng.integers(2, 6)) for _ in range(narrow_topics)] + [150] * broad_topics \
+        + [int(rng.integers(10, 60)) for _ in range(60)]
+    centers = normalize(rng.standard_normal((len(sizes), dims)))
+    topic_of = np.repeat(np.arange(len(sizes)), sizes)
+    # Noise of norm ~1 around the topic center: chunk/query cosine ~0.5-0.7
+    vectors = normalize(centers[topic_of] + rng.standard_normal((len(topic_of), dims)) / np.sqrt(dims))
+    return centers, topic_of, vectors.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fixed vs adaptive candidate pools")
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=60, help="Questions per kind")
+    parser.add_argument("--top-k", type=int, default=15, help="top_k_final (hits after MMR)")
+    parser.add_argument("--pool-max", type=int, default=Config.RETRIEVAL_POOL_MAX)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    narrow_topics, broad_topics = 20, 10
+    centers, topic_of, vectors = build_tenant(rng, args.dims, narrow_topics, broad_topics)
+    ids = [datapoint_id_for("t_001", f"doc-{topic:03d}", chunk_id_for(i)) for i, topic in enumerate(topic_of)]
+
+    Config.VECTOR_BACKEND = "local"
+    Config.INLINE_PAYLOADS = False
+    vector_store._index = LocalVectorIndex(tempfile.mkdtemp())
+    vector_store._index.upsert("t_001", ids, vectors)
+    retriever.fetch_tenant_chunks = lambda *args, **kwargs: {}
+    retriever.get_chunk_backend = lambda clients=None: None
+    # The "query" passed to search is already its embedding
+    retriever.embed_query = lambda query, clients=None: query
+    clients = SimpleNamespace()
+
+    def ask(topic):
+        query = normalize(centers[topic] + 0.7 * rng.standard_normal(args.dims) / np.sqrt(args.dims))
+        return topic, query.tolist()
+
+    kinds = {
+        "narrow": [ask(int(rng.integers(0, narrow_topics))) for _ in range(args.queries)],
+        "broad": [ask(narrow_topics + int(rng.integers(0, broad_topics))) for _ in range(args.queries)],
+    }
+    print(f"{len(ids)} chunks, top_k_final={args.top_k}, adaptive pool {args.top_k}..{args.pool_max}")
+    print(f"{'kind':<7} {'pool':<9} {'calls/q':>8} {'hydrated/q':>11} {'relevant/q':>11} {'returned/q':>11}")
+    for kind, questions in kinds.items():
+        for mode in ("fixed", "adaptive"):
+            Config.RETRIEVAL_ADAPTIVE = mode == "adaptive"
+            Config.RETRIEVAL_POOL_MAX = args.pool_max
+            retriever._retrieval_stats = retriever.RetrievalStats()
+            relevant = []
+            for topic, query in questions:
+                hydrated = []
+                search = retriever.vector_search
+
+                def recording_search(**kwargs):
+                    results = search(**kwargs)
+                    hydrated.extend(results)
+                    return results
+
+                retriever.vector_search = recording_search
+                with contextlib.redirect_stdout(io.StringIO()):
+                    asyncio.run(retriever.search(
+                        "t_001", query, "", top_k_vector=None if mode == "adaptive" else 30,
+                        top_k_final=args.top_k, clients=clients
+                    ))
+                retriever.vector_search = search
+                relevant.append(sum(metadata["doc_id"] == f"doc-{topic:03d}" for _, _, metadata in hydrated))
+            stats = retriever.get_retrieval_stats().stats()
+            print(f"{kind:<7} {mode:<9} {stats['index_calls'] / stats['searches']:>8.1f} "
+                  f"{stats['hydrated_per_search']:>11.1f} {statistics.mean(relevant):>11.1f} "
+                  f"{stats['returned_per_search']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+/chat スループットベンチマーク（単一 uvicorn ワーカー）
+
+Runs the API in-process on one uvicorn worker with the Vertex AI calls
+replaced by latency-injecting fakes (blocking time.sleep, like the real
+SDK calls), then measures requests/sec at increasing client concurrency.
+
+Usage:
+    python scripts/bench_chat_concurrency.py
+    python scripts/bench_chat_concurrency.py --inline   # previous behaviour: blocking calls on the event loop
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import requests
+import uvicorn
+
+import app.api.main as api_main
+import app.rag.generator as generator
+import app.rag.retriever as retriever
+from app.schemas.dto import Citation
+
+
+def install_fakes(embed_ms: float, search_ms: float, generate_ms: float, inline: bool) -> None:
+    """Replace network calls with sleeps of the given latency."""
+
+    def fake_embed_query(query, model_name="text-embedding-005", clients=None):
+        time.sleep(embed_ms / 1000)
+        return [0.0] * 768
+
+    def fake_vector_search(tenant_id, query_embedding, index_endpoint_id, top_k=30, clients=None):
+        time.sleep(search_ms / 1000)
+        return [
+            (
+                f"{tenant_id}_doc-1_c-{i:05d}",
+                0.1 * i,
+                {
+                    "tenant_id": tenant_id,
+                    "doc_id": "doc-1",
+                    "chunk_id": f"c-{i:05d}",
+                    "page": 1,
+                    "path": "gs://bench/doc-1.pdf",
+                    "checksum": "sha256:bench",
+                    "preview_text": f"chunk {i}",
+                    "full_text": f"chunk {i}",
+                },
+            )
+            for i in range(5)
+        ]
+
+    def fake_generate_answer(query, hits, **kwargs):
+        time.sleep(generate_ms / 1000)
+        hit = hits[0]
+        return "answer", [Citation(
+            doc_id=hit.doc_id, page=hit.page, path=hit.path,
+            chunk_id=hit.chunk_id, checksum=hit.checksum
+        )]
+
+    retriever.embed_query = fake_embed_query
+    retriever.vector_search = fake_vector_search
+    generator.generate_answer = fake_generate_answer
+    api_main.init_clients = lambda: None
+    api_main.close_clients = lambda: None
+
+    if inline:
+        async def run_inline(stage, fn, *args, **kwargs):
+            return fn(*args, **kwargs)
+
+        retriever.run_io = run_inline
+        generator.run_io = run_inline
+
+
+def start_server(port: int) -> uvicorn.Server:
+    config = uvicorn.Config(api_main.app, host="127.0.0.1", port=port, workers=1, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def run_level(url: str, concurrency: int, requests_per_client: int) -> dict:
+    payload = {"tenant_id": "t_bench", "query": "チェックイン時間は？", "top_k": 3}
+    local = threading.local()
+
+    def one_request(_):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        response = session.post(f"{url}/chat", json=payload, timeout=120)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    total = concurrency * requests_per_client
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one_request, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /chat RPS versus client concurrency")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--embed-ms", type=float, default=50)
+    parser.add_argument("--search-ms", type=float, default=80)
+    parser.add_argument("--generate-ms", type=float, default=300)
+    parser.add_argument("--inline", action="store_true",
+                        help="Call the blocking fakes directly on the event loop")
+    args = parser.parse_args()
+
+    install_fakes(args.embed_ms, args.search_ms, args.generate_ms, args.inline)
+    server = start_server(args.port)
+    url = f"http://127.0.0.1:{args.port}"
+
+    out = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # silence the API's debug prints
+
+    mode = "inline (blocking)" if args.inline else "offloaded"
+    print(f"Mode: {mode}, single uvicorn worker", file=out)
+    print(f"{'conc':>5} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'max ms':>9}", file=out)
+    try:
+        for level in [int(x) for x in args.levels.split(",")]:
+            result = run_level(url, level, args.requests_per_client)
+            print(f"{result['concurrency']:>5} {result['requests']:>6} {result['rps']:>8.1f} "
+                  f"{result['p50_ms']:>9.0f} {result['max_ms']:>9.0f}", file=out)
+    finally:
+        server.should_exit = True
+        sys.stdout = out
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+チャンクストアの取得コストベンチマーク（JSON全体ダウンロード vs レンジ読み込み）
+
+Stores a synthetic document both as the legacy per-document JSON object and
+in a binary chunk segment, then fetches a few hit chunks the way /chat does,
+through a local backend that simulates object-storage round trips (fixed
+latency per request plus transfer time at a given bandwidth). Reports
+requests, bytes transferred and wall time per query for each format.
+
+A second run ingests --docs small documents into per-tenant segments and
+fetches one hit from every document, before and after compaction merges
+the segments. A third run shows that cold fetches of hits spread over
+more and more uncompacted segments take about the same time, because the
+segments are read in parallel. The last run repeats the same questions
+with the in-process chunk record cache on.
+
+The record and manifest caches are off for every run except the last.
+
+Usage:
+    python scripts/bench_chunk_store.py
+    python scripts/bench_chunk_store.py --chunks 500 --hits 3 --latency-ms 30 --mbps 200
+    python scripts/bench_chunk_store.py --docs 30
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import Config
+from app.rag import chunk_store
+from app.rag.chunk_cache import get_chunk_cache
+from app.rag.chunk_store import (
+    ChunkStoreWriter,
+    LocalChunkBackend,
+    compact_tenant,
+    fetch_chunks,
+    fetch_tenant_chunks,
+    legacy_object_name,
+    manifest_name,
+)
+from app.schemas.dto import PageText
+from app.utils.chunks import iter_chunks
+
+SENTENCES = [
+    "チェックインは15時から22時までです。",
+    "駐車場は建物の裏手に2台分あります。",
+    "ゴミは燃えるゴミと資源ゴミに分別してください。",
+    "近隣の方への配慮のため、22時以降はお静かにお願いします。",
+    "Wi-Fiのパスワードはリビングの案内カードに記載しています。",
+    "The front door locks automatically when closed.",
+]
+
+
+class SimulatedRemoteBackend(LocalChunkBackend):
+    """Local backend that sleeps like a remote object store and counts transfer."""
+
+    def __init__(self, directory: str, latency_ms: float, mbps: float):
+        super().__init__(directory)
+        self.latency = latency_ms / 1000
+        self.bytes_per_sec = mbps * 1e6 / 8
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _account(self, data):
+        if data is not None:
+            with self._lock:
+                self.requests += 1
+                self.bytes += len(data)
+            time.sleep(self.latency + len(data) / self.bytes_per_sec)
+        return data
+
+    def read_tail(self, name, size):
+        return self._account(super().read_tail(name, size))
+
+    def read_range(self, name, start, end):
+        return self._account(super().read_range(name, start, end))
+
+    def read_all(self, name):
+        return self._account(super().read_all(name))
+
+
+def bench_segments(args, pages):
+    """Fetch one hit from each of many documents, before and after compaction."""
+    directory = tempfile.mkdtemp()
+    backend = LocalChunkBackend(directory)
+    per_doc = max(1, len(pages) // args.docs)
+    hits = {}
+    for number in range(args.docs):
+        doc_id = f"doc{number}"
+        writer = ChunkStoreWriter("t_001", doc_id, f"gs://bucket/{doc_id}.pdf", backend=backend)
+        for chunk in iter_chunks(pages[number * per_doc:(number + 1) * per_doc]):
+            writer.write(chunk)
+        writer.close()
+        hits[doc_id] = [f"t_001_{doc_id}_c-00000"]
+
+    print(f"\n{args.docs} documents, 1 hit each (segment locators cached after the first query)")
+    print(f"{'segments':<8} {'requests/q':>10} {'KiB/q':>9} {'ms/q':>8}")
+    for label in ("before", "after"):
+        if label == "after":
+            compact_tenant("t_001", backend=backend, min_segments=2)
+        remote = SimulatedRemoteBackend(directory, args.latency_ms, args.mbps)
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            fetch_tenant_chunks("t_001", hits, backend=remote)
+        seconds = time.perf_counter() - start
+        print(f"{label:<8} {remote.requests / args.queries:>10.1f} {remote.bytes / args.queries / 1024:>9.1f} "
+              f"{seconds / args.queries * 1000:>8.1f}")
+
+
+def bench_hydration(args, pages):
+    """Cold fetch time as the number of distinct hit documents grows."""
+    print(f"\n{'docs':<8} {'requests':>10} {'ms':>8}  (cold segment cache, uncompacted)")
+    for docs in (1, 4, 16, 32):
+        directory = tempfile.mkdtemp()
+        backend = LocalChunkBackend(directory)
+        hits = {}
+        for number in range(docs):
+            doc_id = f"doc{number}"
+            writer = ChunkStoreWriter("t_001", doc_id, f"gs://bucket/{doc_id}.pdf", backend=backend)
+            for chunk in iter_chunks(pages[number:number + 1]):
+                writer.write(chunk)
+            writer.close()
+            hits[doc_id] = [f"t_001_{doc_id}_c-00000"]
+        chunk_store._segment_cache.clear()
+        remote = SimulatedRemoteBackend(directory, args.latency_ms, args.mbps)
+        start = time.perf_counter()
+        records = fetch_tenant_chunks("t_001", hits, backend=remote)
+        seconds = time.perf_counter() - start
+        assert len(records) == docs
+        print(f"{docs:<8} {remote.requests:>10} {seconds * 1000:>8.1f}")
+
+
+def bench_cache(args, pages):
+    """Repeated questions against one tenant with the chunk record cache on."""
+    Config.CHUNK_CACHE_ENABLED = True
+    directory = tempfile.mkdtemp()
+    backend = LocalChunkBackend(directory)
+    hits = {}
+    for number in range(args.docs):
+        doc_id = f"doc{number}"
+        writer = ChunkStoreWriter("t_001", doc_id, f"gs://bucket/{doc_id}.pdf", backend=backend)
+        for chunk in iter_chunks(pages[number:number + 2]):
+            writer.write(chunk)
+        writer.close()
+        hits[doc_id] = [f"t_001_{doc_id}_c-00000", f"t_001_{doc_id}_c-00001"]
+    chunk_store._segment_cache.clear()
+    chunk_store._manifest_cache.clear()
+
+    print(f"\n{'query':<8} {'requests':>10} {'ms':>8}  (record cache, {args.docs} documents)")
+    remote = SimulatedRemoteBackend(directory, args.latency_ms, args.mbps)
+    for query in range(3):
+        requests = remote.requests
+        start = time.perf_counter()
+        fetch_tenant_chunks("t_001", hits, backend=remote)
+        seconds = time.perf_counter() - start
+        print(f"{query + 1:<8} {remote.requests - requests:>10} {seconds * 1000:>8.1f}")
+    print(f"cache: {get_chunk_cache().stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs ranged binary chunk fetches")
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--hits", type=int, default=2, help="Hit chunks per query from the document")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--docs", type=int, default=15, help="Documents hit by one query in the segment run")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--mbps", type=float, default=400.0)
+    args = parser.parse_args()
+
+    random.seed(0)
+    Config.CHUNK_CACHE_ENABLED = False
+    manifest_ttl, Config.CHUNK_MANIFEST_TTL = Config.CHUNK_MANIFEST_TTL, 0.0
+    pages = [
+        PageText(page_num=i + 1, text="".join(random.choice(SENTENCES) for _ in range(60)))
+        for i in range(args.chunks)
+    ]
+    chunks = list(iter_chunks(pages))
+    directory = tempfile.mkdtemp()
+    backend = LocalChunkBackend(directory)
+
+    writer = ChunkStoreWriter("t_001", "manual", "gs://bucket/manual.pdf", backend=backend)
+    legacy = {}
+    for chunk in chunks:
+        writer.write(chunk)
+        legacy[f"t_001_manual_{chunk.chunk_id}"] = {
+            "text": chunk.text, "page": chunk.page, "checksum": chunk.checksum, "path": writer.gcs_uri
+        }
+    writer.close()
+    legacy_file = backend.create(legacy_object_name("t_001", "manual"))
+    legacy_file.write(json.dumps(legacy).encode("utf-8"))
+    legacy_file.close()
+    # Hide the segment manifest from the JSON run so fetch_chunks takes the legacy path
+    manifest_path = os.path.join(directory, manifest_name("t_001"))
+
+    ids = list(legacy)
+    queries = [random.sample(ids, args.hits) for _ in range(args.queries)]
+
+    print(f"{len(chunks)} chunks, {args.hits} hits/query, {args.latency_ms:.0f} ms/request, {args.mbps:.0f} Mbit/s")
+    print(f"{'format':<8} {'requests/q':>10} {'KiB/q':>9} {'ms/q':>8}")
+    results = {}
+    for label in ("segment", "json"):
+        if label == "json":
+            os.rename(manifest_path, manifest_path + ".off")
+        remote = SimulatedRemoteBackend(directory, args.latency_ms, args.mbps)
+        start = time.perf_counter()
+        for hit_ids in queries:
+            results[label] = fetch_chunks("t_001", "manual", hit_ids, backend=remote)
+        seconds = time.perf_counter() - start
+        print(f"{label:<8} {remote.requests / args.queries:>10.1f} {remote.bytes / args.queries / 1024:>9.1f} "
+              f"{seconds / args.queries * 1000:>8.1f}")
+    os.rename(manifest_path + ".off", manifest_path)
+    print(f"identical: {results['segment'] == {i: legacy[i] | {'page_end': results['segment'][i]['page_end']} for i in results['segment']}}")
+
+    bench_segments(args, pages)
+    bench_hydration(args, pages)
+    Config.CHUNK_MANIFEST_TTL = manifest_ttl
+    bench_cache(args, pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+チャンク分割方式の比較ベンチマーク（チャンク数・埋め込みトークン・検索再現率）
+
+Chunks the sample PDFs with the fixed per-page chunker and the
+sentence-aware cross-page chunker (see CHUNKER in app/config.py) and
+reports, per chunker: chunk count, estimated embedded tokens, the share of
+source sentences that survive intact in at least one chunk, and recall@k
+of a lexical retrieval probe.
+
+The probe needs no embedding API: each source sentence of 20+ characters
+is turned into a query (its middle 60%), chunks are ranked by character
+bigram TF-IDF cosine, and a hit is a top-k chunk containing the whole
+sentence. It measures whether chunk boundaries keep retrievable passages
+together, not embedding quality.
+
+Usage:
+    python scripts/bench_chunkers.py
+    python scripts/bench_chunkers.py --budgets 400,800,1400 --overlap 1 --k 3
+    python scripts/bench_chunkers.py path/to/a.pdf path/to/b.pdf
+"""
+import argparse
+import glob
+import math
+import os
+import sys
+import warnings
+from collections import Counter
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.schemas.dto import PageText
+from app.utils.chunks import iter_chunks, iter_sentence_chunks, sentence_spans
+from app.utils.pdf import iter_pdf_pages
+from app.utils.tokens import estimate_tokens
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def bigrams(text: str) -> Counter:
+    text = "".join(text.split())
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def probes(documents: Dict[str, List[PageText]]) -> List[Tuple[str, str, str]]:
+    """(document, query, sentence) for every source sentence of 20+ characters."""
+    result = []
+    for name, pages in documents.items():
+        for page in pages:
+            for start, end, _ in sentence_spans(page.text, 1 << 30):
+                sentence = page.text[start:end].strip()
+                if len(sentence) >= 20:
+                    cut = len(sentence) // 5
+                    result.append((name, sentence[cut:len(sentence) - cut], sentence))
+    return result
+
+
+def recall_at_k(chunks: Dict[str, List[str]], queries: List[Tuple[str, str, str]], k: int) -> float:
+    """Share of probes whose sentence is whole in one of the top-k chunks of its document."""
+    hits = 0
+    for name, query, sentence in queries:
+        texts = chunks[name]
+        vectors = [bigrams(text) for text in texts]
+        df = Counter(gram for vector in vectors for gram in vector)
+        idf = {gram: math.log((1 + len(texts)) / (1 + n)) + 1 for gram, n in df.items()}
+        q = bigrams(query)
+
+        def score(vector: Counter) -> float:
+            dot = sum(q[g] * vector[g] * idf.get(g, 0) ** 2 for g in q)
+            norm = math.sqrt(sum((c * idf[g]) ** 2 for g, c in vector.items())) or 1.0
+            return dot / norm
+
+        ranked = sorted(range(len(texts)), key=lambda i: score(vectors[i]), reverse=True)
+        hits += any(sentence in texts[i] for i in ranked[:k])
+    return hits / len(queries) if queries else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed and sentence-aware chunking")
+    parser.add_argument("paths", nargs="*", help="PDF files (defaults to the sample PDFs)")
+    parser.add_argument("--budgets", default="700,1400", help="Token budgets for the sentence chunker")
+    parser.add_argument("--overlap", type=int, default=1, help="Overlap in sentences")
+    parser.add_argument("--k", type=int, default=1)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    paths = args.paths or sorted(glob.glob(os.path.join(ROOT, "*.pdf")))
+    documents = {}
+    for path in paths:
+        pages = list(iter_pdf_pages(f"file://{os.path.abspath(path)}"))
+        if any(page.text.strip() for page in pages):
+            documents[os.path.basename(path)] = pages
+    skipped = len(paths) - len(documents)
+    queries = probes(documents)
+    print(f"{len(documents)} documents with text ({skipped} without), "
+          f"{sum(len(p) for p in documents.values())} pages, {len(queries)} probe sentences")
+
+    chunkers = {"fixed 1400/160": lambda pages: iter_chunks(pages)}
+    for budget in (int(b) for b in args.budgets.split(",")):
+        chunkers[f"sentence {budget}/{args.overlap}"] = (
+            lambda pages, budget=budget: iter_sentence_chunks(pages, budget, args.overlap)
+        )
+
+    print(f"{'chunker':<18} {'chunks':>7} {'tokens':>8} {'intact':>7} {f'recall@{args.k}':>9}")
+    for label, chunker in chunkers.items():
+        chunks = {name: [chunk.text for chunk in chunker(pages)] for name, pages in documents.items()}
+        count = sum(len(texts) for texts in chunks.values())
+        tokens = sum(estimate_tokens(text) for texts in chunks.values() for text in texts)
+        intact = sum(any(sentence in text for text in chunks[name]) for name, _, sentence in queries)
+        recall = recall_at_k(chunks, queries, args.k)
+        print(f"{label:<18} {count:>7} {tokens:>8} {intact / max(1, len(queries)):>7.1%} {recall:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
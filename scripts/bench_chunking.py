@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+チャンク分割のスループット・メモリベンチマーク
+
+Chunks a synthetic document with the previous implementation (a sliced
+string and a validated pydantic Chunk per chunk) and with iter_chunks, the
+offset-based ChunkRef stream the ingest pipeline consumes (with and without
+the per-chunk checksum the pipeline computes), reporting chunks/sec and
+bytes allocated per chunk (tracemalloc peak while the chunks are held) and
+checking both produce the same chunks.
+
+Usage:
+    python scripts/bench_chunking.py
+    python scripts/bench_chunking.py --pages 2000 --page-chars 6000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.schemas.dto import Chunk, PageText
+from app.utils.chunks import iter_chunks
+from app.utils.hash import calculate_checksum
+
+
+def legacy_make_chunks(pages: List[PageText], size: int = 1400, overlap: int = 160) -> List[Chunk]:
+    """The per-chunk pydantic implementation make_chunks replaced."""
+    chunks = []
+    for page_text in pages:
+        text = page_text.text
+        starts = [0] if len(text) <= size else range(0, len(text), size - overlap)
+        for start in starts:
+            chunk_text = text[start:start + size]
+            chunks.append(Chunk(
+                chunk_id=f"c-{len(chunks):05d}",
+                text=chunk_text,
+                page=page_text.page_num,
+                checksum=calculate_checksum(chunk_text),
+                preview_text=chunk_text[:200]
+            ))
+    return chunks
+
+
+def build_pages(pages: int, page_chars: int) -> List[PageText]:
+    line = "民泊の宿泊者は到着時に本人確認書類を提示してください。チェックアウトは午前10時です。"
+    body = (line * (page_chars // len(line) + 1))[:page_chars]
+    return [PageText(page_num=i + 1, text=f"{i:06d}" + body) for i in range(pages)]
+
+
+def measure(name: str, run):
+    run()  # warm up
+    start = time.perf_counter()
+    chunks = run()
+    seconds = time.perf_counter() - start
+    del chunks
+
+    tracemalloc.start()
+    chunks = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(chunks)
+    print(f"{name:>22} {count:>8} {count / seconds:>12.0f} {peak / count:>12.0f}")
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pydantic vs offset-based chunking")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--page-chars", type=int, default=4000)
+    args = parser.parse_args()
+
+    pages = build_pages(args.pages, args.page_chars)
+    print(f"{args.pages} pages x {args.page_chars} chars")
+    print(f"{'implementation':>22} {'chunks':>8} {'chunks/s':>12} {'bytes/chunk':>12}")
+    legacy = measure("pydantic Chunk", lambda: legacy_make_chunks(pages))
+    measure("iter_chunks", lambda: list(iter_chunks(pages)))
+    streamed = measure("iter_chunks+checksum", lambda: _touch(list(iter_chunks(pages))))
+
+    # The legacy chunks have document-wide counter ids (see chunk_index_for) and no page_end
+    fields = {"chunk_id", "page_end"}
+    identical = [c.model_dump(exclude=fields) for c in legacy] == \
+        [c.to_model().model_dump(exclude=fields) for c in streamed]
+    print(f"identical: {identical}")
+
+
+def _touch(chunks):
+    for chunk in chunks:
+        chunk.checksum
+    return chunks
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+データポイントID方式のベンチマーク（文字列ID vs 整数ID）
+
+Allocates integer ids for a synthetic corpus (several tenants, documents
+with underscores in their ids) and compares, per neighbor list, resolving
+and tenant-filtering string datapoint ids (parse_datapoint_id on every
+neighbor) with the vectorized integer id table lookup. Also reports the
+id bytes a neighbor list costs on the wire in each scheme.
+
+Usage:
+    python scripts/bench_datapoint_ids.py
+    python scripts/bench_datapoint_ids.py --tenants 100 --docs 50 --chunks 200 --neighbors 30,100,1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.id_table import DatapointIdTable, neighbor_ids
+from app.rag.indexer import datapoint_id_for, parse_datapoint_id
+from app.utils.chunks import chunk_id_for
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark string vs integer datapoint ids")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--docs", type=int, default=20, help="Documents per tenant")
+    parser.add_argument("--chunks", type=int, default=100, help="Chunks per document")
+    parser.add_argument("--neighbors", default="30,100,1000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    table = DatapointIdTable(tempfile.mkdtemp())
+    string_ids, int_ids = [], []
+    start = time.perf_counter()
+    for t in range(args.tenants):
+        tenant_id = f"t_{t:03d}"
+        for d in range(args.docs):
+            doc_id = f"manual_{d:03d}_2025"
+            ids = table.allocate(tenant_id, doc_id, [(c, c + 1) for c in range(args.chunks)])
+            string_ids.extend(datapoint_id_for(tenant_id, doc_id, chunk_id_for(c)) for c in range(args.chunks))
+            int_ids.extend(str(i) for i in ids)
+    print(f"allocated {len(table)} ids in {time.perf_counter() - start:.2f} s")
+
+    # Reopening maps the table from disk
+    start = time.perf_counter()
+    table = DatapointIdTable(table.directory)
+    print(f"reopened table in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    tenant_id = "t_000"
+    print(f"\n{'neighbors':>9} {'string us':>10} {'int us':>8} {'string B':>9} {'int B':>7} {'hits':>5}")
+    for count in (int(n) for n in args.neighbors.split(",")):
+        sample = random.sample(range(len(string_ids)), count)
+        strings = [string_ids[i] for i in sample]
+        ints = [int_ids[i] for i in sample]
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            string_hits = [parsed for parsed in (parse_datapoint_id(s, tenant_id) for s in strings) if parsed]
+        string_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            positions, doc_ids, chunk_indices, _ = table.resolve(tenant_id, neighbor_ids(ints))
+            int_hits = list(zip(doc_ids, map(chunk_id_for, chunk_indices.tolist())))
+        int_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        assert sorted(string_hits) == sorted(int_hits)
+        print(f"{count:>9} {string_us:>10.1f} {int_us:>8.1f} {sum(map(len, strings)):>9} "
+              f"{sum(map(len, ints)):>7} {len(int_hits):>5}")
+
+
+if __name__ == "__main__":
+    main()
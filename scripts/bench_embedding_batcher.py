@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+埋め込みバッチャーのスループットベンチマーク
+
+Embeds a synthetic document through EmbeddingBatcher against a fake
+embedding model that injects latency (fixed per request plus per token)
+and optional random failures, and reports chunks/sec for each combination
+of batch size and parallelism.
+
+Usage:
+    python scripts/bench_embedding_batcher.py
+    python scripts/bench_embedding_batcher.py --chunks 2000 --failure-rate 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from typing import List
+
+from google.api_core.exceptions import ResourceExhausted
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.batcher import EmbeddingBatcher
+from app.utils.tokens import estimate_tokens
+
+
+class FakeEmbeddingModel:
+    """Sleeps like a remote embedding endpoint and returns deterministic vectors."""
+
+    def __init__(self, request_ms: float, per_token_us: float, failure_rate: float, dims: int = 768):
+        self.request_ms = request_ms
+        self.per_token_us = per_token_us
+        self.failure_rate = failure_rate
+        self.dims = dims
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def embed_batch(self, batch: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+        tokens = sum(estimate_tokens(text) for text in batch)
+        time.sleep(self.request_ms / 1000 + tokens * self.per_token_us / 1e6)
+        if random.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise ResourceExhausted("Resource exhausted (injected)")
+        return [[float(len(text))] * self.dims for text in batch]
+
+
+def make_chunks(count: int) -> List[str]:
+    sentence = "チェックインは15時からです。Check-in starts at 3 PM. "
+    rng = random.Random(0)
+    return [f"[{i}] " + sentence * rng.randint(5, 40) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EmbeddingBatcher throughput")
+    parser.add_argument("--chunks", type=int, default=600)
+    parser.add_argument("--batch-sizes", default="1,5,25,100,250")
+    parser.add_argument("--parallelism", default="1,2,4,8")
+    parser.add_argument("--max-batch-tokens", type=int, default=16000)
+    parser.add_argument("--request-ms", type=float, default=80)
+    parser.add_argument("--per-token-us", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    texts = make_chunks(args.chunks)
+    total_tokens = sum(estimate_tokens(t) for t in texts)
+    print(f"{len(texts)} chunks, ~{total_tokens} tokens, "
+          f"request={args.request_ms}ms + {args.per_token_us}us/token, failure rate={args.failure_rate}")
+    print(f"{'batch':>6} {'par':>4} {'requests':>9} {'retries':>8} {'seconds':>8} {'chunks/s':>9}")
+
+    for batch_size in [int(x) for x in args.batch_sizes.split(",")]:
+        for parallelism in [int(x) for x in args.parallelism.split(",")]:
+            model = FakeEmbeddingModel(args.request_ms, args.per_token_us, args.failure_rate)
+            batcher = EmbeddingBatcher(
+                model.embed_batch,
+                max_batch_size=batch_size,
+                max_batch_tokens=args.max_batch_tokens,
+                parallelism=parallelism,
+                backoff_base=0.05
+            )
+            start = time.perf_counter()
+            vectors = batcher.embed(texts)
+            elapsed = time.perf_counter() - start
+
+            assert all(v[0] == float(len(t)) for v, t in zip(vectors, texts)), "order not preserved"
+            print(f"{batch_size:>6} {parallelism:>4} {model.calls:>9} {model.failures:>8} "
+                  f"{elapsed:>8.2f} {len(texts) / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+語彙インデックス（BM25・文字n-gram）とハイブリッド検索のベンチマーク
+
+Builds one tenant of synthetic Japanese manual chunks. Every chunk belongs
+to a topic (check-in, air conditioner, trash, ...) and names its own room,
+product code and phone number. Chunk embeddings are topic center + noise,
+so vector search finds the topic but cannot tell rooms or codes apart.
+
+Reports the lexical index size and build time, BM25 latency, and for
+
+  keyword    a room name, product code or phone number alone
+  question   a question about one room's topic (longer than the fast-path limit)
+
+run through retriever.search (embedding stubbed, local vector index,
+hydration from memory) as vector only and as hybrid: whether the asked chunk
+is returned, whether it is ranked first, and embedding calls per query.
+
+Usage:
+    python scripts/bench_lexical.py
+    python scripts/bench_lexical.py --docs 20 --chunks 200 --queries 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import Config
+from app.rag import lexical_index, retriever, vector_store
+from app.rag.indexer import datapoint_id_for
+from app.rag.lexical_index import LexicalIndex
+from app.rag.vector_store import LocalVectorIndex, normalize
+from app.utils.chunks import chunk_id_for
+
+TOPICS = [
+    ("チェックイン", "チェックインは15時から22時までです。到着が遅れる場合はご連絡ください。"),
+    ("エアコン", "エアコンのリモコンはテレビ台の上にあります。冷房は25度に設定してください。"),
+    ("ゴミ", "ゴミは分別して玄関横の所定の場所へ出してください。収集日は火曜と金曜です。"),
+    ("Wi-Fi", "Wi-Fiのパスワードは冷蔵庫の扉に記載されています。接続できない場合はルーターを再起動してください。"),
+    ("浴室", "浴室の換気扇は常時運転してください。シャンプーとタオルは洗面台の下にあります。"),
+    ("鍵", "鍵はチェックアウト時にキーボックスへ返却してください。紛失した場合は交換費用をいただきます。"),
+    ("騒音", "22時以降は近隣へのご配慮をお願いします。ベランダでの通話はお控えください。"),
+    ("駐車場", "駐車場は建物の裏手に1台分あります。大型車はご利用いただけません。"),
+]
+KANJI = "桜梅松竹菊藤萩椿楓柳蓮葵桐杉檜楠欅樫栗柚"
+
+
+def build_chunks(rng, docs, chunks):
+    rooms, seen = [], set()
+    while len(rooms) < docs * chunks:
+        room = "".join(rng.choice(list(KANJI), 3)) + "の間"
+        if room not in seen:
+            seen.add(room)
+            rooms.append(room)
+    corpus = []
+    for i, room in enumerate(rooms):
+        topic = int(rng.integers(0, len(TOPICS)))
+        code = f"{'ABKMPQTX'[i % 8]}{'ABKMPQTX'[i // 8 % 8]}-{rng.integers(1000, 9999)}"
+        phone = f"03-{rng.integers(1000, 9999)}-{rng.integers(1000, 9999)}"
+        body = "".join(TOPICS[int(t)][1] for t in rng.integers(0, len(TOPICS), 6))
+        text = f"{room}の{TOPICS[topic][0]}について。{TOPICS[topic][1]}備品番号{code}。お問い合わせ{phone}。{body}"
+        corpus.append({"doc": f"doc-{i // chunks:03d}", "index": i % chunks, "topic": topic,
+                       "room": room, "code": code, "phone": phone, "text": text})
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lexical index and hybrid retrieval")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=100, help="Chunks per document")
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100, help="Queries per kind")
+    parser.add_argument("--top-k", type=int, default=15)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = build_chunks(rng, args.docs, args.chunks)
+
+    lexicon = LexicalIndex(tempfile.mkdtemp())
+    start = time.perf_counter()
+    postings = 0
+    for d in range(args.docs):
+        builder = lexicon.builder("t_001", f"doc-{d:03d}")
+        for chunk in corpus[d * args.chunks:(d + 1) * args.chunks]:
+            builder.add(chunk["index"], chunk["text"])
+        postings += builder.close()
+    build_ms = (time.perf_counter() - start) * 1000
+    tenant_dir = os.path.join(lexicon.directory, "t_001")
+    index_bytes = sum(os.path.getsize(os.path.join(tenant_dir, name)) for name in os.listdir(tenant_dir))
+    text_bytes = sum(len(chunk["text"].encode("utf-8")) for chunk in corpus)
+    print(f"{len(corpus)} chunks ({text_bytes / 1e6:.1f} MB text): {postings} postings, "
+          f"index {index_bytes / 1e6:.2f} MB ({index_bytes / postings:.2f} B/posting), built in {build_ms:.0f} ms")
+
+    centers = normalize(rng.standard_normal((len(TOPICS), args.dims)))
+    vectors = normalize(centers[[chunk["topic"] for chunk in corpus]]
+                        + 0.6 * rng.standard_normal((len(corpus), args.dims)) / np.sqrt(args.dims))
+    Config.VECTOR_BACKEND = "local"
+    Config.INLINE_PAYLOADS = False
+    vector_store._index = LocalVectorIndex(tempfile.mkdtemp())
+    vector_store._index.upsert(
+        "t_001", [datapoint_id_for("t_001", c["doc"], chunk_id_for(c["index"])) for c in corpus], vectors
+    )
+    lexical_index._index = lexicon
+    # Hydration from memory; the datapoint id doubles as the checksum, so the
+    # embedding cache lookup of lexical-only hits returns the chunk vector
+    records, cached = {}, {}
+    for chunk, vector in zip(corpus, vectors):
+        datapoint_id = datapoint_id_for("t_001", chunk["doc"], chunk_id_for(chunk["index"]))
+        records[datapoint_id] = {"text": chunk["text"], "checksum": datapoint_id, "page": 1, "path": ""}
+        cached[datapoint_id] = vector
+    retriever.fetch_tenant_chunks = lambda tenant_id, doc_chunks, backend=None: {
+        datapoint_id: records[datapoint_id] for ids in doc_chunks.values() for datapoint_id in ids
+    }
+    retriever.cached_chunk_vectors = lambda checksums, model_name=None: [cached.get(c) for c in checksums]
+    retriever.get_chunk_backend = lambda clients=None: None
+    embedded = {}
+
+    def embed_query(query, clients=None):
+        embedded[query] = embedded.get(query, 0) + 1
+        return query_vectors[query]
+
+    retriever.embed_query = embed_query
+    clients = SimpleNamespace()
+
+    targets = [corpus[int(i)] for i in rng.integers(0, len(corpus), args.queries)]
+    kinds = {
+        "keyword": [(t, t[("room", "code", "phone")[n % 3]]) for n, t in enumerate(targets)],
+        "question": [(t, f"{t['room']}の{TOPICS[t['topic']][0]}について教えてください") for t in targets],
+    }
+    query_vectors = {
+        query: normalize(centers[t["topic"]] + 0.6 * rng.standard_normal(args.dims) / np.sqrt(args.dims)).tolist()
+        for queries in kinds.values() for t, query in queries
+    }
+
+    latencies = []
+    for queries in kinds.values():
+        for _, query in queries:
+            start = time.perf_counter()
+            lexicon.search("t_001", query, Config.LEXICAL_TOP_K)
+            latencies.append((time.perf_counter() - start) * 1000)
+    print(f"BM25 search: median {statistics.median(latencies):.2f} ms, "
+          f"p95 {np.percentile(latencies, 95):.2f} ms per query")
+
+    print(f"{'kind':<9} {'mode':<7} {'found':>6} {'first':>6} {'embeds/q':>9} {'ms/q':>7}")
+    for kind, queries in kinds.items():
+        for mode in ("vector", "hybrid"):
+            Config.LEXICAL_INDEX = mode == "hybrid"
+            embedded.clear()
+            found = first = 0
+            start = time.perf_counter()
+            for target, query in queries:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    hits = asyncio.run(retriever.search(
+                        "t_001", query, "", top_k_final=args.top_k, clients=clients
+                    ))
+                keys = [(hit.doc_id, hit.chunk_id) for hit in hits]
+                key = (target["doc"], chunk_id_for(target["index"]))
+                found += key in keys
+                first += bool(keys) and keys[0] == key
+            elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{kind:<9} {mode:<7} {found / len(queries):>6.0%} {first / len(queries):>6.0%} "
+                  f"{sum(embedded.values()) / len(queries):>9.2f} {elapsed:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
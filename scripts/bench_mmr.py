@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+MMR（多様化）のマイクロベンチマーク（テキスト類似度 vs 埋め込みベクトル）
+
+For candidate pools of 30 to 1,000 hits (768-d embeddings, Japanese
+preview texts) selects top_k with:
+
+  text        token-overlap MMR over preview_text (the previous apply_mmr)
+  pairwise    embedding MMR with a Python loop over (candidate, selected)
+              pairs, as a reference for the selection
+  vectorized  apply_mmr with embeddings (running max-similarity vector)
+
+and reports the time per call. The vectorized selection is checked to be
+identical to the pairwise reference.
+
+Usage:
+    python scripts/bench_mmr.py
+    python scripts/bench_mmr.py --pools 30,100,300,1000 --top-k 15 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.retriever import _apply_text_mmr, apply_mmr
+from app.rag.vector_store import normalize
+from app.schemas.dto import ChunkHit
+
+PHRASES = [
+    "チェックインは15時から", "ゴミは分別して所定の場所へ", "Wi-Fiのパスワードは冷蔵庫に記載",
+    "エアコンのリモコンはテレビ台の上", "騒音に関するお願い", "鍵はキーボックスに返却してください",
+    "浴室の換気扇は常時運転", "近隣のコンビニまで徒歩3分", "緊急時の連絡先", "チェックアウトは10時まで",
+]
+
+
+def pairwise_mmr(vectors, query, lambda_param, top_k):
+    relevance = vectors @ query
+    selected = [int(np.argmax(relevance))]
+    candidates = [i for i in range(len(vectors)) if i != selected[0]]
+    while len(selected) < top_k:
+        scores = []
+        for candidate in candidates:
+            max_similarity = max(float(vectors[candidate] @ vectors[s]) for s in selected)
+            scores.append(lambda_param * relevance[candidate] - (1 - lambda_param) * max_similarity)
+        selected.append(candidates.pop(int(np.argmax(scores))))
+    return selected
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text vs embedding MMR")
+    parser.add_argument("--pools", default="30,100,300,1000")
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--lambda-param", type=float, default=0.6)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'pool':>5} {'text ms':>9} {'pairwise ms':>12} {'vectorized ms':>14}")
+    for pool in (int(p) for p in args.pools.split(",")):
+        # Near-duplicate groups, so diversification has something to do
+        centers = normalize(rng.standard_normal((pool // 5 + 1, args.dims)))
+        vectors = normalize(centers[rng.integers(0, len(centers), pool)]
+                            + 0.5 * rng.standard_normal((pool, args.dims)) / np.sqrt(args.dims)).astype(np.float32)
+        query = normalize(rng.standard_normal(args.dims)).astype(np.float32)
+        order = np.argsort(-(vectors @ query))
+        vectors = vectors[order]
+        hits = [
+            ChunkHit(
+                chunk_id=f"c-{i:05d}", doc_id="doc-001", page=1, path="", checksum="",
+                preview_text="。".join(rng.choice(PHRASES, 4).tolist()),
+                score=float(1 / (2 - vectors[i] @ query))
+            )
+            for i in range(pool)
+        ]
+        embeddings = list(vectors)
+
+        repeat = max(1, args.repeat * 30 // pool)
+        text_ms, _ = timed(lambda: _apply_text_mmr(hits, args.lambda_param, args.top_k), repeat)
+        pairwise_ms, reference = timed(lambda: pairwise_mmr(vectors, query, args.lambda_param, args.top_k), repeat)
+        vector_ms, selected = timed(
+            lambda: apply_mmr(hits, query.tolist(), args.lambda_param, args.top_k, embeddings=embeddings), args.repeat
+        )
+        assert [hit.chunk_id for hit in selected] == [hits[i].chunk_id for i in reference]
+        print(f"{pool:>5} {text_ms:>9.2f} {pairwise_ms:>12.2f} {vector_ms:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+検索結果のハイドレーション方式ベンチマーク（チャンクストア vs ローカルペイロード）
+
+Runs vector_search end to end against a stub index endpoint (fixed
+latency, random neighbors drawn from a tenant's documents) and hydrates
+the hits three ways:
+
+  store          segments read through a simulated remote object store
+  store+cache    the same, with the in-process chunk record cache
+  sidecar        INLINE_PAYLOADS: one SQLite lookup for the neighbor list
+
+and reports p50/p95 latency per query. The vector endpoint latency is the
+same in every mode, so the difference is the hydration round trip.
+
+Usage:
+    python scripts/bench_payload_store.py
+    python scripts/bench_payload_store.py --docs 40 --queries 200 --latency-ms 30 --search-ms 60
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_chunk_store import SENTENCES, SimulatedRemoteBackend
+
+from app.config import Config
+from app.rag import chunk_store, payload_store, retriever
+from app.rag.chunk_store import ChunkStoreWriter, LocalChunkBackend
+from app.rag.indexer import datapoint_id_for
+from app.rag.payload_store import ChunkPayloadStore, payload_rows
+from app.schemas.dto import PageText
+from app.utils.chunks import iter_chunks
+
+
+class StubEndpoint:
+    """find_neighbors stand-in that sleeps and returns random neighbors."""
+
+    def __init__(self, ids, latency_ms: float, k: int):
+        self.ids = ids
+        self.latency = latency_ms / 1000
+        self.k = k
+
+    def find_neighbors(self, deployed_index_id, queries, num_neighbors):
+        time.sleep(self.latency)
+        hits = random.sample(self.ids, min(num_neighbors, len(self.ids)))
+        return [[SimpleNamespace(id=hit, distance=0.1 * rank) for rank, hit in enumerate(hits)]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk-store vs inline-payload hydration")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=20, help="Pages per document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Object store latency per request")
+    parser.add_argument("--mbps", type=float, default=400.0)
+    parser.add_argument("--search-ms", type=float, default=40.0, help="Vector endpoint latency")
+    args = parser.parse_args()
+
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    backend = LocalChunkBackend(directory)
+    sidecar = ChunkPayloadStore(os.path.join(directory, "payloads.sqlite3"))
+    ids = []
+    for number in range(args.docs):
+        doc_id = f"doc-{number:03d}"
+        pages = [
+            PageText(page_num=i + 1, text="".join(random.choice(SENTENCES) for _ in range(60)))
+            for i in range(args.pages)
+        ]
+        chunks = list(iter_chunks(pages))
+        writer = ChunkStoreWriter("t_001", doc_id, f"gs://bucket/{doc_id}.pdf", backend=backend)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for chunk in chunks:
+                writer.write(chunk)
+            writer.close()
+        datapoint_ids = [datapoint_id_for("t_001", doc_id, chunk.chunk_id) for chunk in chunks]
+        sidecar.put_many("t_001", doc_id, payload_rows(datapoint_ids, chunks, writer.gcs_uri))
+        ids.extend(datapoint_ids)
+
+    endpoint = StubEndpoint(ids, args.search_ms, args.top_k)
+    clients = SimpleNamespace(index_endpoint=lambda: endpoint)
+    remote = SimulatedRemoteBackend(directory, args.latency_ms, args.mbps)
+    retriever.get_chunk_backend = lambda clients=None: remote
+    payload_store._store = sidecar
+
+    print(f"{args.docs} docs x {len(ids) // args.docs} chunks, top_k={args.top_k}, "
+          f"search {args.search_ms:.0f} ms, store {args.latency_ms:.0f} ms/request")
+    print(f"{'mode':<12} {'p50 ms':>8} {'p95 ms':>8} {'store req/q':>12}")
+    for mode in ("store", "store+cache", "sidecar"):
+        Config.CHUNK_CACHE_ENABLED = mode == "store+cache"
+        Config.INLINE_PAYLOADS = mode == "sidecar"
+        chunk_store._segment_cache.clear()
+        chunk_store._manifest_cache.clear()
+        requests = remote.requests
+        latencies = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = retriever.vector_search("t_001", [0.0], "", top_k=args.top_k, clients=clients)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert all(metadata["full_text"] for _, _, metadata in results)
+        latencies.sort()
+        print(f"{mode:<12} {statistics.median(latencies):>8.1f} {latencies[int(len(latencies) * 0.95)]:>8.1f} "
+              f"{(remote.requests - requests) / args.queries:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
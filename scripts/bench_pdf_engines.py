@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+PDF 抽出エンジン比較ベンチマーク
+
+Runs every installed PDF engine (see app/utils/pdf_engines.py) over the
+sample PDFs in the repository root and reports pages/sec, peak RSS and
+extracted character counts, including how many characters are Japanese
+and how many are garbled (■, U+FFFD, "(cid:N)" placeholders). Each engine
+runs in a fresh process so peak RSS is measured per engine.
+
+Usage:
+    python scripts/bench_pdf_engines.py
+    python scripts/bench_pdf_engines.py --repeat 10 --engines pypdf,pypdfium2
+    python scripts/bench_pdf_engines.py path/to/a.pdf path/to/b.pdf
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+_GARBLED = re.compile(r"[■�]|\(cid:\d+\)")
+
+
+def _is_japanese(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x3040 <= code <= 0x30FF      # Hiragana / Katakana
+        or 0x4E00 <= code <= 0x9FFF   # CJK Unified Ideographs
+        or 0x3000 <= code <= 0x303F   # CJK punctuation
+        or 0xFF00 <= code <= 0xFFEF   # Full-width forms
+    )
+
+
+def run_engine(engine_name: str, paths: List[str], repeat: int) -> Dict[str, dict]:
+    """Extract every file `repeat` times with one engine (runs in a child process)."""
+    import io
+    import warnings
+
+    from app.utils.pdf_engines import get_engine
+
+    warnings.filterwarnings("ignore")
+    engine = get_engine(engine_name)
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        texts: List[str] = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            document = engine.open(io.BytesIO(data))
+            try:
+                texts = [document.page_text(i) for i in range(document.page_count)]
+            finally:
+                document.close()
+        seconds = time.perf_counter() - start
+        joined = "".join(texts)
+        results[os.path.basename(path)] = {
+            "pages": len(texts) * repeat,
+            "seconds": seconds,
+            "chars": len(joined),
+            "japanese": sum(1 for ch in joined if _is_japanese(ch)),
+            "garbled": len(_GARBLED.findall(joined)),
+        }
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["__peak_rss_mib__"] = (peak / scale, (peak - baseline) / scale)
+    return results
+
+
+def main():
+    from app.utils.pdf_engines import ENGINES, available_engines
+
+    parser = argparse.ArgumentParser(description="Compare PDF extraction engines")
+    parser.add_argument("paths", nargs="*", help="PDF files (defaults to the sample PDFs)")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(ROOT, "*.pdf")))
+    installed = available_engines()
+    engines = [e for e in args.engines.split(",") if e in installed]
+    for missing in sorted(set(args.engines.split(",")) - set(installed)):
+        print(f"skipping {missing}: not installed")
+
+    context = multiprocessing.get_context("spawn")
+    totals = {}
+    print(f"{'engine':<10} {'file':<26} {'pages/s':>8} {'chars':>7} {'japanese':>9} {'garbled':>8}")
+    for engine in engines:
+        with context.Pool(1) as pool:
+            results = pool.apply(run_engine, (engine, paths, args.repeat))
+        peak_rss, extraction_rss = results.pop("__peak_rss_mib__")
+        for name, r in results.items():
+            print(f"{engine:<10} {name:<26} {r['pages'] / r['seconds']:>8.1f} "
+                  f"{r['chars']:>7} {r['japanese']:>9} {r['garbled']:>8}")
+        totals[engine] = {
+            "pages_per_sec": sum(r["pages"] for r in results.values()) / sum(r["seconds"] for r in results.values()),
+            "chars": sum(r["chars"] for r in results.values()),
+            "japanese": sum(r["japanese"] for r in results.values()),
+            "garbled": sum(r["garbled"] for r in results.values()),
+            "peak_rss_mib": peak_rss,
+            "extraction_rss_mib": extraction_rss,
+        }
+
+    print()
+    # "+MiB" is peak RSS growth during extraction, on top of the imported app modules
+    print(f"{'engine':<10} {'pages/s':>8} {'peak MiB':>9} {'+MiB':>6} {'chars':>7} {'japanese':>9} {'garbled':>8}")
+    for engine, t in totals.items():
+        print(f"{engine:<10} {t['pages_per_sec']:>8.1f} {t['peak_rss_mib']:>9.1f} {t['extraction_rss_mib']:>6.1f} "
+              f"{t['chars']:>7} {t['japanese']:>9} {t['garbled']:>8}")
+
+    if totals:
+        # Fastest engine among those that extract the most Japanese text. Garbled
+        # counts are informational only: some engines map missing glyphs to
+        # ordinary letters, which no placeholder pattern can detect.
+        most_japanese = max(t["japanese"] for t in totals.values())
+        candidates = [e for e, t in totals.items() if t["japanese"] == most_japanese]
+        choice = max(candidates, key=lambda e: totals[e]["pages_per_sec"])
+        print(f"\nrecommended: PDF_ENGINE={choice}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+PDF テキスト抽出スループットベンチマーク（プロセス数別）
+
+Builds a large PDF by repeating the pages of a sample document, then
+extracts it serially and with the page-range process pool at 1..N worker
+processes, reporting pages/sec and checking the output matches serial
+extraction exactly.
+
+Usage:
+    python scripts/bench_pdf_extraction.py
+    python scripts/bench_pdf_extraction.py --source tenant_002_products.pdf --pages 400 --max-workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pypdf import PdfReader, PdfWriter
+
+from app.utils.pdf import iter_pdf_view_pages, open_document
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def build_pdf(source: str, pages: int) -> str:
+    """Write a PDF with `pages` pages cycled from `source` and return its path."""
+    reader = PdfReader(source)
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def extract(uri: str, pool=None, pages_per_task: int = 8):
+    with open_document(uri) as view:
+        return [
+            (page.page_num, page.text)
+            for page in iter_pdf_view_pages(view, uri, cpu_pool=pool, pages_per_task=pages_per_task)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs process-pool PDF extraction")
+    parser.add_argument("--source", default=os.path.join(ROOT, "tenant_001_manual.pdf"))
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages-per-task", type=int, default=8)
+    args = parser.parse_args()
+
+    path = build_pdf(args.source, args.pages)
+    warmup_path = build_pdf(args.source, 2 * args.pages_per_task)
+    uri = f"file://{os.path.abspath(path)}"
+    try:
+        extract(f"file://{os.path.abspath(warmup_path)}")
+        start = time.perf_counter()
+        serial = extract(uri)
+        serial_seconds = time.perf_counter() - start
+        print(f"{args.pages} pages from {os.path.basename(args.source)}")
+        print(f"{'workers':>8} {'seconds':>8} {'pages/s':>9} {'speedup':>8} {'identical':>10}")
+        print(f"{'serial':>8} {serial_seconds:>8.2f} {args.pages / serial_seconds:>9.1f} {1.0:>8.2f} {'-':>10}")
+
+        workers = 1
+        while workers <= args.max_workers:
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                # Warm up worker imports on a different file so page caches start cold
+                extract(f"file://{os.path.abspath(warmup_path)}", pool, args.pages_per_task)
+                start = time.perf_counter()
+                parallel = extract(uri, pool, args.pages_per_task)
+                seconds = time.perf_counter() - start
+            print(f"{workers:>8} {seconds:>8.2f} {args.pages / seconds:>9.1f} "
+                  f"{serial_seconds / seconds:>8.2f} {str(parallel == serial):>10}")
+            workers *= 2
+    finally:
+        os.unlink(path)
+        os.unlink(warmup_path)
+
+
+if __name__ == "__main__":
+    main()
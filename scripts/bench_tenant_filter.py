@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+テナント絞り込み方式のベンチマーク（クライアント側フィルタ vs 過剰取得 vs フィルタのプッシュダウン）
+
+Builds one shared synthetic index for many tenants whose chunks cover the
+same topics (as lodging manuals do), served by a stub endpoint that does
+exact search and, like Vertex AI Vector Search, applies namespace filters
+before taking the top k. vector_search then runs in four modes:
+
+  client      global top_k, other tenants' neighbors dropped in Python (old behavior)
+  overfetch   no filters sent; num_neighbors grows until top_k tenant hits
+  pushdown    tenant namespace filter sent with the query
+  pushdown+doc  tenant filter plus a doc_id allow list of 3 documents
+
+and reports, per query, the tenant hits returned, queries with no hit,
+find_neighbors calls and neighbors transferred.
+
+Usage:
+    python scripts/bench_tenant_filter.py
+    python scripts/bench_tenant_filter.py --tenants 100 --docs 10 --chunks 100 --queries 300 --top-k 30
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import Config
+from app.rag import retriever
+from app.rag.indexer import datapoint_id_for
+from app.rag.vector_store import normalize
+from app.utils.chunks import chunk_id_for
+
+
+class FilteringEndpoint:
+    """find_neighbors stand-in: exact search with Vertex-style namespace filters."""
+
+    def __init__(self, vectors, ids, namespaces):
+        self.vectors = vectors
+        self.ids = ids
+        self.namespaces = namespaces      # namespace -> per-vector token array
+        self.calls = 0
+        self.transferred = 0
+
+    def find_neighbors(self, deployed_index_id, queries, num_neighbors, filter=()):
+        self.calls += 1
+        scores = self.vectors @ np.asarray(queries[0], dtype=np.float32)
+        for namespace in filter:
+            tokens = self.namespaces[namespace.name]
+            if namespace.allow_tokens:
+                scores[~np.isin(tokens, namespace.allow_tokens)] = -np.inf
+            if namespace.deny_tokens:
+                scores[np.isin(tokens, namespace.deny_tokens)] = -np.inf
+        k = min(num_neighbors, int(np.isfinite(scores).sum()))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top])]
+        self.transferred += len(top)
+        return [[SimpleNamespace(id=self.ids[i], distance=float(1 - scores[i])) for i in top.tolist()]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tenant filtering strategies for vector search")
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--docs", type=int, default=10, help="Documents per tenant")
+    parser.add_argument("--chunks", type=int, default=50, help="Chunks per document")
+    parser.add_argument("--dims", type=int, default=128)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    random.seed(0)
+    total = args.tenants * args.docs * args.chunks
+    topics = normalize(rng.standard_normal((args.topics, args.dims)))
+    vectors = normalize(topics[rng.integers(0, args.topics, total)]
+                        + 0.8 * rng.standard_normal((total, args.dims)) / np.sqrt(args.dims)).astype(np.float32)
+    ids, tenants, docs = [], [], []
+    for t in range(args.tenants):
+        for d in range(args.docs):
+            for c in range(args.chunks):
+                tenants.append(f"t_{t:03d}")
+                docs.append(f"doc-{d:03d}")
+                ids.append(datapoint_id_for(tenants[-1], docs[-1], chunk_id_for(c)))
+    endpoint = FilteringEndpoint(vectors, ids, {"tenant_id": np.array(tenants), "doc_id": np.array(docs)})
+
+    Config.VECTOR_BACKEND = "vertex"
+    Config.DATAPOINT_IDS = "string"
+    Config.INLINE_PAYLOADS = False
+    retriever.fetch_tenant_chunks = lambda *args, **kwargs: {}
+    clients = SimpleNamespace(index_endpoint=lambda: endpoint)
+    queries = [
+        (f"t_{rng.integers(0, args.tenants):03d}",
+         normalize(topics[rng.integers(0, args.topics)] + 0.8 * rng.standard_normal(args.dims) / np.sqrt(args.dims)))
+        for _ in range(args.queries)
+    ]
+    doc_filter = [f"doc-{d:03d}" for d in range(3)]
+
+    print(f"{args.tenants} tenants x {args.docs * args.chunks} chunks ({total} vectors), top_k={args.top_k}")
+    print(f"{'mode':<13} {'hits/q':>7} {'min':>4} {'zero-hit':>9} {'calls/q':>8} {'neighbors/q':>12}")
+    for mode in ("client", "overfetch", "pushdown", "pushdown+doc"):
+        Config.VECTOR_FILTER_PUSHDOWN = mode.startswith("pushdown")
+        Config.VECTOR_OVERFETCH_MAX = args.top_k if mode == "client" else 1000
+        endpoint.calls = endpoint.transferred = 0
+        hits = []
+        for tenant_id, query in queries:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = retriever.vector_search(
+                    tenant_id, query.tolist(), "", top_k=args.top_k, clients=clients,
+                    doc_ids=doc_filter if mode == "pushdown+doc" else None
+                )
+            assert all(metadata["tenant_id"] == tenant_id for _, _, metadata in results)
+            if mode == "pushdown+doc":
+                assert all(metadata["doc_id"] in doc_filter for _, _, metadata in results)
+            hits.append(len(results))
+        print(f"{mode:<13} {statistics.mean(hits):>7.1f} {min(hits):>4} "
+              f"{sum(h == 0 for h in hits) / len(hits):>8.0%} {endpoint.calls / len(queries):>8.1f} "
+              f"{endpoint.transferred / len(queries):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+ベクトル検索バックエンドのベンチマーク（ローカル完全探索 vs Vertex AI Vector Search）
+
+Synthetic mode (default): builds the in-process index (VECTOR_BACKEND=local)
+from clustered random 768-d embeddings, then reports build time, query
+latency p50/p95 and recall@k against float64 brute force.
+
+Remote mode (--tenant): uses a tenant already present in both indexes
+(ingested with VECTOR_BACKEND=both). Queries are that tenant's stored
+vectors plus noise. Each query goes to the local index and to the deployed
+Vertex index, and the report gives both latencies and the recall@k of
+Vertex's tenant-filtered neighbors against the local exact top k.
+
+Usage:
+    python scripts/bench_vector_backends.py
+    python scripts/bench_vector_backends.py --chunks 100000 --queries 200 --k 30
+    python scripts/bench_vector_backends.py --tenant t_001 --queries 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.rag.vector_store import LocalVectorIndex, get_vector_index, normalize
+
+
+def synthetic(n: int, dims: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = normalize(rng.standard_normal((clusters, dims)))
+    data = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dims)) / np.sqrt(dims)
+    return normalize(data).astype(np.float32)
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def run_synthetic(args, rng):
+    data = synthetic(args.chunks, args.dims, args.clusters, rng)
+    index = LocalVectorIndex(tempfile.mkdtemp())
+    ids = [str(i) for i in range(args.chunks)]
+    start = time.perf_counter()
+    for offset in range(0, args.chunks, 500):
+        index.upsert("t_001", ids[offset:offset + 500], data[offset:offset + 500])
+    print(f"built {args.chunks} x {args.dims} in {time.perf_counter() - start:.2f} s")
+
+    queries = normalize(data[rng.integers(0, args.chunks, args.queries)]
+                        + 0.5 * rng.standard_normal((args.queries, args.dims)) / np.sqrt(args.dims))
+    exact = data.astype(np.float64) @ queries.astype(np.float64).T
+    latencies, recalls = [], []
+    for q in range(args.queries):
+        start = time.perf_counter()
+        neighbors = index.find_neighbors("t_001", queries[q], args.k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        truth = set(np.argsort(-exact[:, q])[:args.k].tolist())
+        recalls.append(len(truth & {int(n.id) for n in neighbors}) / args.k)
+    p50, p95 = percentiles(latencies)
+    print(f"local     p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  recall@{args.k} {np.mean(recalls):.3f}")
+
+
+def run_remote(args, rng):
+    from app.config import Config
+    from app.rag.clients import get_clients
+
+    index = get_vector_index()
+    tenant = index._tenant(args.tenant)
+    if tenant is None or not len(tenant):
+        sys.exit(f"Tenant {args.tenant} has no vectors in {index.directory}")
+    rows = [row for row, datapoint_id in enumerate(tenant._ids) if datapoint_id is not None]
+    stored = np.asarray(tenant._matrix[rows])
+    tenant_ids = {tenant._ids[row] for row in rows}
+    endpoint = get_clients().index_endpoint()
+
+    local_ms, remote_ms, recalls = [], [], []
+    for _ in range(args.queries):
+        query = normalize(stored[rng.integers(0, len(rows))]
+                          + 0.5 * rng.standard_normal(stored.shape[1]) / np.sqrt(stored.shape[1]))
+        start = time.perf_counter()
+        local = index.find_neighbors(args.tenant, query, args.k)
+        local_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        response = endpoint.find_neighbors(
+            deployed_index_id=Config.DEPLOYED_INDEX_ID, queries=[query.tolist()], num_neighbors=args.k
+        )
+        remote_ms.append((time.perf_counter() - start) * 1000)
+        remote = [n.id for n in response[0] if n.id in tenant_ids]
+        truth = {n.id for n in local}
+        recalls.append(len(truth & set(remote)) / len(truth) if truth else 1.0)
+
+    for label, latencies in (("local", local_ms), ("vertex", remote_ms)):
+        p50, p95 = percentiles(latencies)
+        print(f"{label:<9} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+    print(f"vertex recall@{args.k} vs local exact (tenant-filtered): {np.mean(recalls):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local exact search against Vertex AI Vector Search")
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=30)
+    parser.add_argument("--tenant", help="Compare with the deployed Vertex index for this tenant")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.tenant:
+        run_remote(args, rng)
+    else:
+        run_synthetic(args, rng)
+
+
+if __name__ == "__main__":
+    main()
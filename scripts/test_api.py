@@ -61,10 +61,13 @@ def test_ingest(gcs_uri: str = None):
         print(f"ステータス: {response.status_code}")
         print(f"処理時間: {duration:.2f}秒")
         
-        if response.status_code == 200:
-            result = response.json()
+        if response.status_code == 202:
+            result = wait_for_job(response.json()["job_id"])
             print(f"レスポンス: {json.dumps(result, indent=2)}")
-            print(f"✓ 取り込み成功: {result['chunks']}チャンク作成")
+            if result["status"] != "succeeded":
+                print(f"✗ 取り込み失敗: {result.get('error')}")
+                return False, result
+            print(f"✓ 取り込み成功: {result['progress']['chunks']}チャンク作成")
             return True, result
         else:
             print(f"レスポンス: {response.text}")
@@ -75,6 +78,16 @@ def test_ingest(gcs_uri: str = None):
         print(f"✗ 取り込みエラー: {e}")
         return False, None
 
+def wait_for_job(job_id: str, timeout: float = 600) -> Dict[str, Any]:
+    """取り込みジョブの完了を待機"""
+    deadline = time.time() + timeout
+    while True:
+        job = requests.get(f"{API_BASE_URL}/jobs/{job_id}").json()
+        print(f"ジョブ {job_id}: {job['status']} {job['progress']}")
+        if job["status"] in ("succeeded", "failed") or time.time() > deadline:
+            return job
+        time.sleep(2)
+
 def test_chat(query: str = "このドキュメントについて教えて"):
     """チャットテスト"""
     print(f"\n=== チャットテスト: {query} ===")
@@ -0,0 +1,34 @@
+import pytest
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
+
+from app.rag.batcher import EmbeddingBatcher
+
+
+def _flaky(errors):
+    calls = []
+
+    def embed_batch(batch):
+        calls.append(list(batch))
+        if errors:
+            raise errors.pop(0)
+        return [[float(len(text))] for text in batch]
+
+    return embed_batch, calls
+
+
+def test_transient_errors_are_retried():
+    embed_batch, calls = _flaky([ResourceExhausted("quota"), ResourceExhausted("quota")])
+    batcher = EmbeddingBatcher(embed_batch, max_retries=3, backoff_base=0.001)
+
+    assert batcher.embed(["a", "bb"]) == [[1.0], [2.0]]
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize("error", [InvalidArgument("bad input"), ValueError("bug")])
+def test_other_errors_raise_without_retry(error):
+    embed_batch, calls = _flaky([error])
+    batcher = EmbeddingBatcher(embed_batch, max_retries=3, backoff_base=0.001)
+
+    with pytest.raises(type(error)):
+        batcher.embed(["a"])
+    assert len(calls) == 1
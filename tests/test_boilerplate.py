@@ -0,0 +1,46 @@
+from app.schemas.dto import PageText
+from app.utils.boilerplate import BoilerplateStripper
+
+
+def _strip(pages):
+    return list(BoilerplateStripper(sample_pages=50, min_pages=3, min_page_ratio=0.6, edge_lines=3).strip(pages))
+
+
+def test_templated_body_lines_survive():
+    # Every line matched every other page when all digits were folded; only
+    # the page counter may go
+    pages = [
+        PageText(page_num=i, text=f"客室{i}: デラックスツイン\n料金: {12000 + i * 1500}円\n定員: {2 + i % 3}名\n{i + 1} / 10")
+        for i in range(1, 11)
+    ]
+    stripped = _strip(pages)
+
+    assert len(stripped) == 10
+    for i, page in enumerate(stripped, start=1):
+        assert page.text == f"客室{i}: デラックスツイン\n料金: {12000 + i * 1500}円\n定員: {2 + i % 3}名"
+
+
+def test_headers_footers_and_page_counters_are_removed():
+    def body(i):
+        return "\n".join(f"第{i}章の本文{n}行目です。" for n in range(10))
+
+    pages = [
+        PageText(page_num=i, text=f"社外秘\n運用マニュアル 2025年版\n{body(i)}\n第{i * 3}条の解説\nPage {i + 2} of 12")
+        for i in range(1, 11)
+    ]
+    stripped = _strip(pages)
+
+    for i, page in enumerate(stripped, start=1):
+        assert page.text == f"{body(i)}\n第{i * 3}条の解説"
+
+
+def test_repeated_lines_in_the_middle_of_a_page_are_kept():
+    pages = [
+        PageText(page_num=i, text="\n".join(
+            [f"{name}棟{i}号室の設備のご案内です。" for name in "ABC"]
+            + ["ご不明点はフロントまで。"]
+            + [f"{name}棟{i}号室の注意事項です。" for name in "DEF"]
+        ))
+        for i in range(1, 6)
+    ]
+    assert [page.text for page in _strip(pages)] == [page.text for page in pages]
@@ -0,0 +1,34 @@
+import pytest
+
+from app.config import Config
+from app.rag.retriever import candidate_pool_size, neighbor_similarity
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_BACKEND", "vertex")
+    monkeypatch.setattr(Config, "RETRIEVAL_SCORE_WINDOW", 0.12)
+    monkeypatch.setattr(Config, "RETRIEVAL_SCORE_GAP", 0.04)
+
+
+def test_cosine_distances_cut_past_the_window(monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DISTANCE_MEASURE", "COSINE_DISTANCE")
+    distances = [0.20, 0.22, 0.24, 0.27, 0.30, 0.35, 0.50]
+
+    assert candidate_pool_size(neighbor_similarity(distances), min_size=2) == 5
+
+
+def test_dot_product_distances_keep_the_best_neighbors(monkeypatch):
+    # DOT_PRODUCT_DISTANCE reports the dot product: larger is more similar
+    monkeypatch.setattr(Config, "VECTOR_DISTANCE_MEASURE", "DOT_PRODUCT_DISTANCE")
+    distances = [0.80, 0.78, 0.76, 0.73, 0.70, 0.65, 0.50]
+
+    assert candidate_pool_size(neighbor_similarity(distances), min_size=2) == 5
+
+
+def test_unknown_measure_has_no_similarity(monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_DISTANCE_MEASURE", "L1_DISTANCE")
+    assert neighbor_similarity([0.1]) is None
+
+    monkeypatch.setattr(Config, "VECTOR_BACKEND", "local")
+    assert neighbor_similarity([0.1]).tolist() == pytest.approx([0.9])
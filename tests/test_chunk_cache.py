@@ -0,0 +1,22 @@
+from app.rag.chunk_cache import ChunkRecordCache, record_size
+
+
+def _record(text):
+    return {"text": text, "page": 1, "page_end": 1, "checksum": "0" * 64, "path": "gs://bucket/doc.pdf"}
+
+
+def test_record_size_counts_bytes_not_characters():
+    ascii_size = record_size(_record("a" * 10_000))
+    japanese_size = record_size(_record("あ" * 10_000))
+
+    assert japanese_size - ascii_size >= 10_000
+
+
+def test_cache_stays_within_its_byte_budget():
+    record = _record("チェックインは15時からです。" * 100)
+    cache = ChunkRecordCache(max_bytes=10 * record_size(record))
+    for i in range(30):
+        cache.put_many("t_001", "doc-001", "seg-1", {f"t_001_doc-001_c-{i:05d}": dict(record)})
+
+    assert cache.bytes <= cache.max_bytes
+    assert len(cache.get_many([f"t_001_doc-001_c-{i:05d}" for i in range(30)], "seg-1")[0]) == 10
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from app.config import Config
+from app.rag.chunk_store import (
+    ChunkStoreWriter,
+    LocalChunkBackend,
+    compact_tenant,
+    delete_document,
+    fetch_tenant_chunks,
+    load_manifest,
+    manifest_name,
+    update_manifest,
+)
+from app.rag.indexer import datapoint_id_for
+from app.schemas.dto import PageText
+from app.utils.chunks import iter_chunks
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CHUNK_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "CHUNK_MANIFEST_TTL", 0.0)
+    return LocalChunkBackend(str(tmp_path / "chunks"))
+
+
+def _ingest(backend, doc_id, text):
+    writer = ChunkStoreWriter("t_001", doc_id, f"gs://bucket/{doc_id}.pdf", backend=backend)
+    chunks = list(iter_chunks([PageText(page_num=1, text=text)]))
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+    return [datapoint_id_for("t_001", doc_id, chunk.chunk_id) for chunk in chunks]
+
+
+def test_write_if_rejects_a_stale_version(backend):
+    name = manifest_name("t_001")
+    _, version = backend.read_versioned(name)
+    assert backend.write_if(name, b"{}", version)
+    assert not backend.write_if(name, b"[]", version)
+    assert backend.read_all(name) == b"{}"
+
+
+def test_update_manifest_reapplies_the_change_after_a_concurrent_write(backend):
+    calls = []
+
+    def add(doc_id):
+        def mutate(manifest):
+            calls.append(doc_id)
+            if len(calls) == 1:
+                # Another writer commits between this read and the write
+                update_manifest("t_001", add("doc-b"), backend=backend)
+            manifest["docs"][doc_id] = "segment"
+            return manifest
+        return mutate
+
+    update_manifest("t_001", add("doc-a"), backend=backend)
+
+    assert calls == ["doc-a", "doc-b", "doc-a"]
+    assert set(load_manifest("t_001", backend)["docs"]) == {"doc-a", "doc-b"}
+
+
+def test_concurrent_writers_all_land_in_the_manifest(backend):
+    threads = [
+        threading.Thread(target=_ingest, args=(backend, f"doc-{n}", f"文書{n}の本文です。" * 50))
+        for n in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    manifest = load_manifest("t_001", backend)
+    assert set(manifest["docs"]) == {f"doc-{n}" for n in range(8)}
+    assert len(manifest["segments"]) == 8
+
+
+def test_compaction_keeps_live_chunks_and_drops_dead_ones(backend):
+    old_a = _ingest(backend, "doc-a", "古い版です。" * 300)
+    b = _ingest(backend, "doc-b", "削除される文書です。" * 300)
+    c = _ingest(backend, "doc-c", "残る文書です。" * 300)
+    new_a = _ingest(backend, "doc-a", "新しい版です。" * 300)
+    delete_document("t_001", "doc-b", backend=backend)
+    before = {name for name in backend.list("chunks/t_001/segments/")}
+
+    stats = compact_tenant("t_001", backend=backend, min_segments=2, grace_seconds=3600)
+
+    assert stats["merged"] == 4
+    assert stats["chunks"] == len(new_a) + len(c)
+    assert stats["dropped"] == len(old_a) + len(b)
+    manifest = load_manifest("t_001", backend)
+    assert [segment["name"] for segment in manifest["segments"]] == [stats["written"]]
+    assert manifest["docs"] == {"doc-a": stats["written"], "doc-c": stats["written"]}
+    assert "doc-b" in manifest["tombstones"]
+    # Retired segments stay readable until the grace period ends
+    assert {entry["name"] for entry in manifest["retired"]} == before
+
+    records = fetch_tenant_chunks("t_001", {"doc-a": new_a, "doc-b": b, "doc-c": c}, backend=backend)
+    assert set(records) == set(new_a) | set(c)
+    assert records[new_a[0]]["text"].startswith("新しい版です。")
+
+    stats = compact_tenant("t_001", backend=backend, min_segments=2, grace_seconds=0)
+    assert stats["deleted"] == len(before)
+    assert backend.list("chunks/t_001/segments/") == [load_manifest("t_001", backend)["segments"][0]["name"]]
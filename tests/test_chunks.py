@@ -0,0 +1,64 @@
+from app.schemas.dto import PageText
+from app.utils.chunks import iter_sentence_chunks, sentence_spans
+from app.utils.tokens import estimate_tokens
+
+
+def _squeeze(text: str) -> str:
+    return "".join(text.split())
+
+
+def test_sentence_chunks_cover_pages_in_order():
+    pages = [
+        PageText(page_num=1, text="チェックインは15時からです。" * 40),
+        PageText(page_num=2, text="Check-out is at 10am. Please return the key. " * 40),
+    ]
+    chunks = list(iter_sentence_chunks(pages, max_tokens=100, overlap_sentences=0))
+
+    indices = [chunk.index for chunk in chunks]
+    assert indices == sorted(set(indices))
+    assert all(estimate_tokens(chunk.text) <= 100 for chunk in chunks)
+    assert _squeeze("".join(chunk.text for chunk in chunks)) == _squeeze("".join(page.text for page in pages))
+    assert chunks[0].page == 1 and chunks[-1].page_end == 2
+
+
+def test_sentence_chunks_repeat_overlap_sentences():
+    page = PageText(page_num=1, text="".join(f"文{i:02d}です。" for i in range(30)))
+    chunks = list(iter_sentence_chunks([page], max_tokens=20, overlap_sentences=1))
+
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.text.split("。")[-2] + "。"
+        assert current.text.startswith(last_sentence)
+
+
+def test_sentence_chunks_never_cut_mid_sentence():
+    page = PageText(page_num=1, text="短い文です。" * 10 + "長めの文章がここに続きます。" * 10)
+    for chunk in iter_sentence_chunks([page], max_tokens=30, overlap_sentences=0):
+        assert chunk.text.endswith("。")
+
+
+def test_oversized_mixed_script_sentence_fits_budget():
+    # ASCII run followed by Japanese: cutting by characters made pieces over
+    # the budget and iter_sentence_chunks then raised IndexError
+    text = "a" * 4000 + "あ" * 1500
+    spans = list(sentence_spans(text, 1400))
+
+    assert all(tokens <= 1400 for _, _, tokens in spans)
+    assert all(estimate_tokens(text[start:end]) == tokens for start, end, tokens in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+
+    chunks = list(iter_sentence_chunks([PageText(page_num=1, text=text)], max_tokens=1400, overlap_sentences=1))
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+    assert all(estimate_tokens(chunk.text) <= 1400 for chunk in chunks)
+
+
+def test_chunking_continues_after_an_oversized_sentence():
+    pages = [
+        PageText(page_num=1, text="x" * 6000),
+        PageText(page_num=2, text="次のページです。"),
+    ]
+    chunks = list(iter_sentence_chunks(pages, max_tokens=1400, overlap_sentences=1))
+
+    assert chunks[-1].text.endswith("次のページです。")
+    assert chunks[-1].page_end == 2
+    assert all(estimate_tokens(chunk.text) <= 1400 for chunk in chunks)
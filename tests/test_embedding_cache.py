@@ -0,0 +1,36 @@
+import os
+
+from app.rag.embedding_cache import EmbeddingCache, cached_embed
+
+
+def _embed(calls):
+    def embed_missing(texts):
+        calls.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+    return embed_missing
+
+
+def test_query_embeddings_stay_in_memory(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), memory_items=10)
+    calls = []
+
+    cached_embed(["部屋の鍵は？"], ["q1"], "model", "RETRIEVAL_QUERY", _embed(calls), cache=cache, persist=False)
+    cached_embed(["部屋の鍵は？"], ["q1"], "model", "RETRIEVAL_QUERY", _embed(calls), cache=cache, persist=False)
+
+    assert calls == ["部屋の鍵は？"]
+    assert os.listdir(tmp_path) == []
+    assert cache.stats()["disk_items"] == 0
+
+
+def test_chunk_embeddings_survive_a_restart(tmp_path):
+    calls = []
+    cached_embed(["本文", "本文", "別の本文"], ["a", "a", "b"], "model", "RETRIEVAL_DOCUMENT", _embed(calls),
+                 cache=EmbeddingCache(str(tmp_path)))
+
+    restarted = EmbeddingCache(str(tmp_path))
+    vectors = cached_embed(["本文", "別の本文"], ["a", "b"], "model", "RETRIEVAL_DOCUMENT", _embed(calls),
+                           cache=restarted)
+
+    assert calls == ["本文", "別の本文"]
+    assert vectors == [[2.0, 1.0], [4.0, 1.0]]
+    assert restarted.stats()["disk_hits"] == 2
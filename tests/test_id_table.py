@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from app.config import Config
+from app.rag.id_table import DatapointIdTable, get_id_table, neighbor_ids
+
+
+def test_allocate_is_stable_and_dense(tmp_path):
+    table = DatapointIdTable(str(tmp_path))
+    first = table.allocate("t_001", "doc-001", [(0, 1), (1, 1), (1000, 2)])
+    other = table.allocate("t_002", "doc-001", [(0, 1)])
+
+    assert first == [0, 1, 2] and other == [3]
+    # Re-ingest: same chunks keep their ids, a new chunk gets the next one
+    assert table.allocate("t_001", "doc-001", [(0, 1), (1000, 2), (2000, 3)]) == [0, 2, 4]
+    assert table.lookup("t_001", "doc-001", [1, 2000, 5]) == [1, 4, None]
+    assert len(table) == 5
+
+
+def test_released_ids_are_not_resolved_or_reused(tmp_path):
+    table = DatapointIdTable(str(tmp_path))
+    ids = table.allocate("t_001", "doc-001", [(0, 1), (1, 1), (2, 2)])
+    table.release([ids[1]])
+
+    assert table.lookup("t_001", "doc-001", [0, 1, 2]) == [0, None, 2]
+    positions, docs, chunks, pages = table.resolve("t_001", np.array(ids, dtype=np.int64))
+    assert positions.tolist() == [0, 2] and docs == ["doc-001", "doc-001"]
+    assert chunks.tolist() == [0, 2] and pages.tolist() == [1, 2]
+    # A removed chunk that comes back gets a fresh id
+    assert table.allocate("t_001", "doc-001", [(1, 1)]) == [3]
+
+
+def test_resolve_filters_by_tenant_and_survives_a_reopen(tmp_path):
+    table = DatapointIdTable(str(tmp_path))
+    table.allocate("t_001", "doc-001", [(0, 1), (1, 1)])
+    table.allocate("t_002", "doc-002", [(0, 4)])
+    table.release([1])
+
+    reopened = DatapointIdTable(str(tmp_path))
+    ids = neighbor_ids(["2", "0", "t_001_doc-009_c-00000", "1", "99"])
+    positions, docs, chunks, pages = reopened.resolve("t_001", ids)
+
+    assert ids.tolist() == [2, 0, -1, 1, 99]
+    assert positions.tolist() == [1] and docs == ["doc-001"] and chunks.tolist() == [0]
+    assert reopened.allocate("t_002", "doc-002", [(0, 4)]) == [2]
+
+
+@pytest.mark.parametrize("backend", ["vertex", "both"])
+def test_integer_ids_require_the_local_vector_backend(monkeypatch, backend):
+    monkeypatch.setattr(Config, "DATAPOINT_IDS", "int")
+    monkeypatch.setattr(Config, "VECTOR_BACKEND", backend)
+
+    with pytest.raises(ValueError, match="VECTOR_BACKEND=local"):
+        get_id_table()
@@ -0,0 +1,104 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import Config
+from app.rag import pipeline
+from app.rag.chunk_store import read_manifest
+from app.schemas.dto import PageText
+from app.utils.chunks import iter_chunks, iter_sentence_chunks
+
+
+def _pages(edited_page=None, extra=""):
+    return [
+        PageText(page_num=n, text=f"ページ{n}の案内です。" * 150 + (extra if n == edited_page else ""))
+        for n in range(1, 201)
+    ]
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """Run the ingest pipeline on in-memory pages, recording upserted chunks."""
+    monkeypatch.setattr(Config, "CHUNK_STORE_BACKEND", "local")
+    monkeypatch.setattr(Config, "CHUNK_STORE_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(Config, "INLINE_PAYLOADS", False)
+    monkeypatch.setattr(Config, "LEXICAL_INDEX", False)
+    monkeypatch.setattr(pipeline, "embed_texts", lambda texts, clients=None, checksums=None, parallelism=None: [[0.0]] * len(texts))
+    upserted = []
+
+    def upsert_vectors(tenant_id, doc_id, chunks, embeddings, index_id, gcs_uri, clients=None):
+        upserted.extend(chunk.chunk_id for chunk in chunks)
+        return len(chunks)
+
+    monkeypatch.setattr(pipeline, "upsert_vectors", upsert_vectors)
+    monkeypatch.setattr(pipeline, "remove_chunks", lambda tenant_id, doc_id, datapoint_ids, clients=None: len(datapoint_ids))
+
+    def run(pages, previous):
+        upserted.clear()
+        monkeypatch.setattr(pipeline, "iter_pdf_pages", lambda uri, stripper=None: iter(pages))
+        result = asyncio.run(pipeline.run_ingest_pipeline(
+            "t_001", "gs://bucket/doc.pdf", "doc-001", "index", previous, clients=SimpleNamespace()
+        ))
+        return result, list(upserted)
+
+    return run
+
+
+def _manifest(pages, chunker):
+    return {f"t_001_doc-001_{chunk.chunk_id}": chunk.checksum for chunk in chunker(pages)}
+
+
+def test_one_page_edit_upserts_only_that_page(ingest, monkeypatch):
+    monkeypatch.setattr(Config, "CHUNKER", "fixed")
+    previous = _manifest(_pages(), iter_chunks)
+
+    # ~1.8k more characters on page 5: one more chunk there, every later page unchanged
+    result, upserted = ingest(_pages(edited_page=5, extra="追記" * 900), previous)
+
+    page_five = {chunk.chunk_id for chunk in iter_chunks(_pages(edited_page=5, extra="追記" * 900)) if chunk.page == 5}
+    assert set(upserted) <= page_five
+    assert result["added"] >= 1
+    assert result["added"] + result["updated"] == len(upserted)
+    assert result["unchanged"] == result["chunks"] - len(upserted)
+    assert result["removed"] == []
+
+
+def test_reingest_without_changes_upserts_nothing(ingest, monkeypatch):
+    monkeypatch.setattr(Config, "CHUNKER", "fixed")
+    result, upserted = ingest(_pages(), _manifest(_pages(), iter_chunks))
+
+    assert upserted == []
+    assert result["unchanged"] == result["chunks"]
+
+
+def test_sentence_chunk_ids_are_stable_before_the_edited_page():
+    before = list(iter_sentence_chunks(_pages(), max_tokens=400, overlap_sentences=1))
+    after = list(iter_sentence_chunks(_pages(edited_page=150, extra="追記です。" * 100), max_tokens=400,
+                                      overlap_sentences=1))
+
+    unaffected = [(c.chunk_id, c.checksum) for c in before if c.page_end < 150]
+    assert unaffected
+    assert unaffected == [(c.chunk_id, c.checksum) for c in after if c.page_end < 150]
+
+
+def test_failed_removal_keeps_the_previous_manifest(ingest, monkeypatch):
+    monkeypatch.setattr(Config, "CHUNKER", "fixed")
+    ingest(_pages(), {})
+    stored = read_manifest("t_001", "doc-001")
+
+    def fail(tenant_id, doc_id, datapoint_ids, clients=None):
+        raise RuntimeError("remove_datapoints failed")
+
+    monkeypatch.setattr(pipeline, "remove_chunks", fail)
+    with pytest.raises(RuntimeError):
+        ingest(_pages()[:100], stored)
+    # The removed chunks are still listed, so the retry removes them
+    assert read_manifest("t_001", "doc-001") == stored
+
+    removed = []
+    monkeypatch.setattr(pipeline, "remove_chunks",
+                        lambda tenant_id, doc_id, datapoint_ids, clients=None: removed.extend(datapoint_ids) or 0)
+    result, _ = ingest(_pages()[:100], read_manifest("t_001", "doc-001"))
+    assert sorted(removed) == sorted(result["removed"]) and len(removed) == len(stored) - result["chunks"]
+    assert len(read_manifest("t_001", "doc-001")) == result["chunks"]
@@ -0,0 +1,44 @@
+from app.jobs.store import JOB_FAILED, JOB_QUEUED, JobStore
+from app.jobs.worker import ProgressReporter
+
+
+def _store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_requeue_fails_jobs_past_max_attempts(tmp_path):
+    store = _store(tmp_path)
+    store.create("job-1", "t_001", "doc-001", "gs://bucket/a.pdf")
+    store.create("job-2", "t_001", "doc-002", "gs://bucket/b.pdf")
+
+    # job-1 is interrupted on every run; job-2 only once
+    for attempt in range(3):
+        assert store.claim_next()["job_id"] == "job-1"
+        if attempt == 0:
+            assert store.claim_next()["job_id"] == "job-2"
+        requeued, failed = store.requeue_running(max_attempts=3)
+
+    assert (requeued, failed) == (0, 1)
+    job = store.get("job-1")
+    assert job["status"] == JOB_FAILED and job["attempts"] == 3
+    assert "Interrupted" in job["error"]
+    assert store.get("job-2")["status"] == JOB_QUEUED
+
+
+def test_progress_is_coalesced(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.create("job-1", "t_001", "doc-001", "gs://bucket/a.pdf")
+    writes = []
+    update = store.update_progress
+    monkeypatch.setattr(store, "update_progress", lambda job_id, progress: writes.append(dict(progress))
+                        or update(job_id, progress))
+
+    report = ProgressReporter(store, "job-1", interval=60)
+    for page in range(1, 101):
+        report("extracted_pages", page)
+        report("chunks", page * 2)
+    report.flush()
+
+    # One write per stage start and the final flush instead of 200
+    assert len(writes) == 3
+    assert store.get("job-1")["progress"] == {"extracted_pages": 100, "chunks": 200, "embedded": 0, "upserted": 0}
@@ -0,0 +1,103 @@
+import math
+from collections import Counter
+
+import pytest
+
+from app.config import Config
+from app.rag import retriever
+from app.rag.lexical_index import B, K1, LexicalHit, LexicalIndex, ngrams
+from app.rag.retriever import fuse_results, reciprocal_rank_fusion
+
+DOCS = {
+    "doc-001": ["桜の間のエアコンはテレビ台の上です。", "チェックインは15時からです。", "備品番号AB-1234をご確認ください。"],
+    "doc-002": ["梅の間のエアコンは壁にあります。", "お問い合わせは03-1234-5678まで。"],
+}
+
+
+@pytest.fixture
+def lexicon(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    for doc_id, texts in DOCS.items():
+        builder = index.builder("t_001", doc_id)
+        for chunk_index, text in enumerate(texts):
+            builder.add(chunk_index, text)
+        builder.close()
+    return index
+
+
+def _bm25(query):
+    """Textbook BM25 over the chunk n-grams, one score per (doc, chunk)."""
+    chunks = {(doc_id, i): Counter(ngrams(text)) for doc_id, texts in DOCS.items() for i, text in enumerate(texts)}
+    average = sum(sum(terms.values()) for terms in chunks.values()) / len(chunks)
+    scores = {}
+    for term in set(ngrams(query)):
+        df = sum(term in terms for terms in chunks.values())
+        idf = math.log(1 + (len(chunks) - df + 0.5) / (df + 0.5))
+        for key, terms in chunks.items():
+            tf = terms[term]
+            if tf:
+                norm = K1 * (1 - B + B * sum(terms.values()) / average)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+    return scores
+
+
+def test_ngrams_normalize_width_and_case():
+    assert ngrams("ＡＢ-12") == ngrams("ab-12") == ["ab", "12"]
+    assert ngrams("桜の間") == ["桜の", "の間", "桜の間"]
+
+
+@pytest.mark.parametrize("query", ["エアコン", "桜の間のエアコン", "AB-1234", "03-1234-5678"])
+def test_search_matches_reference_bm25(lexicon, query):
+    expected = _bm25(query)
+    hits = lexicon.search("t_001", query, top_k=10)
+
+    assert {(hit.doc_id, hit.chunk_index) for hit in hits} == set(expected)
+    for hit in hits:
+        assert hit.score == pytest.approx(expected[(hit.doc_id, hit.chunk_index)])
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_search_filters_documents_and_reports_coverage(lexicon):
+    hits = lexicon.search("t_001", "エアコン", top_k=10, exclude_doc_ids=["doc-001"])
+    assert [(hit.doc_id, hit.chunk_index) for hit in hits] == [("doc-002", 0)]
+    assert hits[0].coverage == 1.0
+    assert lexicon.search("t_002", "エアコン", top_k=10) == []
+
+
+def test_reindexing_a_document_replaces_its_postings(lexicon):
+    builder = lexicon.builder("t_001", "doc-002")
+    builder.add(0, "駐車場は建物の裏手です。")
+    builder.close()
+
+    assert all(hit.doc_id == "doc-001" for hit in lexicon.search("t_001", "エアコン", top_k=10))
+    assert [hit.doc_id for hit in lexicon.search("t_001", "駐車場", top_k=10)] == ["doc-002"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["b"] == pytest.approx(1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert sorted(fused, key=fused.get, reverse=True) == ["a", "c", "b"]
+
+
+def test_fuse_results_hydrates_lexical_only_hits(monkeypatch):
+    monkeypatch.setattr(Config, "LEXICAL_RRF_K", 60)
+    hydrated = []
+
+    def lexical_results(tenant_id, hits, clients, return_vectors=False):
+        hydrated.extend(hits)
+        return [(f"t_001_{hit.doc_id}_c-{hit.chunk_index:05d}", hit.score, {"source": "lexical"}) for hit in hits]
+
+    monkeypatch.setattr(retriever, "lexical_results", lexical_results)
+    vector = [(f"t_001_doc-001_c-0000{i}", 0.1 * i, {"source": "vector"}) for i in range(3)]
+    lexical = [LexicalHit("doc-001", 2, 5.0, 1.0), LexicalHit("doc-002", 7, 4.0, 1.0)]
+
+    fused = fuse_results("t_001", vector, lexical)
+
+    assert hydrated == [lexical[1]]
+    # c-00002 is in both lists, so it overtakes the vector-only leader
+    assert [datapoint_id for datapoint_id, _, _ in fused][:2] == ["t_001_doc-001_c-00002", "t_001_doc-001_c-00000"]
+    assert fused[0][1] == 1.0 and fused[-1][1] == 0.0
+    assert dict((d, m["source"]) for d, _, m in fused)["t_001_doc-002_c-00007"] == "lexical"
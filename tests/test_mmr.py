@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.config import Config
+from app.rag import retriever
+from app.rag.retriever import apply_mmr, fill_missing_vectors
+from app.schemas.dto import ChunkHit
+
+
+def _hits(n):
+    return [
+        ChunkHit(doc_id="doc-001", chunk_id=f"c-{i:05d}", page=1, path="", checksum=str(i),
+                 preview_text=f"text {i}", score=1.0 - i / 100)
+        for i in range(n)
+    ]
+
+
+def test_mmr_keeps_vectors_when_some_are_missing(monkeypatch):
+    # Hits 0-2 are duplicates, hit 3 points elsewhere, hit 4 has no vector
+    embeddings = [[1.0, 0.0], [1.0, 0.0], [1.0, 0.0], [0.0, 1.0], None]
+
+    def text_mmr(*args):
+        raise AssertionError("fell back to text similarity")
+
+    monkeypatch.setattr(retriever, "_apply_text_mmr", text_mmr)
+
+    picked = apply_mmr(_hits(5), [1.0, 0.0], lambda_param=0.5, top_k=3, embeddings=embeddings,
+                       relevance=[0.9, 0.89, 0.88, 0.5, 0.85])
+
+    # The duplicates of hit 0 are penalized; the hit without a vector keeps its relevance
+    assert [hit.chunk_id for hit in picked] == ["c-00000", "c-00004", "c-00003"]
+
+
+def test_mmr_falls_back_to_text_only_without_any_vector(monkeypatch):
+    called = []
+    monkeypatch.setattr(retriever, "_apply_text_mmr", lambda hits, lambda_param, top_k: called.append(1) or hits[:top_k])
+
+    assert len(apply_mmr(_hits(5), [1.0, 0.0], top_k=3, embeddings=[None] * 5)) == 3
+    assert called
+
+
+def test_fill_missing_vectors_reads_the_index_then_re_embeds(monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_BACKEND", "vertex")
+    monkeypatch.setattr(retriever, "cached_chunk_vectors", lambda checksums, model_name=None: [None] * len(checksums))
+    embedded = []
+    monkeypatch.setattr(retriever, "embed_texts",
+                        lambda texts, clients=None, checksums=None: embedded.extend(texts) or [[0.0, 1.0]] * len(texts))
+    endpoint = SimpleNamespace(read_index_datapoints=lambda deployed_index_id, ids: [
+        SimpleNamespace(datapoint_id="t_001_doc-001_c-00001", feature_vector=[1.0, 0.0])
+    ])
+    clients = SimpleNamespace(index_endpoint=lambda: endpoint)
+    metadatas = [
+        {"datapoint_id": "t_001_doc-001_c-00000", "embedding": np.ones(2), "checksum": "a", "full_text": "zero"},
+        {"datapoint_id": "t_001_doc-001_c-00001", "embedding": None, "checksum": "b", "full_text": "one"},
+        {"datapoint_id": "t_001_doc-001_c-00002", "embedding": None, "checksum": "c", "full_text": "two"},
+    ]
+
+    fill_missing_vectors(metadatas, clients)
+
+    assert metadatas[1]["embedding"].tolist() == [1.0, 0.0]
+    assert metadatas[2]["embedding"].tolist() == [0.0, 1.0]
+    assert embedded == ["two"]
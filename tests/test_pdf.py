@@ -0,0 +1,39 @@
+import time
+
+from app.utils import pdf
+
+
+class FakeDocument:
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def page_text(self, index):
+        return f"{self.data.decode()} p{index}"
+
+    def close(self):
+        self.closed = True
+
+
+def test_worker_document_is_cached_between_tasks_then_dropped_when_idle(tmp_path, monkeypatch):
+    opened = []
+
+    class FakeEngine:
+        def open(self, stream):
+            opened.append(FakeDocument(stream.read()))
+            return opened[-1]
+
+    monkeypatch.setattr(pdf, "get_engine", lambda name: FakeEngine())
+    monkeypatch.setattr(pdf, "_WORKER_DOCUMENT_IDLE", 0.2)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"body")
+    source = ("file", str(path), 4, path.stat().st_mtime_ns, "fake")
+
+    assert pdf._extract_page_range(source, 0, 2) == [(0, "body p0", None), (1, "body p1", None)]
+    assert pdf._extract_page_range(source, 2, 3) == [(2, "body p2", None)]
+    assert len(opened) == 1 and pdf._worker_document is not None
+
+    deadline = time.monotonic() + 5
+    while pdf._worker_document is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pdf._worker_document is None and opened[0].closed